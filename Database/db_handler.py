@@ -26,6 +26,35 @@ def insert_customer_data(text, category, sentiment, rating, confidence):
     
 
 
+def iter_customer_data(batch_size=1000, after_id=0):
+    """Yield customerdata rows in batches, paging on id instead of fetchall()."""
+    conn = get_connection()
+    try:
+        while True:
+            cursor = conn.cursor(dictionary=True, buffered=False)
+            query = """
+            SELECT id, complaint_text, category, sentiment, rating, confidence
+            FROM customerdata
+            WHERE id > %s
+            ORDER BY id
+            LIMIT %s
+            """
+            cursor.execute(query, (after_id, batch_size))
+            batch = cursor.fetchall()
+            cursor.close()
+
+            if not batch:
+                break
+
+            after_id = batch[-1]["id"]
+            yield batch
+
+            if len(batch) < batch_size:
+                break
+    finally:
+        conn.close()
+
+
 def fetch_category_stats():
     conn = get_connection()
     cursor = conn.cursor()
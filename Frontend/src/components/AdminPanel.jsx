@@ -1,9 +1,12 @@
 import React, { useState, useEffect } from 'react';
-import { api } from '../services/api';
+import { api, applyAnalyticsDelta } from '../services/api';
 import ChartSection from './ChartSection';
 import ReportDisplay from './ReportDisplay';
 import './AdminPanel.css';
 
+// Point budget for the complaints timeline, roughly one point per 3px of chart
+const TIMELINE_MAX_POINTS = Math.min(1000, Math.max(100, Math.round(window.innerWidth / 3)));
+
 const AdminPanel = () => {
     const [loading, setLoading] = useState(false);
     const [reportData, setReportData] = useState(null);
@@ -21,6 +24,20 @@ const AdminPanel = () => {
         localStorage.setItem('theme', theme);
     }, [theme]);
 
+    // Keep charts fresh from pushed deltas instead of polling once they are shown
+    const chartsLoaded = chartsData !== null;
+    useEffect(() => {
+        if (!chartsLoaded) return undefined;
+
+        return api.subscribeAnalytics((message) => {
+            if (message.type === 'snapshot') {
+                setChartsData(message.data);
+            } else if (message.type === 'delta') {
+                setChartsData(prev => prev && applyAnalyticsDelta(prev, message));
+            }
+        }, TIMELINE_MAX_POINTS);
+    }, [chartsLoaded]);
+
     const toggleTheme = () => {
         setTheme(prevTheme => prevTheme === 'light' ? 'dark' : 'light');
     };
@@ -31,7 +48,7 @@ const AdminPanel = () => {
 
         try {
             // Fetch charts data
-            const chartsResponse = await api.getChartsData();
+            const chartsResponse = await api.getChartsData(TIMELINE_MAX_POINTS);
             setChartsData(chartsResponse.data);
 
             // Generate report
@@ -25,7 +25,9 @@ const ChartSection = ({ chartsData }) => {
         );
     }
 
-    const { sentiment_distribution, category_distribution, rating_by_category, time_series } = chartsData;
+    const { sentiment_distribution, category_distribution, rating_by_category, time_series, time_series_days } = chartsData;
+    // Dots only help on short timelines; on long ones they hide the line
+    const showDots = time_series.length <= 60;
 
     return (
         <div className="charts-container">
@@ -138,6 +140,11 @@ const ChartSection = ({ chartsData }) => {
                 <div className="chart-card card fade-in" style={{ animationDelay: '0.3s' }}>
                     <div className="card-header">
                         <h3 className="card-title">Complaints Timeline</h3>
+                        {time_series_days > time_series.length && (
+                            <span style={{ color: 'var(--text-muted)', fontSize: '0.85rem' }}>
+                                {time_series.length} of {time_series_days} days shown
+                            </span>
+                        )}
                     </div>
                     <ResponsiveContainer width="100%" height={300}>
                         <LineChart data={time_series}>
@@ -164,8 +171,9 @@ const ChartSection = ({ chartsData }) => {
                                 dataKey="count"
                                 stroke="#667eea"
                                 strokeWidth={3}
-                                dot={{ fill: '#667eea', r: 5 }}
+                                dot={showDots ? { fill: '#667eea', r: 5 } : false}
                                 activeDot={{ r: 8 }}
+                                isAnimationActive={showDots}
                                 name="Complaints"
                             />
                         </LineChart>
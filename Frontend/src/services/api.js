@@ -1,6 +1,45 @@
 import axios from 'axios';
 
 const API_BASE_URL = 'http://localhost:8000/api';
+const WS_BASE_URL = API_BASE_URL.replace(/^http/, 'ws').replace(/\/api$/, '');
+
+// Merge {key: value} changes into a chart list of {[nameKey]: key, [valueKey]: value}
+const mergeEntries = (list, changes, nameKey, valueKey) => {
+    if (!changes) return list;
+    const merged = list.map(item =>
+        item[nameKey] in changes ? { ...item, [valueKey]: changes[item[nameKey]] } : item
+    );
+    Object.entries(changes).forEach(([name, value]) => {
+        if (!list.some(item => item[nameKey] === name)) {
+            merged.push({ [nameKey]: name, [valueKey]: value });
+        }
+    });
+    return merged.filter(item => item[valueKey] !== 0);
+};
+
+// Apply a delta pushed by /ws/analytics to charts data; time series changes
+// come at the subscription's resolution and dropped points have count 0
+export const applyAnalyticsDelta = (chartsData, delta) => {
+    const timeSeries = [...chartsData.time_series];
+    (delta.time_series || []).forEach(point => {
+        const index = timeSeries.findIndex(p => p.date === point.date);
+        if (index >= 0) timeSeries[index] = point;
+        else timeSeries.push(point);
+    });
+    timeSeries.sort((a, b) => a.date.localeCompare(b.date));
+
+    return {
+        ...chartsData,
+        sentiment_distribution: mergeEntries(chartsData.sentiment_distribution, delta.sentiment_distribution, 'name', 'value'),
+        category_distribution: mergeEntries(chartsData.category_distribution, delta.category_distribution, 'name', 'value'),
+        rating_by_category: mergeEntries(chartsData.rating_by_category, delta.rating_by_category, 'category', 'rating'),
+        time_series: timeSeries.filter(point => point.count !== 0),
+        time_series_days: delta.time_series_days ?? chartsData.time_series_days,
+        total_complaints: delta.total_complaints,
+        priority_count: delta.priority_count,
+        confidence_stats: delta.confidence_stats || chartsData.confidence_stats
+    };
+};
 
 export const api = {
     // Get analytics data
@@ -9,12 +48,23 @@ export const api = {
         return response.data;
     },
 
-    // Get charts data
-    getChartsData: async () => {
-        const response = await axios.get(`${API_BASE_URL}/charts-data`);
+    // Get charts data; the timeline is downsampled server-side to maxPoints
+    getChartsData: async (maxPoints, downsample = 'lttb') => {
+        const response = await axios.get(`${API_BASE_URL}/charts-data`, {
+            params: { max_points: maxPoints, downsample }
+        });
         return response.data;
     },
 
+    // Subscribe to live analytics updates with the timeline at maxPoints;
+    // returns an unsubscribe function
+    subscribeAnalytics: (onMessage, maxPoints, downsample = 'lttb') => {
+        const params = new URLSearchParams({ max_points: maxPoints, downsample });
+        const socket = new WebSocket(`${WS_BASE_URL}/ws/analytics?${params}`);
+        socket.onmessage = (event) => onMessage(JSON.parse(event.data));
+        return () => socket.close();
+    },
+
     // Generate report
     generateReport: async () => {
         const response = await axios.post(`${API_BASE_URL}/generate-report`);
@@ -0,0 +1,234 @@
+import os
+import math
+import time
+import asyncio
+from collections import OrderedDict, deque
+from typing import List, Optional, Tuple
+
+from fastapi.responses import JSONResponse
+
+from metrics import ADMISSION_QUEUE_DEPTH, ADMISSION_REJECTIONS
+
+# Priority classes: a class is shed once global in-flight requests reach this
+# fraction of ADMISSION_MAX_IN_FLIGHT; critical requests are never shed
+PRIORITY_SHED_AT = {
+    'critical': None,
+    'interactive': 1.0,
+    'batch': 0.5,
+}
+
+class Overloaded(Exception):
+    """Raised when a request cannot be admitted right now"""
+    
+    def __init__(self, status_code: int, reason: str, detail: str, retry_after: float):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.reason = reason
+        self.detail = detail
+        self.retry_after = retry_after
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+    
+    def take(self) -> float:
+        """Take one token; return 0, or the seconds until one is available"""
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+class ClientRateLimiter:
+    """Per-client token buckets, keeping only the most recently seen clients"""
+    
+    def __init__(self, rate_per_minute: float, burst: float, max_clients: int = 10000):
+        self.rate = rate_per_minute / 60
+        self.burst = burst
+        self.max_clients = max_clients
+        self._buckets: OrderedDict = OrderedDict()
+    
+    def check(self, client: str):
+        bucket = self._buckets.get(client)
+        if bucket is None:
+            bucket = self._buckets[client] = TokenBucket(self.rate, self.burst)
+            if len(self._buckets) > self.max_clients:
+                self._buckets.popitem(last=False)
+        self._buckets.move_to_end(client)
+        
+        wait = bucket.take()
+        if wait:
+            raise Overloaded(429, 'rate_limited', "Too many report requests from this client", wait)
+
+class ConcurrencyLimiter:
+    """Limit concurrent requests to an endpoint, with a bounded FIFO queue
+    
+    Requests beyond `limit` wait in a queue of at most `queue_size` for up to
+    `queue_timeout` seconds; anything beyond that is rejected immediately.
+    Runs on the event loop only, so no locking is needed.
+    """
+    
+    def __init__(self, name: str, limit: int, queue_size: int, queue_timeout: float):
+        self.name = name
+        self.limit = limit
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout
+        self.active = 0
+        self._waiters: deque = deque()
+        # Smoothed request duration, used to estimate Retry-After
+        self._service_time = 1.0
+    
+    async def acquire(self):
+        if self.active < self.limit and not self._waiters:
+            self.active += 1
+            return
+        if len(self._waiters) >= self.queue_size:
+            raise Overloaded(503, 'queue_full', f"Server is busy ({self.name})", self.retry_after())
+        
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        ADMISSION_QUEUE_DEPTH.set(len(self._waiters), limiter=self.name)
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), self.queue_timeout)
+        except asyncio.TimeoutError:
+            if waiter.done():
+                return  # The slot was handed over just as the wait expired
+            self._abandon(waiter)
+            raise Overloaded(503, 'queue_timeout', f"Server is busy ({self.name})", self.retry_after())
+        except asyncio.CancelledError:
+            # Client went away while queued
+            if waiter.done():
+                self.release()
+            else:
+                self._abandon(waiter)
+            raise
+    
+    def _abandon(self, waiter: asyncio.Future):
+        waiter.cancel()
+        self._waiters.remove(waiter)
+        ADMISSION_QUEUE_DEPTH.set(len(self._waiters), limiter=self.name)
+    
+    def release(self, duration: float = None):
+        if duration is not None:
+            self._service_time = 0.8 * self._service_time + 0.2 * duration
+        # Hand the slot directly to the next waiter so it cannot be overtaken
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            ADMISSION_QUEUE_DEPTH.set(len(self._waiters), limiter=self.name)
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.active -= 1
+    
+    def retry_after(self) -> float:
+        return self._service_time * (len(self._waiters) + 1) / self.limit
+
+class AdmissionRule:
+    def __init__(self, priority: str, limiter: ConcurrencyLimiter = None,
+                 client_limiter: ClientRateLimiter = None):
+        self.priority = priority
+        self.limiter = limiter
+        self.client_limiter = client_limiter
+
+class AdmissionController:
+    """Admission decisions for incoming requests, by path prefix"""
+    
+    def __init__(self, rules: List[Tuple[str, AdmissionRule]], max_in_flight: int):
+        # Longest prefix first
+        self.rules = sorted(rules, key=lambda item: len(item[0]), reverse=True)
+        self.max_in_flight = max_in_flight
+        self.in_flight = 0
+    
+    @classmethod
+    def from_env(cls) -> 'AdmissionController':
+        queue_timeout = float(os.getenv('ADMISSION_QUEUE_TIMEOUT', 10))
+        report_limit = int(os.getenv('REPORT_CONCURRENCY', 2))
+        report_queue = int(os.getenv('REPORT_QUEUE_SIZE', 8))
+        interactive_limit = int(os.getenv('INTERACTIVE_CONCURRENCY', 16))
+        interactive_queue = int(os.getenv('INTERACTIVE_QUEUE_SIZE', 64))
+        # Report and PDF requests share one per-client budget since both call the LLM
+        client_limiter = ClientRateLimiter(float(os.getenv('CLIENT_REPORTS_PER_MINUTE', 6)),
+                                           float(os.getenv('CLIENT_REPORT_BURST', 3)))
+        
+        def limiter(name, limit, queue):
+            return ConcurrencyLimiter(name, limit, queue, queue_timeout)
+        
+        analytics = limiter('analytics', interactive_limit, interactive_queue)
+        download = limiter('download', interactive_limit, interactive_queue)
+        rules = [
+            ('/api/health', AdmissionRule('critical')),
+            ('/metrics', AdmissionRule('critical')),
+            ('/api/charts-data', AdmissionRule('interactive', analytics)),
+            ('/api/analyze-data', AdmissionRule('interactive', analytics)),
+            ('/api/analytics-range', AdmissionRule('interactive', analytics)),
+            ('/api/alerts', AdmissionRule('interactive', analytics)),
+            ('/api/clusters', AdmissionRule('interactive', analytics)),
+            ('/api/topics', AdmissionRule('interactive', analytics)),
+            ('/api/cube', AdmissionRule('interactive', analytics)),
+            ('/api/download-pdf/', AdmissionRule('interactive', download)),
+            ('/api/generate-report', AdmissionRule('batch', limiter('report', report_limit, report_queue), client_limiter)),
+            ('/api/generate-pdf', AdmissionRule('batch', limiter('pdf', report_limit, report_queue), client_limiter)),
+            ('/api/batch-reports', AdmissionRule('batch', client_limiter=client_limiter)),
+            ('/api/batch-reports/', AdmissionRule('interactive', download)),
+        ]
+        return cls(rules, int(os.getenv('ADMISSION_MAX_IN_FLIGHT', 64)))
+    
+    def match(self, path: str) -> Optional[AdmissionRule]:
+        for prefix, rule in self.rules:
+            if path == prefix or (prefix.endswith('/') and path.startswith(prefix)):
+                return rule
+        return None
+    
+    def check_priority(self, rule: AdmissionRule):
+        shed_at = PRIORITY_SHED_AT[rule.priority]
+        if shed_at is not None and self.in_flight >= self.max_in_flight * shed_at:
+            raise Overloaded(503, 'shed', "Server is busy, try again shortly", 1.0)
+
+class AdmissionMiddleware:
+    """ASGI middleware that rejects requests over capacity with 429/503
+    
+    Cheap endpoints stay responsive during report storms because expensive
+    ones are limited per endpoint, rate limited per client and shed first
+    when the whole process is busy. Unmatched paths, such as the live
+    update streams, pass through untouched.
+    """
+    
+    def __init__(self, app, controller: AdmissionController = None):
+        self.app = app
+        self.controller = controller or AdmissionController.from_env()
+    
+    async def __call__(self, scope, receive, send):
+        rule = self.controller.match(scope['path']) if scope['type'] == 'http' else None
+        if rule is None:
+            await self.app(scope, receive, send)
+            return
+        
+        try:
+            self.controller.check_priority(rule)
+            if rule.client_limiter is not None:
+                rule.client_limiter.check((scope.get('client') or ('unknown',))[0])
+            if rule.limiter is not None:
+                await rule.limiter.acquire()
+        except Overloaded as e:
+            ADMISSION_REJECTIONS.inc(endpoint=scope['path'] if rule.limiter is None else rule.limiter.name, reason=e.reason)
+            response = JSONResponse(
+                {"detail": e.detail},
+                status_code=e.status_code,
+                headers={"Retry-After": str(max(1, math.ceil(e.retry_after)))}
+            )
+            await response(scope, receive, send)
+            return
+        
+        self.controller.in_flight += 1
+        start = time.monotonic()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.controller.in_flight -= 1
+            if rule.limiter is not None:
+                rule.limiter.release(time.monotonic() - start)
@@ -0,0 +1,225 @@
+import os
+import math
+import asyncio
+import threading
+from collections import deque
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional
+
+from starlette.concurrency import run_in_threadpool
+
+# Key of the detector state that tracks volume across all categories
+ALL_CATEGORIES = 'All categories'
+NEGATIVE_SENTIMENTS = ('Bad', 'Fair')
+# Cap on empty buckets folded into the baseline after a gap, keeping each event O(1)
+MAX_EMPTY_BUCKETS = 96
+
+def filter_alerts(alerts: List[Dict[str, Any]], since: datetime = None, category: str = None,
+                  limit: int = 50) -> List[Dict[str, Any]]:
+    """Filter alerts listed most recent first"""
+    if since is not None:
+        alerts = [a for a in alerts if a['detected_at'] >= since.isoformat()]
+    if category is not None:
+        alerts = [a for a in alerts if a['category'] == category]
+    return alerts[:limit]
+
+class RollingStat:
+    """Exponentially weighted mean and variance, updated in O(1)"""
+    
+    __slots__ = ('alpha', 'mean', 'var', 'n')
+    
+    def __init__(self, alpha: float):
+        self.alpha = alpha
+        self.mean = 0.0
+        self.var = 0.0
+        self.n = 0
+    
+    def update(self, value: float):
+        if self.n == 0:
+            self.mean = value
+        else:
+            diff = value - self.mean
+            increment = self.alpha * diff
+            self.mean += increment
+            self.var = (1 - self.alpha) * (self.var + diff * increment)
+        self.n += 1
+    
+    def spread(self) -> float:
+        # Counts are at least Poisson-noisy, so never trust a tighter spread
+        return max(math.sqrt(self.var), math.sqrt(max(self.mean, 1.0)))
+
+class CategoryState:
+    """Rolling volume and sentiment state for one category"""
+    
+    def __init__(self, alpha: float, fast_alpha: float, slow_alpha: float):
+        self.bucket_start: Optional[datetime] = None
+        self.count = 0
+        self.level = RollingStat(alpha)
+        # One baseline per hour of the week captures daily and weekly seasonality
+        self.seasonal: Dict[int, RollingStat] = {}
+        self.spike_alerted = False
+        self.negative_fast = RollingStat(fast_alpha)
+        self.negative_slow = RollingStat(slow_alpha)
+        self.shift_cooldown = 0
+
+class AnomalyDetector:
+    """Online spike and sentiment-shift detector over the complaint stream
+    
+    Complaints are counted into fixed time buckets per category. A bucket is
+    compared against an EWMA baseline for its hour-of-week slot (falling back
+    to the overall level until the slot has history) while it is still open,
+    so a spike is flagged as soon as the partial count is anomalous rather
+    than when the bucket closes. Sentiment shifts compare a fast and a slow
+    EWMA of the negative share. Each event costs O(1).
+    """
+    
+    def __init__(self, bucket_minutes: int = None, threshold: float = None, min_count: int = None,
+                 min_shift: float = 0.15, min_events: int = 100, max_alerts: int = 200):
+        self.bucket = timedelta(minutes=bucket_minutes or int(os.getenv('ANOMALY_BUCKET_MINUTES', 60)))
+        self.threshold = threshold or float(os.getenv('ANOMALY_Z_THRESHOLD', 4))
+        self.min_count = min_count or int(os.getenv('ANOMALY_MIN_COUNT', 10))
+        self.min_shift = min_shift
+        self.min_events = min_events
+        self.states: Dict[str, CategoryState] = {}
+        self.alerts = deque(maxlen=max_alerts)
+        self.events = 0
+        self._lock = threading.Lock()
+    
+    def observe(self, category: str, created_at: datetime, negative: bool):
+        """Fold one complaint into the rolling state and raise any alerts"""
+        with self._lock:
+            self.events += 1
+            for key in (ALL_CATEGORIES, category):
+                state = self.states.get(key)
+                if state is None:
+                    state = self.states[key] = CategoryState(0.1, 0.05, 0.005)
+                self._observe_volume(key, state, created_at)
+                self._observe_sentiment(key, state, created_at, negative)
+    
+    def observe_frame(self, frame):
+        """Observe a DataFrame of complaints in created_at order"""
+        if frame.empty:
+            return
+        import pandas as pd
+        
+        frame = frame.assign(created_at=pd.to_datetime(frame['created_at'], errors='coerce')).dropna(subset=['created_at'])
+        frame = frame.sort_values('created_at', kind='stable')
+        negative = frame['rating'] <= 2 if 'rating' in frame else frame['sentiment'].isin(NEGATIVE_SENTIMENTS)
+        for category, created_at, is_negative in zip(frame['category'].astype(str), frame['created_at'], negative):
+            self.observe(category, created_at.to_pydatetime(), bool(is_negative))
+    
+    def _bucket_of(self, created_at: datetime) -> datetime:
+        seconds = int(self.bucket.total_seconds())
+        day = created_at.replace(hour=0, minute=0, second=0, microsecond=0)
+        offset = int((created_at - day).total_seconds()) // seconds * seconds
+        return day + timedelta(seconds=offset)
+    
+    def _baseline(self, state: CategoryState, bucket_start: datetime) -> RollingStat:
+        seasonal = state.seasonal.get(bucket_start.weekday() * 24 + bucket_start.hour)
+        return seasonal if seasonal is not None and seasonal.n >= 3 else state.level
+    
+    def _close_bucket(self, state: CategoryState, bucket_start: datetime):
+        slot = state.bucket_start.weekday() * 24 + state.bucket_start.hour
+        state.level.update(state.count)
+        state.seasonal.setdefault(slot, RollingStat(0.3)).update(state.count)
+        
+        empty = int((bucket_start - state.bucket_start) / self.bucket) - 1
+        for _ in range(min(empty, MAX_EMPTY_BUCKETS)):
+            state.level.update(0)
+        state.bucket_start = bucket_start
+        state.count = 0
+        state.spike_alerted = False
+    
+    def _observe_volume(self, key: str, state: CategoryState, created_at: datetime):
+        bucket_start = self._bucket_of(created_at)
+        if state.bucket_start is None:
+            state.bucket_start = bucket_start
+        elif bucket_start > state.bucket_start:
+            self._close_bucket(state, bucket_start)
+        elif bucket_start < state.bucket_start:
+            return  # Late event for an already closed bucket
+        
+        state.count += 1
+        baseline = self._baseline(state, bucket_start)
+        if state.spike_alerted or baseline.n < 3 or state.count < self.min_count:
+            return
+        score = (state.count - baseline.mean) / baseline.spread()
+        if score >= self.threshold:
+            state.spike_alerted = True
+            self._alert('volume_spike', key, created_at, score,
+                        observed=state.count, expected=round(baseline.mean, 1), bucket_start=bucket_start,
+                        message=f"{key}: {state.count} complaints since {bucket_start:%H:%M} vs ~{baseline.mean:.0f} expected")
+    
+    def _observe_sentiment(self, key: str, state: CategoryState, created_at: datetime, negative: bool):
+        value = 1.0 if negative else 0.0
+        state.negative_fast.update(value)
+        state.negative_slow.update(value)
+        if state.shift_cooldown:
+            state.shift_cooldown -= 1
+            return
+        if state.negative_slow.n < self.min_events:
+            return
+        # Score the shift against the noise of the fast average of a Bernoulli share
+        fast, slow = state.negative_fast, state.negative_slow
+        shift = fast.mean - slow.mean
+        noise = math.sqrt(max(slow.mean * (1 - slow.mean), 0.01) * fast.alpha / (2 - fast.alpha))
+        score = shift / noise
+        if shift >= self.min_shift and score >= self.threshold:
+            # Do not re-alert for the same shift while the fast average settles
+            state.shift_cooldown = self.min_events
+            self._alert('sentiment_shift', key, created_at, score,
+                        observed=round(state.negative_fast.mean, 3), expected=round(state.negative_slow.mean, 3),
+                        message=f"{key}: negative share rose to {state.negative_fast.mean:.0%} from {state.negative_slow.mean:.0%}")
+    
+    def _alert(self, alert_type: str, category: str, detected_at: datetime, score: float, **details):
+        self.alerts.append({
+            'type': alert_type,
+            'category': category,
+            'detected_at': detected_at.isoformat(),
+            'score': round(score, 2),
+            **{k: v.isoformat() if isinstance(v, datetime) else v for k, v in details.items()}
+        })
+    
+    def get_alerts(self, since: datetime = None, category: str = None, limit: int = 50) -> List[Dict[str, Any]]:
+        """Most recent alerts first, optionally filtered"""
+        with self._lock:
+            alerts = list(self.alerts)
+        return filter_alerts(alerts[::-1], since, category, limit)
+
+class AnomalyMonitor:
+    """Poll for new complaints and feed them to the detector in the background
+    
+    Each tick is a cheap data-version check; rows are read only when the data
+    changed, and only those past the last seen id.
+    """
+    
+    def __init__(self, get_version: Callable[[], Any], refresh: Callable[[], None], poll_interval: float = None):
+        self.get_version = get_version
+        self.refresh = refresh
+        self.poll_interval = poll_interval if poll_interval is not None else float(os.getenv('ANOMALY_POLL_SECONDS', 30))
+        self._version = None
+        self._task: Optional[asyncio.Task] = None
+    
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._watch())
+    
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+    
+    async def _watch(self):
+        while True:
+            try:
+                version, _ = await run_in_threadpool(self.get_version)
+                if version != self._version:
+                    await run_in_threadpool(self.refresh)
+                    self._version = version
+            except Exception as e:
+                print(f"Anomaly detection refresh failed: {e}")
+            await asyncio.sleep(self.poll_interval)
@@ -0,0 +1,122 @@
+import os
+import re
+import time
+import hashlib
+import tempfile
+import threading
+from typing import Optional, Tuple
+
+ARTIFACT_ID_PATTERN = re.compile(r'^[0-9a-f]{64}$')
+
+class ArtifactStore:
+    """Content-addressed store for generated reports with size and age eviction
+    
+    Artifacts are stored as `<sha256><suffix>` under root_dir, so identical
+    content is stored once and ids can never collide or escape the directory.
+    A file's mtime doubles as its last-access time for LRU eviction.
+    """
+    
+    def __init__(self, root_dir: str = None, max_bytes: int = None, max_age_seconds: int = None):
+        self.root_dir = root_dir or os.getenv('ARTIFACT_DIR', os.path.join(os.path.dirname(__file__), 'reports'))
+        self.max_bytes = max_bytes if max_bytes is not None else int(os.getenv('ARTIFACT_MAX_MB', 500)) * 1024 * 1024
+        self.max_age_seconds = max_age_seconds if max_age_seconds is not None else int(os.getenv('ARTIFACT_MAX_AGE_HOURS', 24)) * 3600
+        self._lock = threading.Lock()
+        os.makedirs(self.root_dir, exist_ok=True)
+    
+    def put(self, data: bytes, suffix: str = '.pdf') -> str:
+        """Store bytes and return their artifact id"""
+        artifact_id = hashlib.sha256(data).hexdigest()
+        path = os.path.join(self.root_dir, artifact_id + suffix)
+        
+        with self._lock:
+            if os.path.exists(path):
+                os.utime(path)
+            else:
+                # Write to a temp file first so readers never see partial artifacts
+                fd, tmp_path = tempfile.mkstemp(dir=self.root_dir, suffix='.tmp')
+                try:
+                    with os.fdopen(fd, 'wb') as f:
+                        f.write(data)
+                    os.replace(tmp_path, path)
+                except Exception:
+                    os.unlink(tmp_path)
+                    raise
+            self._evict(keep=path)
+        
+        return artifact_id
+    
+    def get_path(self, name: str) -> Optional[str]:
+        """Resolve an artifact id (with or without suffix) to a file path"""
+        artifact_id, _, suffix = name.partition('.')
+        if not ARTIFACT_ID_PATTERN.match(artifact_id) or (suffix and not suffix.isalnum()):
+            return None
+        
+        for filename in (name, artifact_id + '.pdf') if suffix else (artifact_id + '.pdf',):
+            path = os.path.join(self.root_dir, filename)
+            if os.path.isfile(path):
+                if time.time() - os.path.getmtime(path) > self.max_age_seconds:
+                    return None
+                os.utime(path)
+                return path
+        return None
+    
+    def read_range(self, path: str, start: int, end: int) -> bytes:
+        """Read the inclusive byte range [start, end] of an artifact"""
+        with open(path, 'rb') as f:
+            f.seek(start)
+            return f.read(end - start + 1)
+    
+    def evict(self):
+        """Remove expired artifacts, then least recently used ones over the size budget"""
+        with self._lock:
+            self._evict()
+    
+    def _evict(self, keep: str = None):
+        now = time.time()
+        entries = []
+        for entry in os.scandir(self.root_dir):
+            if not entry.is_file() or entry.name.endswith('.tmp'):
+                continue
+            stat = entry.stat()
+            if now - stat.st_mtime > self.max_age_seconds and entry.path != keep:
+                self._remove(entry.path)
+            else:
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            if path != keep:
+                self._remove(path)
+                total -= size
+    
+    def _remove(self, path: str):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+def parse_range_header(range_header: str, size: int) -> Optional[Tuple[int, int]]:
+    """Parse a single `bytes=start-end` range into inclusive offsets
+    
+    Returns None for malformed or multi-range headers (served as a full
+    response) and raises ValueError for unsatisfiable ranges.
+    """
+    match = re.fullmatch(r'\s*bytes=(\d*)-(\d*)\s*', range_header or '')
+    if not match or match.group(1) == match.group(2) == '':
+        return None
+    
+    start, end = match.groups()
+    if start == '':
+        # Suffix range: the last N bytes
+        length = int(end)
+        if length == 0:
+            raise ValueError("Unsatisfiable range")
+        return max(size - length, 0), size - 1
+    
+    start = int(start)
+    end = min(int(end), size - 1) if end else size - 1
+    if start >= size or start > end:
+        raise ValueError("Unsatisfiable range")
+    return start, end
@@ -0,0 +1,426 @@
+import os
+import re
+import json
+import time
+import hashlib
+import zipfile
+import argparse
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+import pandas as pd
+
+from admission import TokenBucket
+
+# Segment dimensions derived from created_at; any other dimension is a data column
+DERIVED_DIMENSIONS = {
+    'week': lambda created_at: created_at.dt.to_period('W').dt.start_time.dt.strftime('%Y-%m-%d'),
+    'day': lambda created_at: created_at.dt.strftime('%Y-%m-%d'),
+}
+DIMENSION_PATTERN = re.compile(r'^[a-z_]+$')
+RUN_ID_PATTERN = re.compile(r'^\d{8}-\d{6}-[0-9a-f]{8}$')
+
+def segment_key(dimension: str, value: Any) -> str:
+    return f"{dimension}={value}"
+
+def _slug(key: str) -> str:
+    readable = re.sub(r'[^a-z0-9]+', '-', key.lower()).strip('-')[:60]
+    return f"{readable}-{hashlib.sha256(key.encode('utf-8')).hexdigest()[:8]}"
+
+class SegmentAnalytics:
+    """Analytics for many segments from a single pass over the complaints
+    
+    Each chunk is grouped once per requested dimension rather than once per
+    segment. Partial counts are summed at the end into the same shape as
+    DataProcessor.get_all_analytics, so reports and PDFs work unchanged.
+    """
+    
+    STATS = ('total', 'sentiment', 'category', 'rating', 'day', 'correlation', 'confidence', 'priority')
+    
+    def __init__(self, segments: List[Dict[str, Any]], rating_threshold: int = 2):
+        self.rating_threshold = rating_threshold
+        # Dimension -> requested values, or None for every value in the data
+        self.wanted: Dict[str, Optional[set]] = {}
+        for segment in segments:
+            dimension, value = segment['dimension'], segment.get('value')
+            if value is None:
+                self.wanted[dimension] = None
+            elif self.wanted.get(dimension, set()) is not None:
+                self.wanted.setdefault(dimension, set()).add(str(value))
+        self.missing_columns = set()
+        self._parts = {dimension: {stat: [] for stat in self.STATS} for dimension in self.wanted}
+    
+    def _keys(self, frame: pd.DataFrame, dimension: str) -> Optional[pd.Series]:
+        if dimension in DERIVED_DIMENSIONS:
+            keys = DERIVED_DIMENSIONS[dimension](frame['created_at'])
+        elif dimension in frame:
+            keys = frame[dimension].where(frame[dimension].isna(), frame[dimension].astype(str))
+        else:
+            self.missing_columns.add(dimension)
+            return None
+        return keys.rename('segment')
+    
+    def add(self, frame: pd.DataFrame):
+        """Fold one chunk of complaints into every segment it touches"""
+        frame = frame.assign(created_at=pd.to_datetime(frame['created_at'], errors='coerce'))
+        for dimension, values in self.wanted.items():
+            keys = self._keys(frame, dimension)
+            if keys is None:
+                continue
+            mask = keys.notna() if values is None else keys.isin(values)
+            part, keys = frame[mask], keys[mask]
+            if part.empty:
+                continue
+            
+            parts = self._parts[dimension]
+            parts['total'].append(keys.value_counts())
+            parts['sentiment'].append(part.groupby([keys, part['sentiment']]).size())
+            parts['category'].append(part.groupby([keys, part['category']]).size())
+            rated = part['rating'].notna()
+            parts['rating'].append(part[rated].groupby([keys[rated], part['category'][rated]])['rating'].agg(['sum', 'count']))
+            parts['day'].append(part.groupby([keys, part['created_at'].dt.date]).size())
+            parts['correlation'].append(part.groupby([keys, part['category'], part['sentiment']]).size())
+            parts['confidence'].append(pd.DataFrame({'segment': keys, 'confidence': part['confidence']}))
+            priority = part['rating'] <= self.rating_threshold
+            parts['priority'].append(part.loc[priority, ['id', 'complaint_text', 'category', 'sentiment', 'rating']].assign(segment=keys[priority]))
+    
+    def results(self) -> Dict[str, Dict[str, Any]]:
+        """Analytics per segment key, for every segment that has complaints"""
+        results = {}
+        for dimension, parts in self._parts.items():
+            if not parts['total']:
+                continue
+            totals = pd.concat(parts['total']).groupby(level=0).sum()
+            sentiment = pd.concat(parts['sentiment']).groupby(level=[0, 1]).sum()
+            category = pd.concat(parts['category']).groupby(level=[0, 1]).sum()
+            rating = pd.concat(parts['rating']).groupby(level=[0, 1]).sum()
+            day = pd.concat(parts['day']).groupby(level=[0, 1]).sum()
+            correlation = pd.concat(parts['correlation']).groupby(level=[0, 1, 2]).sum()
+            confidence = pd.concat(parts['confidence']).groupby('segment')['confidence']
+            confidence = confidence.agg(['mean', 'median', 'min', 'max'])
+            priority = pd.concat(parts['priority'])
+            priority = {value: group.drop(columns='segment') for value, group in priority.groupby('segment')}
+            
+            for value, total in totals.items():
+                ratings = _slice(rating, value)
+                results[segment_key(dimension, value)] = {
+                    'segment': {'dimension': dimension, 'value': value},
+                    'sentiment_distribution': self._counts(sentiment, value),
+                    'category_distribution': self._counts(category, value),
+                    'rating_by_category': {k: round(float(row['sum'] / row['count']), 2) for k, row in ratings.iterrows() if row['count']},
+                    'priority_issues': priority[value].to_dict('records') if value in priority else [],
+                    'time_series': [{'date': str(k), 'count': int(v)} for k, v in _slice(day, value).sort_index().items()],
+                    'confidence_stats': {
+                        key: None if pd.isna(confidence.at[value, key]) else round(float(confidence.at[value, key]), 3)
+                        for key in ('mean', 'median', 'min', 'max')
+                    },
+                    'category_sentiment_correlation': [
+                        {'category': c, 'sentiment': s, 'count': int(n)} for (c, s), n in _slice(correlation, value).items()
+                    ],
+                    'total_complaints': int(total)
+                }
+        return results
+    
+    def _counts(self, counts: pd.Series, value: str) -> Dict[str, int]:
+        return {k: int(v) for k, v in _slice(counts, value).sort_values(ascending=False, kind='stable').items()}
+
+def _slice(grouped, value):
+    """Rows of one segment from a result grouped by segment first, possibly none"""
+    if value in grouped.index.get_level_values(0):
+        return grouped.xs(value, level=0)
+    return grouped.iloc[:0].droplevel(0)
+
+class RateLimiter:
+    """Thread-safe blocking wrapper around a token bucket"""
+    
+    def __init__(self, requests_per_minute: float, burst: float = 1):
+        self._bucket = TokenBucket(requests_per_minute / 60, burst)
+        self._lock = threading.Lock()
+    
+    def wait(self):
+        while True:
+            with self._lock:
+                delay = self._bucket.take()
+            if not delay:
+                return
+            time.sleep(delay)
+
+# One PDF generator per pool worker process, created on first use
+_worker_pdf_generator = None
+
+def _render_pdf(report: str, analytics: Dict[str, Any], title: str) -> bytes:
+    global _worker_pdf_generator
+    if _worker_pdf_generator is None:
+        from pdf_generator import PDFGenerator
+        _worker_pdf_generator = PDFGenerator(chart_workers=0)
+    return _worker_pdf_generator.generate_pdf_bytes(report, analytics, title=title)
+
+class BatchReportRunner:
+    """Generate one report and PDF per segment, resumable from its manifest
+    
+    A run lives in its own directory with a manifest.json that records the
+    state of every segment. Reports are saved as soon as the LLM returns and
+    PDFs as soon as they render, so resuming a run only redoes what is
+    missing. LLM calls run concurrently under a requests-per-minute limit,
+    and PDFs render in a process pool while other calls are still running.
+    """
+    
+    def __init__(self, data_processor, get_rag_engine: Callable[[], Any], output_dir: str = None,
+                 llm_concurrency: int = None, requests_per_minute: float = None, pdf_workers: int = None,
+                 max_attempts: int = 3):
+        self.data_processor = data_processor
+        self.get_rag_engine = get_rag_engine
+        self.output_dir = output_dir or os.getenv('BATCH_REPORT_DIR', os.path.join(os.path.dirname(__file__), 'batch_reports'))
+        self.llm_concurrency = llm_concurrency or int(os.getenv('BATCH_LLM_CONCURRENCY', 4))
+        self.rate_limiter = RateLimiter(requests_per_minute or float(os.getenv('BATCH_LLM_REQUESTS_PER_MINUTE', 30)),
+                                        burst=self.llm_concurrency)
+        self.pdf_workers = int(os.getenv('BATCH_PDF_WORKERS', 2)) if pdf_workers is None else pdf_workers
+        self.max_attempts = max_attempts
+        self._manifest_lock = threading.Lock()
+        self._run_lock = threading.Lock()
+        self._active_run = None
+    
+    def validate(self, segments: List[Dict[str, Any]]):
+        if not segments:
+            raise ValueError("At least one segment is required")
+        for segment in segments:
+            if not DIMENSION_PATTERN.match(str(segment.get('dimension', ''))):
+                raise ValueError(f"Invalid segment dimension: {segment.get('dimension')!r}")
+    
+    def run_dir(self, run_id: str) -> Optional[str]:
+        if not RUN_ID_PATTERN.match(run_id):
+            return None
+        return os.path.join(self.output_dir, run_id)
+    
+    def load_manifest(self, run_id: str) -> Optional[Dict[str, Any]]:
+        run_dir = self.run_dir(run_id)
+        path = run_dir and os.path.join(run_dir, 'manifest.json')
+        if not path or not os.path.exists(path):
+            return None
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    
+    def zip_path(self, run_id: str) -> Optional[str]:
+        manifest = self.load_manifest(run_id)
+        if manifest is None or not manifest.get('zip'):
+            return None
+        return os.path.join(self.run_dir(run_id), manifest['zip'])
+    
+    def start(self, segments: List[Dict[str, Any]] = None, run_id: str = None) -> str:
+        """Start or resume a run in a background thread and return its id"""
+        run_id = self._prepare(segments, run_id)
+        threading.Thread(target=self._run_prepared, args=(run_id,), name=f'batch-{run_id}', daemon=True).start()
+        return run_id
+    
+    def run(self, segments: List[Dict[str, Any]] = None, run_id: str = None) -> Dict[str, Any]:
+        """Run or resume a batch in the calling thread and return its manifest"""
+        run_id = self._prepare(segments, run_id)
+        self._run_prepared(run_id)
+        return self.load_manifest(run_id)
+    
+    def _prepare(self, segments: Optional[List[Dict[str, Any]]], run_id: Optional[str]) -> str:
+        """Claim the runner and create or reopen the run's manifest"""
+        if not self._run_lock.acquire(blocking=False):
+            raise RuntimeError(f"Batch run {self._active_run} is still in progress")
+        try:
+            if run_id is not None:
+                manifest = self.load_manifest(run_id)
+                if manifest is None:
+                    raise ValueError(f"Unknown batch run: {run_id}")
+            else:
+                self.validate(segments)
+                digest = hashlib.sha256(json.dumps(segments, sort_keys=True).encode('utf-8')).hexdigest()[:8]
+                run_id = f"{datetime.now().strftime('%Y%m%d-%H%M%S')}-{digest}"
+                os.makedirs(self.run_dir(run_id), exist_ok=True)
+                manifest = {'run_id': run_id, 'created_at': datetime.now().isoformat(),
+                            'requested': segments, 'segments': {}, 'zip': None}
+            manifest['status'] = 'running'
+            self._save_manifest(manifest)
+            self._active_run = run_id
+            return run_id
+        except Exception:
+            self._run_lock.release()
+            raise
+    
+    def _run_prepared(self, run_id: str):
+        manifest = self.load_manifest(run_id)
+        try:
+            self._execute(manifest)
+        except Exception as e:
+            manifest['status'] = 'failed'
+            manifest['error'] = str(e)
+            self._save_manifest(manifest)
+        finally:
+            self._active_run = None
+            self._run_lock.release()
+    
+    def _execute(self, manifest: Dict[str, Any]):
+        run_dir = self.run_dir(manifest['run_id'])
+        segments = manifest['segments']
+        
+        # One grouped pass computes analytics for every segment of the run
+        accumulator = SegmentAnalytics(manifest['requested'])
+        for chunk in self.data_processor.iter_complaint_chunks(chunksize=50000):
+            accumulator.add(chunk)
+        analytics_by_key = accumulator.results()
+        self._resolve_segments(manifest, accumulator, analytics_by_key)
+        
+        todo = [key for key, entry in segments.items()
+                if entry['status'] != 'done' or not os.path.exists(os.path.join(run_dir, entry['pdf']))]
+        todo = [key for key in todo if key in analytics_by_key]
+        
+        pdf_pool = ProcessPoolExecutor(max_workers=self.pdf_workers) if self.pdf_workers > 0 else None
+        pdf_futures = {}
+        
+        def render(key: str, report: str):
+            nonlocal pdf_pool
+            title = f"CRM Analytics Report: {segments[key]['dimension'].title()} {segments[key]['value']}"
+            if pdf_pool is not None:
+                try:
+                    pdf_futures[pdf_pool.submit(_render_pdf, report, analytics_by_key[key], title)] = key
+                    return
+                except (BrokenProcessPool, RuntimeError):
+                    pdf_pool = None
+            self._finish_pdf(manifest, key, lambda: _render_pdf(report, analytics_by_key[key], title))
+        
+        try:
+            with ThreadPoolExecutor(max_workers=self.llm_concurrency, thread_name_prefix='batch-llm') as llm_pool:
+                llm_futures = {}
+                for key in todo:
+                    report_path = os.path.join(run_dir, segments[key]['report'])
+                    if os.path.exists(report_path):
+                        with open(report_path, 'r', encoding='utf-8') as f:
+                            render(key, f.read())
+                    else:
+                        llm_futures[llm_pool.submit(self._generate_report, analytics_by_key[key])] = key
+                
+                for future in as_completed(llm_futures):
+                    key = llm_futures[future]
+                    try:
+                        report = future.result()
+                    except Exception as e:
+                        self._update_segment(manifest, key, status='failed', error=f"Report generation failed: {e}")
+                        continue
+                    _write_atomic(os.path.join(run_dir, segments[key]['report']), report.encode('utf-8'))
+                    self._update_segment(manifest, key, status='reported', error=None)
+                    render(key, report)
+            
+            for future in as_completed(pdf_futures):
+                self._finish_pdf(manifest, pdf_futures[future], future.result)
+        finally:
+            if pdf_pool is not None:
+                pdf_pool.shutdown(wait=True)
+        
+        done = [entry for entry in segments.values() if entry['status'] == 'done']
+        manifest['zip'] = self._write_zip(manifest, done) if done else None
+        manifest['status'] = 'completed' if segments and len(done) == len(segments) else 'partial'
+        self._save_manifest(manifest)
+    
+    def _resolve_segments(self, manifest: Dict[str, Any], accumulator: SegmentAnalytics,
+                          analytics_by_key: Dict[str, Dict[str, Any]]):
+        """Add the concrete segments of this run to the manifest"""
+        expected = []
+        for segment in manifest['requested']:
+            dimension, value = segment['dimension'], segment.get('value')
+            if value is None:
+                expected += [(key, dimension, analytics['segment']['value']) for key, analytics in analytics_by_key.items()
+                             if analytics['segment']['dimension'] == dimension]
+            else:
+                expected.append((segment_key(dimension, value), dimension, str(value)))
+        
+        for key, dimension, value in expected:
+            entry = manifest['segments'].setdefault(key, {
+                'dimension': dimension, 'value': value, 'status': 'pending', 'error': None,
+                'report': f"{_slug(key)}.md", 'pdf': f"{_slug(key)}.pdf"
+            })
+            if key in analytics_by_key:
+                entry['total_complaints'] = analytics_by_key[key]['total_complaints']
+            elif dimension in accumulator.missing_columns:
+                entry.update(status='failed', error=f"The data has no '{dimension}' column")
+            else:
+                entry.update(status='failed', error="No complaints in this segment")
+        self._save_manifest(manifest)
+    
+    def _generate_report(self, analytics: Dict[str, Any]) -> str:
+        """Call the LLM for one segment, retrying transient failures with backoff"""
+        segment = analytics['segment']
+        summary = f"Report Segment: {segment['dimension']} = {segment['value']}\n" + \
+            self.data_processor.get_data_summary(analytics)
+        for attempt in range(1, self.max_attempts + 1):
+            self.rate_limiter.wait()
+            try:
+                return self.get_rag_engine().generate_report(summary, analytics)
+            except Exception:
+                if attempt == self.max_attempts:
+                    raise
+                time.sleep(2 ** attempt)
+    
+    def _finish_pdf(self, manifest: Dict[str, Any], key: str, get_pdf: Callable[[], bytes]):
+        entry = manifest['segments'][key]
+        try:
+            pdf_bytes = get_pdf()
+        except Exception as e:
+            self._update_segment(manifest, key, status='failed', error=f"PDF rendering failed: {e}")
+            return
+        _write_atomic(os.path.join(self.run_dir(manifest['run_id']), entry['pdf']), pdf_bytes)
+        self._update_segment(manifest, key, status='done', error=None)
+    
+    def _update_segment(self, manifest: Dict[str, Any], key: str, **fields):
+        with self._manifest_lock:
+            manifest['segments'][key].update(fields)
+        self._save_manifest(manifest)
+    
+    def _save_manifest(self, manifest: Dict[str, Any]):
+        with self._manifest_lock:
+            manifest['updated_at'] = datetime.now().isoformat()
+            data = json.dumps(manifest, indent=2, default=str).encode('utf-8')
+        _write_atomic(os.path.join(self.run_dir(manifest['run_id']), 'manifest.json'), data)
+    
+    def _write_zip(self, manifest: Dict[str, Any], done: List[Dict[str, Any]]) -> str:
+        """Bundle the finished PDFs and the manifest"""
+        run_dir = self.run_dir(manifest['run_id'])
+        name = f"crm_reports_{manifest['run_id']}.zip"
+        fd, tmp_path = tempfile.mkstemp(dir=run_dir, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f, zipfile.ZipFile(f, 'w') as archive:
+            # PDFs are already compressed
+            for entry in done:
+                archive.write(os.path.join(run_dir, entry['pdf']), entry['pdf'], compress_type=zipfile.ZIP_STORED)
+            archive.writestr('manifest.json', json.dumps(manifest, indent=2, default=str), compress_type=zipfile.ZIP_DEFLATED)
+        os.replace(tmp_path, os.path.join(run_dir, name))
+        return name
+
+def _write_atomic(path: str, data: bytes):
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    with os.fdopen(fd, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+def _parse_segment(text: str) -> Dict[str, Any]:
+    dimension, _, value = text.partition('=')
+    return {'dimension': dimension, 'value': value or None}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate one CRM report per segment")
+    parser.add_argument('segments', nargs='*', help="dimension (one report per value) or dimension=value, e.g. category week=2024-06-03")
+    parser.add_argument('--resume', metavar='RUN_ID', help="resume a previous run, redoing only missing reports")
+    args = parser.parse_args()
+    if not args.segments and not args.resume:
+        parser.error("give at least one segment or --resume RUN_ID")
+    
+    from db_config import DatabaseConfig
+    from data_processor import DataProcessor
+    from rag_engine import RAGEngine
+    
+    rag_engine = RAGEngine()
+    runner = BatchReportRunner(DataProcessor(db_config=DatabaseConfig()), lambda: rag_engine)
+    result = runner.run([_parse_segment(s) for s in args.segments] or None, run_id=args.resume)
+    failed = {key: entry['error'] for key, entry in result['segments'].items() if entry['status'] != 'done'}
+    print(f"Run {result['run_id']}: {result['status']}, {len(result['segments']) - len(failed)}/{len(result['segments'])} segments done")
+    for key, error in failed.items():
+        print(f"  {key}: {error}")
+    if result.get('zip'):
+        print(f"Reports: {os.path.join(runner.run_dir(result['run_id']), result['zip'])}")
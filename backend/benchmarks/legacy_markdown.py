@@ -0,0 +1,85 @@
+"""Copy of the line-by-line markdown converter PDFGenerator used before the
+single-pass tokenizer in markdown_flowables.py, kept as a benchmark baseline"""
+import re
+from typing import List
+
+from reportlab.platypus import Paragraph, Spacer
+
+def _convert_markdown_bold(text: str) -> str:
+    """Convert markdown bold (**text**) to HTML bold (<b>text</b>)"""
+    # Use regex to replace **text** with <b>text</b>
+    return re.sub(r'\*\*(.+?)\*\*', r'<b>\1</b>', text)
+
+def legacy_report_content(styles, story: List, report_text: str):
+    """Add formatted report content to PDF, exactly as the original PDFGenerator did"""
+    # Split report into lines and process
+    lines = report_text.split('\n')
+    
+    i = 0
+    while i < len(lines):
+        line = lines[i].strip()
+        
+        if not line:
+            i += 1
+            continue
+        
+        # Check for markdown headings (## Heading)
+        if line.startswith('##'):
+            heading_text = line.replace('##', '').strip()
+            heading = Paragraph(heading_text, styles['CustomHeading'])
+            story.append(heading)
+            i += 1
+            continue
+        
+        # Check for main heading (# Heading)
+        if line.startswith('#'):
+            heading_text = line.replace('#', '').strip()
+            heading = Paragraph(heading_text, styles['CustomTitle'])
+            story.append(heading)
+            story.append(Spacer(1, 12))
+            i += 1
+            continue
+        
+        # Check for bullet points
+        if line.startswith('-') or line.startswith('*'):
+            # Collect consecutive bullet points
+            bullet_lines = []
+            while i < len(lines) and (lines[i].strip().startswith('-') or lines[i].strip().startswith('*')):
+                bullet_text = lines[i].strip()[1:].strip()
+                # Handle bold text (**text**) properly
+                bullet_text = _convert_markdown_bold(bullet_text)
+                bullet_lines.append(bullet_text)
+                i += 1
+            
+            # Add bullets as paragraphs with bullet style
+            for bullet in bullet_lines:
+                para = Paragraph(f'• {bullet}', styles['CustomBody'])
+                story.append(para)
+            story.append(Spacer(1, 8))
+            continue
+        
+        # Check for numbered lists
+        if line and len(line) > 2 and line[0].isdigit() and line[1] == '.':
+            # Collect consecutive numbered items
+            numbered_lines = []
+            while i < len(lines) and len(lines[i].strip()) > 2 and lines[i].strip()[0].isdigit() and lines[i].strip()[1] == '.':
+                item_text = lines[i].strip().split('.', 1)[1].strip()
+                # Handle bold text properly
+                item_text = _convert_markdown_bold(item_text)
+                numbered_lines.append(item_text)
+                i += 1
+            
+            # Add numbered items
+            for idx, item in enumerate(numbered_lines, 1):
+                para = Paragraph(f'{idx}. {item}', styles['CustomBody'])
+                story.append(para)
+            story.append(Spacer(1, 8))
+            continue
+        
+        # Regular paragraph
+        # Handle bold text in paragraphs properly
+        paragraph_text = _convert_markdown_bold(line)
+        para = Paragraph(paragraph_text, styles['CustomBody'])
+        story.append(para)
+        story.append(Spacer(1, 6))
+        i += 1
@@ -0,0 +1,307 @@
+"""Performance benchmarks for the backend pipeline
+
+Covers per-method DataProcessor analytics, RAG context building, chart and
+PDF rendering, markdown-to-flowables conversion of long reports, and end-to-end endpoint latency/throughput under concurrent
+load with a stubbed LLM. Results are written as JSON keyed by benchmark name
+so runs from different commits can be compared.
+
+    cd backend
+    python -m benchmarks.run_benchmarks --sizes 10k,1m
+    python -m benchmarks.run_benchmarks --sizes 10k --compare benchmarks/results/<baseline>.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime
+from types import SimpleNamespace
+from typing import Any, Callable, Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.synthetic_data import ensure_dataset
+from data_processor import DataProcessor
+from rag_engine import RAGEngine
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), 'results')
+
+STUB_REPORT = "\n".join(
+    ["## Executive Summary", "The data shows **significant** issues in several categories.", ""]
+    + [f"## Section {i}\n- **Finding {i}**: complaints increased\n- Item with *detail*\n1. First action\n2. Second action\n"
+       for i in range(1, 8)]
+)
+
+def long_report(segments: int) -> str:
+    """A multi-segment report exercising every markdown block the PDF converter handles"""
+    sections = []
+    for i in range(1, segments + 1):
+        sections.append("\n".join([
+            f"## Segment {i}: Category Review",
+            f"Complaints in segment {i} rose **{i % 17 + 3}%** week over week, driven by *billing* and `login` issues.",
+            "Customers repeatedly mention delays and unclear responses from support.",
+            "",
+            f"- **Volume**: {i * 13} complaints",
+            "  - Peak on Monday mornings",
+            "  - Mostly from mobile users",
+            "- **Sentiment**: mostly *Bad* and *Fair*",
+            "",
+            "| Category | Complaints | Avg Rating |",
+            "|---|---:|---:|",
+            f"| Billing | {i * 5} | 2.1 |",
+            f"| Technical | {i * 3} | 2.8 |",
+            "",
+            "1. Reduce first response time",
+            "2. Publish a status page",
+            "   1. Include incident history",
+            "3. Follow up on refunds within __48 hours__",
+            "",
+            "> Customers who received a follow-up rated support higher.",
+            ""
+        ]))
+    return "\n".join(["# Batch Report", ""] + sections)
+
+class StubRAGEngine(RAGEngine):
+    """RAGEngine with a fake Groq client that returns a canned report"""
+    
+    def __init__(self, latency: float = 0.0):
+        self.model = 'stub'
+        self.latency = latency
+        
+        def create(**kwargs):
+            if self.latency:
+                time.sleep(self.latency)
+            return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=STUB_REPORT))])
+        
+        self.client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+
+def time_call(fn: Callable[[], Any], repeat: int) -> Dict[str, Any]:
+    """Time repeated calls and summarize in milliseconds"""
+    runs = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        runs.append((time.perf_counter() - start) * 1000)
+    return {
+        'min_ms': round(min(runs), 3),
+        'median_ms': round(statistics.median(runs), 3),
+        'mean_ms': round(statistics.fmean(runs), 3),
+        'runs': len(runs)
+    }
+
+def bench_analytics(csv_path: str, repeat: int) -> Dict[str, Any]:
+    results = {}
+    processor = DataProcessor(csv_path)
+    results['load_data'] = time_call(processor.load_data, max(1, repeat // 2))
+    
+    for method in ('get_sentiment_distribution', 'get_category_distribution', 'get_rating_by_category',
+                   'get_priority_issues', 'get_time_series_data', 'get_confidence_stats',
+                   'get_category_sentiment_correlation', 'get_all_analytics', 'get_data_summary'):
+        results[method] = time_call(getattr(processor, method), repeat)
+    return results
+
+def bench_rag(csv_path: str, repeat: int) -> Dict[str, Any]:
+    processor = DataProcessor(csv_path)
+    analytics = processor.get_all_analytics()
+    summary = processor.get_data_summary()
+    engine = StubRAGEngine()
+    return {
+        'build_context': time_call(lambda: engine._build_context(summary, analytics), repeat),
+        'generate_report_stub_llm': time_call(lambda: engine.generate_report(summary, analytics), repeat),
+        'quick_insights': time_call(lambda: engine.generate_quick_insights(analytics), repeat)
+    }
+
+def bench_pdf(csv_path: str, repeat: int) -> Dict[str, Any]:
+    from pdf_generator import PDFGenerator, ChartCache
+    
+    analytics = DataProcessor(csv_path).get_all_analytics()
+    serial = PDFGenerator(chart_workers=0)
+    parallel = PDFGenerator(chart_workers=3)
+    parallel.render_charts(analytics)  # start worker processes outside the timing
+    
+    def cold(generator):
+        generator.chart_cache = ChartCache()
+        generator.render_charts(analytics)
+    
+    results = {
+        'charts_cold_serial': time_call(lambda: cold(serial), repeat),
+        'charts_cold_parallel': time_call(lambda: cold(parallel), repeat),
+        'charts_cached': time_call(lambda: serial.render_charts(analytics), repeat),
+        'pdf_build_cached_charts': time_call(lambda: serial.generate_pdf_bytes(STUB_REPORT, analytics), repeat)
+    }
+    parallel.close()
+    return results
+
+def bench_markdown(repeat: int, segments: int = 200) -> Dict[str, Any]:
+    """Single-pass markdown tokenizer against the original line-by-line converter"""
+    import io
+    from reportlab.lib.pagesizes import letter
+    from reportlab.platypus import SimpleDocTemplate
+    from benchmarks.legacy_markdown import legacy_report_content
+    from markdown_flowables import tokenize_markdown
+    from pdf_generator import PDFGenerator
+    
+    generator = PDFGenerator(chart_workers=0)
+    report = long_report(segments)
+    
+    def legacy():
+        story = []
+        legacy_report_content(generator.styles, story, report)
+        return story
+    
+    def layout(story):
+        SimpleDocTemplate(io.BytesIO(), pagesize=letter, rightMargin=72, leftMargin=72,
+                          topMargin=72, bottomMargin=18).build(story)
+    
+    # Paragraph markup parsing and layout dominate both converters; tokenize
+    # isolates the cost of the markdown pass itself
+    return {
+        f'tokenize_{segments}_segments': time_call(lambda: list(tokenize_markdown(report)), repeat),
+        f'convert_legacy_{segments}_segments': time_call(legacy, repeat),
+        f'convert_tokenizer_{segments}_segments': time_call(lambda: generator.markdown.flowables(report), repeat),
+        f'layout_legacy_{segments}_segments': time_call(lambda: layout(legacy()), repeat),
+        f'layout_tokenizer_{segments}_segments': time_call(lambda: layout(generator.markdown.flowables(report)), repeat)
+    }
+
+async def _load_test(client, method: str, url: str, requests: int, concurrency: int) -> Dict[str, Any]:
+    latencies: List[float] = []
+    errors = 0
+    semaphore = asyncio.Semaphore(concurrency)
+    
+    async def one():
+        nonlocal errors
+        async with semaphore:
+            start = time.perf_counter()
+            response = await client.request(method, url)
+            latencies.append((time.perf_counter() - start) * 1000)
+            if response.status_code >= 400:
+                errors += 1
+    
+    start = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(requests)))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return {
+        'p50_ms': round(latencies[len(latencies) // 2], 3),
+        'p95_ms': round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))], 3),
+        'max_ms': round(latencies[-1], 3),
+        'throughput_rps': round(requests / elapsed, 2),
+        'requests': requests,
+        'concurrency': concurrency,
+        'errors': errors
+    }
+
+def bench_endpoints(csv_path: str, requests: int, concurrency: int, llm_latency: float) -> Dict[str, Any]:
+    import httpx
+    import main
+    
+    processor = DataProcessor(csv_path)
+    main.get_data_processor = lambda: processor
+    main.get_rag_engine = lambda: StubRAGEngine(latency=llm_latency)
+    
+    endpoints = {
+        'GET /api/health': ('GET', '/api/health'),
+        'GET /api/charts-data': ('GET', '/api/charts-data'),
+        'POST /api/analyze-data': ('POST', '/api/analyze-data'),
+        'POST /api/generate-report': ('POST', '/api/generate-report'),
+        'POST /api/generate-pdf?stream=true': ('POST', '/api/generate-pdf?stream=true')
+    }
+    
+    async def run():
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url='http://bench', timeout=None) as client:
+            results = {}
+            for name, (method, url) in endpoints.items():
+                await client.request(method, url)  # warm caches and lazy imports
+                results[name] = await _load_test(client, method, url, requests, concurrency)
+            return results
+    
+    return asyncio.run(run())
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True, cwd=os.path.dirname(__file__)).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> int:
+    """Print per-benchmark ratios against a baseline run; return regression count"""
+    regressions = 0
+    for name, result in sorted(current['results'].items()):
+        base = baseline['results'].get(name)
+        metric = 'median_ms' if 'median_ms' in result else 'p50_ms'
+        if not base or metric not in base or not base[metric]:
+            continue
+        ratio = result[metric] / base[metric]
+        flag = 'REGRESSION' if ratio > threshold else ''
+        regressions += bool(flag)
+        print(f"{name:70s} {base[metric]:10.2f} -> {result[metric]:10.2f} ms  x{ratio:5.2f} {flag}")
+    return regressions
+
+def main_cli():
+    parser = argparse.ArgumentParser(description="Run backend performance benchmarks")
+    parser.add_argument('--sizes', default='10k', help="comma-separated dataset sizes: 10k,100k,1m,10m")
+    parser.add_argument('--suites', default='analytics,rag,pdf,endpoints,markdown')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--requests', type=int, default=50, help="requests per endpoint in the load test")
+    parser.add_argument('--concurrency', type=int, default=10)
+    parser.add_argument('--llm-latency', type=float, default=0.0, help="seconds of simulated LLM latency")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help="results JSON path (default: benchmarks/results/<time>_<commit>.json)")
+    parser.add_argument('--compare', help="baseline results JSON to compare against")
+    parser.add_argument('--threshold', type=float, default=1.2, help="slowdown ratio reported as a regression")
+    args = parser.parse_args()
+    
+    suites = set(args.suites.split(','))
+    commit = git_commit()
+    report = {
+        'commit': commit,
+        'timestamp': datetime.now().isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'config': vars(args),
+        'results': {}
+    }
+    
+    # The markdown suite does not depend on the dataset, so it runs once
+    if 'markdown' in suites:
+        for name, result in bench_markdown(args.repeat).items():
+            report['results'][f"markdown/{name}"] = result
+            print(f"  markdown/{name}: {result}")
+    
+    for size in args.sizes.split(','):
+        csv_path = ensure_dataset(size, seed=args.seed)
+        print(f"Dataset {size}: {csv_path}")
+        suite_runs = {
+            'analytics': lambda: bench_analytics(csv_path, args.repeat),
+            'rag': lambda: bench_rag(csv_path, args.repeat),
+            'pdf': lambda: bench_pdf(csv_path, args.repeat),
+            'endpoints': lambda: bench_endpoints(csv_path, args.requests, args.concurrency, args.llm_latency)
+        }
+        for suite, run in suite_runs.items():
+            if suite not in suites:
+                continue
+            for name, result in run().items():
+                key = f"{size}/{suite}/{name}"
+                report['results'][key] = result
+                print(f"  {key}: {result}")
+    
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    output = args.output or os.path.join(RESULTS_DIR, f"{datetime.now():%Y%m%d_%H%M%S}_{commit}.json")
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {output}")
+    
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if compare(report, baseline, args.threshold):
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,104 @@
+"""Synthetic complaint data scaled up from data/Data_source.csv
+
+The generator keeps the shape of the real data: the category mix is skewed
+(Zipf over categories ordered by real frequency), sentiment follows the real
+per-category sentiment mix, ratings follow sentiment, and complaint texts are
+resampled from the real vocabulary with the real text-length distribution.
+Rows are written in chunks so 10M-row files never sit in memory.
+    
+    python -m benchmarks.synthetic_data --rows 1000000 --output benchmarks/data/complaints_1m.csv
+"""
+import argparse
+import os
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+SOURCE_CSV = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data', 'Data_source.csv')
+DATA_DIR = os.path.join(os.path.dirname(__file__), 'data')
+SENTIMENT_RATINGS = {'Best': 5, 'Good': 4, 'Average': 3, 'Fair': 2, 'Bad': 1}
+SIZES = {'10k': 10_000, '100k': 100_000, '1m': 1_000_000, '10m': 10_000_000}
+
+class ComplaintSynthesizer:
+    def __init__(self, source_csv: str = SOURCE_CSV, seed: int = 42, category_skew: float = 1.1,
+                 days: int = 730):
+        source = pd.read_csv(source_csv)
+        self.rng = np.random.default_rng(seed)
+        self.days = days
+        
+        # Zipf weights over categories ranked by their real frequency
+        counts = source['category'].value_counts()
+        self.categories = counts.index.to_numpy()
+        weights = 1.0 / np.arange(1, len(self.categories) + 1) ** category_skew
+        self.category_weights = weights / weights.sum()
+        
+        # Sentiment mix per category, falling back to the global mix
+        global_mix = source['sentiment'].value_counts(normalize=True)
+        self.sentiments = global_mix.index.to_numpy()
+        mix = pd.crosstab(source['category'], source['sentiment'], normalize='index')
+        mix = mix.reindex(index=self.categories, columns=self.sentiments, fill_value=0)
+        self.sentiment_mix = mix.to_numpy()
+        
+        texts = source['complaint_text'].astype(str)
+        self.vocabulary = np.array(' '.join(texts).split())
+        self.word_counts = texts.str.split().str.len().to_numpy()
+        self.confidence = source['confidence'].to_numpy()
+    
+    def generate(self, rows: int, start_id: int = 1) -> pd.DataFrame:
+        """Generate one chunk of synthetic complaints"""
+        rng = self.rng
+        category_idx = rng.choice(len(self.categories), size=rows, p=self.category_weights)
+        
+        # Inverse-CDF sampling of sentiment conditioned on category
+        cdf = np.cumsum(self.sentiment_mix[category_idx], axis=1)
+        sentiment_idx = (rng.random((rows, 1)) > cdf).sum(axis=1).clip(0, len(self.sentiments) - 1)
+        sentiments = self.sentiments[sentiment_idx]
+        
+        lengths = rng.choice(self.word_counts, size=rows)
+        words = self.vocabulary[rng.integers(0, len(self.vocabulary), size=int(lengths.sum()))]
+        texts = [' '.join(chunk) for chunk in np.split(words, np.cumsum(lengths)[:-1])]
+        
+        end = pd.Timestamp.now().normalize()
+        offsets = rng.integers(0, self.days * 86400, size=rows)
+        created_at = end - pd.to_timedelta(offsets, unit='s')
+        
+        return pd.DataFrame({
+            'id': np.arange(start_id, start_id + rows),
+            'complaint_text': texts,
+            'category': self.categories[category_idx],
+            'sentiment': sentiments,
+            'rating': [SENTIMENT_RATINGS.get(s, 3) for s in sentiments],
+            'confidence': np.round(np.clip(rng.choice(self.confidence, size=rows) + rng.normal(0, 0.03, rows), 0, 1), 6),
+            'created_at': created_at.strftime('%Y-%m-%d %H:%M:%S')
+        })
+    
+    def write_csv(self, rows: int, path: str, chunk_size: int = 100_000) -> str:
+        """Write `rows` synthetic complaints to a CSV in bounded-memory chunks"""
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        written = 0
+        with open(path, 'w', newline='', encoding='utf-8') as f:
+            while written < rows:
+                chunk = self.generate(min(chunk_size, rows - written), start_id=written + 1)
+                chunk.to_csv(f, header=written == 0, index=False)
+                written += len(chunk)
+        return path
+
+def ensure_dataset(size: str, seed: int = 42, data_dir: Optional[str] = None) -> str:
+    """Return the path of a cached synthetic dataset, generating it if missing"""
+    rows = SIZES[size] if size in SIZES else int(size)
+    path = os.path.join(data_dir or DATA_DIR, f'complaints_{size}_seed{seed}.csv')
+    if not os.path.exists(path):
+        ComplaintSynthesizer(seed=seed).write_csv(rows, path)
+    return path
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate synthetic complaint CSVs")
+    parser.add_argument('--rows', type=int, required=True)
+    parser.add_argument('--output', required=True)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--category-skew', type=float, default=1.1)
+    args = parser.parse_args()
+    
+    ComplaintSynthesizer(seed=args.seed, category_skew=args.category_skew).write_csv(args.rows, args.output)
+    print(f"Wrote {args.rows} rows to {args.output}")
@@ -0,0 +1,301 @@
+import os
+from itertools import islice
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from sketches import hash64
+from text_utils import tokenize
+
+_MAX32 = np.iinfo(np.uint32).max
+
+def _mix(x: np.ndarray) -> np.ndarray:
+    """splitmix64 finalizer; uint64 arithmetic wraps, which is intended"""
+    x = (x ^ (x >> np.uint64(30))) * np.uint64(0xbf58476d1ce4e5b9)
+    x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94d049bb133111eb)
+    return x ^ (x >> np.uint64(31))
+
+def lookup_clusters(member_ids: np.ndarray, cluster_ids: np.ndarray, sizes: np.ndarray,
+                    ids) -> Tuple[np.ndarray, np.ndarray]:
+    """Cluster ids and sizes for complaint ids from ComplaintClusterer.assignments()
+    
+    Unknown ids get cluster id -1 and size 0.
+    """
+    ids = np.asarray(ids, dtype=np.int64)
+    found_ids = np.full(len(ids), -1, dtype=np.int64)
+    found_sizes = np.zeros(len(ids), dtype=np.int64)
+    if not len(member_ids) or not len(ids):
+        return found_ids, found_sizes
+    
+    pos = np.minimum(np.searchsorted(member_ids, ids), len(member_ids) - 1)
+    known = member_ids[pos] == ids
+    found_ids[known] = cluster_ids[pos[known]]
+    found_sizes[known] = sizes[pos[known]]
+    return found_ids, found_sizes
+
+def filter_clusters(clusters: List[Dict[str, Any]], min_size: int = 2, category: str = None,
+                    limit: int = None) -> List[Dict[str, Any]]:
+    """Filter a largest-first list from ComplaintClusterer.clusters() as clusters() does"""
+    return [
+        cluster for cluster in clusters
+        if cluster['size'] >= min_size and (category is None or category in cluster['categories'])
+    ][:limit]
+
+class ComplaintClusterer:
+    """Incremental near-duplicate clustering of complaint texts with MinHash-LSH
+    
+    Each text becomes a set of word shingles summarized by a MinHash
+    signature. Signatures are split into bands; complaints sharing any band
+    are candidates, and candidates whose estimated Jaccard similarity reaches
+    `threshold` are joined with union-find. Band tables are sorted arrays, so
+    a batch costs O(n log n) with no pairwise comparisons, and new rows are
+    folded in without touching old ones.
+    
+    A cluster is identified by the id of its earliest complaint. Its
+    representative is the earliest member whose text is still held: texts are
+    kept for clustered complaints and for the `recent_snippets` latest others,
+    so a complaint joining an older one that was let go represents the cluster.
+    """
+    
+    def __init__(self, num_perm: int = 64, bands: int = 16, threshold: float = None,
+                 shingle_size: int = 3, snippet_chars: int = 240, recent_snippets: int = 10000,
+                 seed: int = 1):
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows_per_band = num_perm // bands
+        self.threshold = threshold or float(os.getenv('CLUSTER_SIMILARITY', 0.6))
+        self.shingle_size = shingle_size
+        self.snippet_chars = snippet_chars
+        self.recent_snippets = recent_snippets
+        self._seeds = np.random.default_rng(seed).integers(0, 2 ** 63, size=num_perm, dtype=np.uint64)
+        
+        self.count = 0
+        self.last_id = None
+        self.signatures = np.empty((0, num_perm), dtype=np.uint32)
+        self.parent = np.empty(0, dtype=np.int64)
+        self.ids = np.empty(0, dtype=np.int64)
+        self.category_codes = np.empty(0, dtype=np.int32)
+        self.category_names: List[str] = []
+        self._category_index: Dict[str, int] = {}
+        # Root of each multi-member cluster -> (representative, its short text)
+        self.snippets: Dict[int, Tuple[int, str]] = {}
+        # Short texts of the latest complaints not in a cluster, oldest first
+        self._recent_snippets: Dict[int, str] = {}
+        # Per band: sorted bucket keys and the first complaint seen in each bucket
+        self._band_keys = [np.empty(0, dtype=np.uint64) for _ in range(bands)]
+        self._band_docs = [np.empty(0, dtype=np.int64) for _ in range(bands)]
+    
+    @property
+    def expected_threshold(self) -> float:
+        """Similarity at which a pair becomes a candidate with probability ~50%"""
+        return (1 / self.bands) ** (1 / self.rows_per_band)
+    
+    def _shingles(self, text: str) -> List[str]:
+        tokens = tokenize(text)
+        if len(tokens) <= self.shingle_size:
+            return [' '.join(tokens)] if tokens else []
+        return [' '.join(tokens[i:i + self.shingle_size]) for i in range(len(tokens) - self.shingle_size + 1)]
+    
+    def signatures_for(self, texts) -> np.ndarray:
+        """MinHash signatures for a batch of texts; empty texts get all-max rows"""
+        doc_shingles = [self._shingles(text) for text in texts]
+        lengths = np.fromiter((len(s) for s in doc_shingles), dtype=np.int64, count=len(doc_shingles))
+        signatures = np.full((len(doc_shingles), self.num_perm), _MAX32, dtype=np.uint32)
+        if not lengths.sum():
+            return signatures
+        
+        hashes = hash64([s for shingles in doc_shingles for s in shingles], categorize=False)
+        has_shingles = lengths > 0
+        starts = (np.cumsum(lengths) - lengths)[has_shingles]
+        # One seeded hash function per permutation, minimized per document in one pass
+        for i, seed in enumerate(self._seeds):
+            mixed = (_mix(hashes ^ seed) >> np.uint64(32)).astype(np.uint32)
+            signatures[has_shingles, i] = np.minimum.reduceat(mixed, starts)
+        return signatures
+    
+    def _band_hashes(self, signatures: np.ndarray) -> np.ndarray:
+        keys = np.zeros((len(signatures), self.bands), dtype=np.uint64)
+        for band in range(self.bands):
+            for column in range(band * self.rows_per_band, (band + 1) * self.rows_per_band):
+                keys[:, band] = _mix(keys[:, band] ^ signatures[:, column].astype(np.uint64))
+        return keys
+    
+    def _reserve(self, n: int):
+        capacity = len(self.parent)
+        if self.count + n <= capacity:
+            return
+        capacity = max(self.count + n, 2 * capacity, 1024)
+        for name in ('signatures', 'parent', 'ids', 'category_codes'):
+            old = getattr(self, name)
+            grown = np.empty((capacity,) + old.shape[1:], dtype=old.dtype)
+            grown[:self.count] = old[:self.count]
+            setattr(self, name, grown)
+    
+    def add(self, frame: pd.DataFrame):
+        """Cluster a batch of complaints with ids above the last one seen"""
+        if self.last_id is not None:
+            frame = frame[frame['id'] > self.last_id]
+        if frame.empty:
+            return
+        frame = frame.sort_values('id', kind='stable')
+        
+        n = len(frame)
+        self._reserve(n)
+        start = self.count
+        docs = np.arange(start, start + n, dtype=np.int64)
+        texts = frame['complaint_text'].fillna('').astype(str)
+        signatures = self.signatures_for(texts)
+        
+        self.signatures[start:start + n] = signatures
+        self.parent[start:start + n] = docs
+        self.ids[start:start + n] = frame['id'].to_numpy(dtype=np.int64)
+        self.category_codes[start:start + n] = [self._category_code(c) for c in frame['category'].astype(str)]
+        self._recent_snippets.update(zip(docs.tolist(), (text[:self.snippet_chars] for text in texts)))
+        self.count += n
+        self.last_id = int(self.ids[self.count - 1])
+        
+        # Texts without words never match anything, including each other
+        usable = (signatures != _MAX32).any(axis=1)
+        pairs = self._candidate_pairs(self._band_hashes(signatures[usable]), docs[usable])
+        if len(pairs):
+            same = (self.signatures[pairs[:, 0]] == self.signatures[pairs[:, 1]]).mean(axis=1)
+            for a, b in pairs[same >= self.threshold]:
+                self._union(int(a), int(b))
+        
+        # Trimmed only after the unions, so every new cluster has a representative text
+        excess = len(self._recent_snippets) - self.recent_snippets
+        for doc in list(islice(self._recent_snippets, max(excess, 0))):
+            del self._recent_snippets[doc]
+    
+    def _candidate_pairs(self, keys: np.ndarray, docs: np.ndarray) -> np.ndarray:
+        """Pairs of (new complaint, earlier complaint) sharing a band bucket"""
+        found = []
+        for band in range(self.bands):
+            band_keys = keys[:, band]
+            existing_keys, existing_docs = self._band_keys[band], self._band_docs[band]
+            
+            # Buckets that already exist from earlier batches
+            pos = np.searchsorted(existing_keys, band_keys)
+            pos_clipped = np.minimum(pos, max(len(existing_keys) - 1, 0))
+            hit = (pos < len(existing_keys)) & (existing_keys[pos_clipped] == band_keys) if len(existing_keys) else np.zeros(len(band_keys), dtype=bool)
+            found.append(np.column_stack([docs[hit], existing_docs[pos_clipped[hit]]]))
+            
+            # Buckets new in this batch: everyone pairs with the first complaint in it
+            new_keys, first, inverse = np.unique(band_keys[~hit], return_index=True, return_inverse=True)
+            new_docs = docs[~hit]
+            leaders = new_docs[first][inverse.ravel()]
+            followers = new_docs != leaders
+            found.append(np.column_stack([new_docs[followers], leaders[followers]]))
+            
+            insert_at = np.searchsorted(existing_keys, new_keys)
+            self._band_keys[band] = np.insert(existing_keys, insert_at, new_keys)
+            self._band_docs[band] = np.insert(existing_docs, insert_at, new_docs[first])
+        
+        pairs = np.concatenate(found) if found else np.empty((0, 2), dtype=np.int64)
+        return np.unique(pairs, axis=0) if len(pairs) else pairs
+    
+    def _category_code(self, category: str) -> int:
+        code = self._category_index.get(category)
+        if code is None:
+            code = self._category_index[category] = len(self.category_names)
+            self.category_names.append(category)
+        return code
+    
+    def _find(self, doc: int) -> int:
+        parent = self.parent
+        while parent[doc] != doc:
+            parent[doc] = parent[parent[doc]]
+            doc = parent[doc]
+        return doc
+    
+    def _union(self, a: int, b: int):
+        root_a, root_b = int(self._find(a)), int(self._find(b))
+        if root_a != root_b:
+            # The earlier complaint stays the root; its text represents the cluster if still held
+            root, other = min(root_a, root_b), max(root_a, root_b)
+            self.parent[other] = root
+            kept, merged = self._take_citation(root), self._take_citation(other)
+            if kept or merged:
+                self.snippets[root] = kept or merged
+    
+    def _take_citation(self, root: int) -> Optional[Tuple[int, str]]:
+        """Representative and text held for a root, removed from where they were kept"""
+        if root in self.snippets:
+            return self.snippets.pop(root)
+        text = self._recent_snippets.pop(root, None)
+        return None if text is None else (root, text)
+    
+    def _roots(self) -> np.ndarray:
+        """Root of every complaint, fully compressing the forest"""
+        parent = self.parent[:self.count]
+        while True:
+            grandparent = parent[parent]
+            if np.array_equal(grandparent, parent):
+                break
+            parent = grandparent
+        self.parent[:self.count] = parent
+        return parent
+    
+    def assignments(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Ids of all clustered complaints in ascending order, with their cluster ids and sizes"""
+        known_ids = self.ids[:self.count]
+        if not self.count:
+            return known_ids, known_ids, known_ids
+        roots = self._roots()
+        return known_ids, known_ids[roots], np.bincount(roots, minlength=self.count)[roots]
+    
+    def lookup(self, ids) -> Tuple[np.ndarray, np.ndarray]:
+        """Cluster ids and sizes for complaint ids; -1 and 0 for unknown ids"""
+        return lookup_clusters(*self.assignments(), ids)
+    
+    def clusters(self, min_size: int = 2, category: str = None, limit: int = None) -> List[Dict[str, Any]]:
+        """Clusters of at least min_size complaints, largest first"""
+        if not self.count:
+            return []
+        roots = self._roots()
+        sizes = np.bincount(roots, minlength=self.count)
+        members = sizes[roots] >= min_size
+        if category is not None:
+            code = self._category_index.get(category)
+            if code is None:
+                return []
+            members &= np.isin(roots, roots[self.category_codes[:self.count] == code])
+        if not members.any():
+            return []
+        
+        grouped = pd.DataFrame({'root': roots[members], 'category': self.category_codes[:self.count][members]})
+        breakdown = grouped.groupby(['root', 'category']).size()
+        order = sorted(set(grouped['root'].tolist()), key=lambda root: (-sizes[root], root))
+        
+        result = []
+        for root in order[:limit]:
+            # Complaints outside clusters may have had their text let go
+            representative, text = self.snippets.get(root) or (root, self._recent_snippets.get(root))
+            result.append({
+                'cluster_id': int(self.ids[root]),
+                'size': int(sizes[root]),
+                'representative': {
+                    'id': int(self.ids[representative]),
+                    'category': self.category_names[self.category_codes[representative]],
+                    'complaint_text': text
+                },
+                'categories': {self.category_names[c]: int(n) for c, n in breakdown.loc[root].items()}
+            })
+        return result
+    
+    def summary(self) -> Dict[str, int]:
+        """Complaint, distinct-complaint and duplicate counts"""
+        if not self.count:
+            return {'complaints': 0, 'distinct_complaints': 0, 'duplicate_clusters': 0, 'duplicates': 0}
+        roots = self._roots()
+        sizes = np.bincount(roots, minlength=self.count)
+        distinct = int(np.count_nonzero(sizes))
+        return {
+            'complaints': self.count,
+            'distinct_complaints': distinct,
+            'duplicate_clusters': int(np.count_nonzero(sizes >= 2)),
+            'duplicates': self.count - distinct
+        }
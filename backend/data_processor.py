@@ -1,90 +1,391 @@
 import pandas as pd
 from datetime import datetime
-from typing import Dict, List, Any
+from typing import Callable, Dict, List, Any, Iterator, Tuple
 import os
+import hashlib
+import time
+import threading
+
+from anomaly_detector import AnomalyDetector, filter_alerts
+from complaint_clusters import ComplaintClusterer, filter_clusters, lookup_clusters
+from metrics import ANALYTICS_SECONDS, CACHE_REQUESTS, timed
+from olap_cube import ComplaintCube
+from rollup_manager import RollupManager
+from shared_state import SharedAnalyticsStore, SharedStateRefresher
+from sketches import ComplaintSketches, priority_count
+from topic_extractor import TopicExtractor
+
+# Largest clusters and top terms per group the shared-state leader publishes
+SHARED_CLUSTERS = 1000
+SHARED_TOPIC_TERMS = 50
 
 class DataProcessor:
-    def __init__(self, csv_path: str = None):
+    def __init__(self, csv_path: str = None, db_config=None, shared_state_dir: str = None,
+                 approximate: bool = None):
         self.csv_path = csv_path or os.path.join(os.path.dirname(__file__), 'data', 'Datafinal1.csv')
         self.df = None
+        self._csv_stat = None
+        # Endpoints run in the threadpool; one thread reloads the CSV while
+        # the others keep reading the previous frame
+        self._df_lock = threading.Lock()
+        self._reload_lock = threading.Lock()
+        self.db_config = db_config
+        # Push aggregations down to MySQL instead of loading the table into pandas
+        self.use_database = db_config is not None and db_config.use_database
+        # Serve range queries from daily rollups, touching raw rows only for today
+        self.rollup_manager = RollupManager(db_config) if self.use_database and db_config.use_rollups else None
+        # Source fingerprint each incremental subsystem last caught up with
+        self._incremental_marks: Dict[str, Dict[str, Any]] = {}
+        # Approximate mode folds new rows into persisted sketches instead of rescanning
+        self.approximate = os.getenv('ANALYTICS_MODE', 'exact').lower() == 'approximate' if approximate is None else approximate
+        self.sketch_path = os.getenv('SKETCH_PATH')
+        self.sketches = None
+        self._sketch_lock = threading.RLock()
+        # Online spike/sentiment-shift detection over newly arrived complaints
+        self.anomaly_detector = AnomalyDetector()
+        self._anomaly_last_id = None
+        self._anomaly_version = None
+        self._anomaly_lock = threading.Lock()
+        # Near-duplicate clusters over complaint texts, updated incrementally
+        self.clustering = os.getenv('COMPLAINT_CLUSTERING', 'true').lower() == 'true'
+        self.clusterer = ComplaintClusterer()
+        self._cluster_lock = threading.Lock()
+        # Per-category and per-sentiment term statistics, updated incrementally
+        self.topic_extractor = TopicExtractor()
+        self._topic_lock = threading.Lock()
+        # Dense complaint counts by category, sentiment, rating and day for pivots
+        self.cube = ComplaintCube()
+        self._cube_lock = threading.Lock()
+        
+        # Multi-worker mode: one refresher publishes, every worker memory-maps
+        shared_state_dir = shared_state_dir or os.getenv('SHARED_STATE_DIR')
+        self.shared_state = None
+        self._shared_wait_done = False
+        self._shared_cube = None
+        if shared_state_dir:
+            self.shared_state = SharedAnalyticsStore(shared_state_dir)
+            self._refresher = SharedStateRefresher(
+                self.shared_state, self._get_source_version, self._build_shared_state,
+                interval=float(os.getenv('SHARED_REFRESH_SECONDS', 2))
+            )
+            self._refresher.start()
         
+    @timed(ANALYTICS_SECONDS, 'load', method='load_data')
     def load_data(self) -> pd.DataFrame:
-        """Load CSV data into pandas DataFrame"""
+        """Load CSV data into pandas DataFrame
+        
+        The new frame replaces the old one only once it is fully read, and
+        frames are never modified afterwards, so readers holding the old one
+        always see complete data.
+        """
+        try:
+            stat = os.stat(self.csv_path)
+            df = pd.read_csv(self.csv_path)
+        except Exception as e:
+            raise Exception(f"Error loading CSV: {str(e)}")
+        with self._df_lock:
+            self.df, self._csv_stat = df, (stat.st_mtime_ns, stat.st_size)
+        return df
+    
+    def _csv_changed(self) -> bool:
         try:
-            self.df = pd.read_csv(self.csv_path)
+            stat = os.stat(self.csv_path)
+        except OSError:
+            return False
+        return self._csv_stat != (stat.st_mtime_ns, stat.st_size)
+    
+    def _frame(self) -> pd.DataFrame:
+        """Get the current DataFrame, reloading it first if the CSV changed on disk"""
+        df = self.df
+        if df is not None and not self._csv_changed():
+            return df
+        with self._reload_lock:
+            # Another thread may have reloaded while this one waited
+            if self.df is None or self._csv_changed():
+                self.load_data()
             return self.df
+    
+    def get_data_version(self) -> Tuple[str, datetime]:
+        """Get an opaque version string and last-modified time of the source data
+        
+        Cheap enough to call per request: a file stat for CSV, a single indexed
+        aggregate for MySQL. A CSV that changed on disk is reloaded on next use.
+        In shared-state mode this is the version currently published to workers.
+        """
+        snapshot = self._shared_snapshot()
+        if snapshot is not None:
+            return snapshot.version, snapshot.last_modified
+        return self._get_source_version()
+    
+    def _get_source_version(self) -> Tuple[str, datetime]:
+        """Get the version of the CSV file or MySQL table itself"""
+        if self.use_database:
+            version = self.db_config.fetch_data_version()
+            last_modified = version['last_modified'] or datetime.fromtimestamp(0)
+            return f"db-{version['count']}-{version['max_id']}-{last_modified.isoformat()}", last_modified
+        
+        try:
+            stat = os.stat(self.csv_path)
+        except OSError as e:
+            raise Exception(f"Error loading CSV: {str(e)}")
+        return f"csv-{stat.st_mtime_ns}-{stat.st_size}", datetime.fromtimestamp(stat.st_mtime)
+    
+    def _source_fingerprint(self, prefix_size: int = None) -> Dict[str, Any]:
+        """What an incremental subsystem needs to tell an append from an edit
+        
+        For a CSV: its size and digest, plus the digest of its first
+        prefix_size bytes. For MySQL or the embedded store: row count and max id.
+        """
+        if self.use_database:
+            version = self.db_config.fetch_data_version()
+            return {'count': int(version['count'] or 0), 'max_id': version['max_id']}
+        
+        digest, prefix_digest, size = hashlib.blake2b(digest_size=16), None, 0
+        try:
+            with open(self.csv_path, 'rb') as f:
+                for block in iter(lambda: f.read(1 << 20), b''):
+                    if prefix_size is not None and prefix_digest is None and size + len(block) >= prefix_size:
+                        head = digest.copy()
+                        head.update(block[:prefix_size - size])
+                        prefix_digest = head.hexdigest()
+                    digest.update(block)
+                    size += len(block)
+        except OSError as e:
+            raise Exception(f"Error loading CSV: {str(e)}")
+        return {'size': size, 'digest': digest.hexdigest(), 'prefix_digest': prefix_digest}
+    
+    def _update_incremental(self, name: str, last_id, reset: Callable[[], None],
+                            ingest: Callable[[pd.DataFrame], None],
+                            chunks: Callable[[Any], Iterator[pd.DataFrame]] = None) -> bool:
+        """Bring an incremental subsystem up to date, rebuilding it unless the source only grew
+        
+        When the source version changed and the change is a pure append (the
+        CSV's earlier bytes are unchanged, or no stored row up to the old max
+        id disappeared), only rows past last_id are ingested. In-place edits
+        and deletes reset the subsystem and rebuild it from every row, so it
+        never disagrees with the exact analytics. Callers hold the
+        subsystem's lock. Returns whether the source was read.
+        """
+        version = self._get_source_version()[0]
+        mark = self._incremental_marks.get(name)
+        if mark is not None and mark['version'] == version:
+            return False
+        
+        chunks = chunks or (lambda after_id: self.iter_complaint_chunks(chunksize=50000, after_id=after_id))
+        source = self._source_fingerprint(mark.get('size') if mark else None)
+        appended = mark is not None and (self.use_database or source['prefix_digest'] == mark['digest'])
+        
+        def scan(after_id) -> Tuple[int, int]:
+            """Ingest rows past after_id; returns all rows read and those up to the fingerprinted max id"""
+            rows = known = 0
+            for chunk in chunks(after_id):
+                ingest(chunk)
+                rows += len(chunk)
+                if self.use_database and source['max_id'] is not None:
+                    known += int((chunk['id'] <= source['max_id']).sum())
+            return rows, known
+        
+        if not appended:
+            reset()
+        rows = mark['rows'] if appended else 0
+        scanned, known = scan(last_id if appended else None)
+        if appended and self.use_database and rows + known != source['count']:
+            # Rows at or below the old max id were deleted
+            reset()
+            rows = 0
+            scanned, _ = scan(None)
+        self._incremental_marks[name] = {**source, 'version': version, 'rows': rows + scanned}
+        return True
+    
+    def iter_complaint_chunks(self, chunksize: int = None, after_id: int = None) -> Iterator[pd.DataFrame]:
+        """Stream full complaint rows as DataFrame chunks with bounded memory
+        
+        With after_id only rows with a larger id are returned; MySQL resumes
+        from the id index, a CSV is scanned and filtered.
+        """
+        if self.use_database:
+            yield from self.db_config.iter_complaint_frames(fetch_size=chunksize, after=(after_id,) if after_id else None)
+            return
+        
+        try:
+            for chunk in pd.read_csv(self.csv_path, chunksize=chunksize or 1000):
+                yield chunk if not after_id else chunk[chunk['id'] > after_id]
         except Exception as e:
             raise Exception(f"Error loading CSV: {str(e)}")
     
+    @timed(ANALYTICS_SECONDS, method='sentiment_distribution')
     def get_sentiment_distribution(self) -> Dict[str, int]:
         """Get distribution of sentiments"""
-        if self.df is None:
-            self.load_data()
+        if self.use_database:
+            return self._format_counts(self.db_config.fetch_aggregate('sentiment_distribution'), 'sentiment')
         
-        sentiment_counts = self.df['sentiment'].value_counts().to_dict()
+        df = self._frame()
+        
+        sentiment_counts = df['sentiment'].value_counts().to_dict()
         return sentiment_counts
     
+    @timed(ANALYTICS_SECONDS, method='category_distribution')
     def get_category_distribution(self) -> Dict[str, int]:
         """Get distribution of complaint categories"""
-        if self.df is None:
-            self.load_data()
+        if self.use_database:
+            return self._format_counts(self.db_config.fetch_aggregate('category_distribution'), 'category')
+        
+        df = self._frame()
         
-        category_counts = self.df['category'].value_counts().to_dict()
+        category_counts = df['category'].value_counts().to_dict()
         return category_counts
     
+    @timed(ANALYTICS_SECONDS, method='rating_by_category')
     def get_rating_by_category(self) -> Dict[str, float]:
         """Get average rating per category"""
-        if self.df is None:
-            self.load_data()
+        if self.use_database:
+            return self._format_rating_by_category(self.db_config.fetch_aggregate('rating_by_category'))
+        
+        df = self._frame()
         
-        rating_by_category = self.df.groupby('category')['rating'].mean().to_dict()
+        rating_by_category = df.groupby('category')['rating'].mean().to_dict()
         return {k: round(v, 2) for k, v in rating_by_category.items()}
     
+    @timed(ANALYTICS_SECONDS, method='priority_issues')
     def get_priority_issues(self, rating_threshold: int = 2) -> List[Dict[str, Any]]:
         """Get high-priority issues (low ratings)"""
-        if self.df is None:
-            self.load_data()
+        if self.use_database:
+            return self.db_config.fetch_priority_issues(rating_threshold)
         
-        priority_df = self.df[self.df['rating'] <= rating_threshold]
+        df = self._frame()
+        
+        priority_df = df[df['rating'] <= rating_threshold]
         return priority_df[['id', 'complaint_text', 'category', 'sentiment', 'rating']].to_dict('records')
     
+    @timed(ANALYTICS_SECONDS, method='time_series_data')
     def get_time_series_data(self) -> List[Dict[str, Any]]:
         """Get complaints over time"""
-        if self.df is None:
-            self.load_data()
+        if self.use_database:
+            return self._format_time_series(self.db_config.fetch_aggregate('time_series'))
+        
+        df = self._frame()
         
-        # Convert created_at to datetime
-        self.df['created_at'] = pd.to_datetime(self.df['created_at'])
+        # Parse dates into a local Series; the shared frame is never modified
+        created_at = pd.to_datetime(df['created_at'])
         
         # Group by date
-        time_series = self.df.groupby(self.df['created_at'].dt.date).size().reset_index()
+        time_series = created_at.groupby(created_at.dt.date.rename('date')).size().reset_index()
         time_series.columns = ['date', 'count']
         time_series['date'] = time_series['date'].astype(str)
         
         return time_series.to_dict('records')
     
+    @timed(ANALYTICS_SECONDS, method='confidence_stats')
     def get_confidence_stats(self) -> Dict[str, float]:
         """Get confidence score statistics"""
-        if self.df is None:
-            self.load_data()
+        if self.use_database:
+            return self._format_confidence_stats(self.db_config.fetch_aggregate('confidence_stats'))
+        
+        df = self._frame()
         
         return {
-            'mean': round(self.df['confidence'].mean(), 3),
-            'median': round(self.df['confidence'].median(), 3),
-            'min': round(self.df['confidence'].min(), 3),
-            'max': round(self.df['confidence'].max(), 3)
+            'mean': round(df['confidence'].mean(), 3),
+            'median': round(df['confidence'].median(), 3),
+            'min': round(df['confidence'].min(), 3),
+            'max': round(df['confidence'].max(), 3)
         }
     
+    @timed(ANALYTICS_SECONDS, method='category_sentiment_correlation')
     def get_category_sentiment_correlation(self) -> List[Dict[str, Any]]:
         """Get sentiment distribution per category"""
-        if self.df is None:
-            self.load_data()
+        if self.use_database:
+            return self._format_correlation(self.db_config.fetch_aggregate('category_sentiment_correlation'))
+        
+        df = self._frame()
         
-        correlation = self.df.groupby(['category', 'sentiment']).size().reset_index(name='count')
+        correlation = df.groupby(['category', 'sentiment']).size().reset_index(name='count')
         return correlation.to_dict('records')
     
+    @timed(ANALYTICS_SECONDS, 'analytics', method='all_analytics')
     def get_all_analytics(self) -> Dict[str, Any]:
         """Get all analytics data"""
+        snapshot = self._shared_snapshot()
+        if snapshot is not None:
+            CACHE_REQUESTS.inc(cache='shared_state', result='hit')
+            return snapshot.analytics
+        if self.shared_state is not None:
+            CACHE_REQUESTS.inc(cache='shared_state', result='miss')
+        return self._compute_all_analytics()
+    
+    def get_shared_columns(self) -> Dict[str, Any]:
+        """Get the memory-mapped column arrays published in shared-state mode"""
+        snapshot = self._shared_snapshot()
+        return {} if snapshot is None else snapshot.columns
+    
+    def _shared_snapshot(self):
+        """Get the published snapshot, waiting briefly for the first one"""
+        if self.shared_state is None:
+            return None
+        
+        snapshot = self.shared_state.current()
+        if snapshot is None and not self._shared_wait_done:
+            # The refresher may still be publishing the first version; after
+            # one bounded wait, requests fall back to computing locally
+            deadline = time.monotonic() + 2 * self._refresher.interval
+            while snapshot is None and time.monotonic() < deadline:
+                time.sleep(0.1)
+                snapshot = self.shared_state.current()
+            self._shared_wait_done = True
+        return snapshot
+    
+    def _follower_snapshot(self):
+        """Get the published snapshot when another worker is the shared-state leader
+        
+        Only the leader maintains the clusterer, topics, cube and anomaly
+        detector; the other workers answer from the results it publishes
+        instead of each reading the source.
+        """
+        if self.shared_state is None or self._refresher.is_leader:
+            return None
+        return self._shared_snapshot()
+    
+    def _build_shared_state(self):
+        """Compute analytics, column arrays and subsystem results for publishing to other workers"""
+        analytics = self._compute_all_analytics()
+        columns = {}
+        categories = {}
+        df = self.df
+        if df is not None:
+            columns = {
+                'id': df['id'].to_numpy(),
+                'rating': df['rating'].to_numpy(),
+                'confidence': df['confidence'].to_numpy(dtype='float64'),
+                'created_at': pd.to_datetime(df['created_at']).to_numpy(dtype='datetime64[ns]').astype('int64')
+            }
+            for column in ('category', 'sentiment'):
+                codes, uniques = pd.factorize(df[column])
+                columns[column] = codes.astype('int32')
+                categories[column] = [str(value) for value in uniques]
+        
+        derived = {
+            'alerts': self.get_alerts(limit=None),
+            'topics': self.get_topics(limit=SHARED_TOPIC_TERMS)
+        }
+        if self.clustering:
+            clusterer = self.update_clusters()
+            with self._cluster_lock:
+                derived['clusters'] = {'summary': clusterer.summary(), 'clusters': clusterer.clusters(limit=SHARED_CLUSTERS)}
+                columns['cluster_member_id'], columns['cluster_id'], columns['cluster_size'] = clusterer.assignments()
+        cube = self.update_cube()
+        with self._cube_lock:
+            derived['cube'] = {'dimensions': cube.dimensions, 'labels': cube.labels, 'rows': cube.rows}
+            columns['cube_counts'] = cube.counts.copy()
+        return analytics, columns, categories, derived
+    
+    def _compute_all_analytics(self) -> Dict[str, Any]:
+        """Compute all analytics from the CSV or MySQL source"""
+        if self.approximate:
+            with self._sketch_lock:
+                return self.update_sketches().to_analytics()
+        if self.use_database:
+            return self._get_database_analytics()
+        
+        df = self._frame()
         return {
             'sentiment_distribution': self.get_sentiment_distribution(),
             'category_distribution': self.get_category_distribution(),
@@ -93,15 +394,323 @@ class DataProcessor:
             'time_series': self.get_time_series_data(),
             'confidence_stats': self.get_confidence_stats(),
             'category_sentiment_correlation': self.get_category_sentiment_correlation(),
-            'total_complaints': len(self.df) if self.df is not None else 0
+            'total_complaints': len(df)
         }
     
-    def get_data_summary(self) -> str:
-        """Get a text summary of the data for RAG context"""
-        if self.df is None:
-            self.load_data()
+    def update_sketches(self) -> ComplaintSketches:
+        """Fold rows added since the last refresh into the analytics sketches
+        
+        Sketches are loaded from and saved to SKETCH_PATH when it is set,
+        together with the source fingerprint they cover, so restarts and
+        other processes resume instead of rescanning everything. The source
+        is only scanned when its version changed; edits and deletes (or a
+        file without a fingerprint) rebuild the sketches from every row.
+        """
+        with self._sketch_lock:
+            if self.sketches is None:
+                if self.sketch_path and os.path.exists(self.sketch_path):
+                    self.sketches = ComplaintSketches.load(self.sketch_path)
+                    if self.sketches.source is not None:
+                        self._incremental_marks['sketches'] = self.sketches.source
+                else:
+                    self.sketches = ComplaintSketches()
+            
+            if self._update_incremental('sketches', self.sketches.last_id,
+                                        lambda: setattr(self, 'sketches', ComplaintSketches()),
+                                        lambda chunk: self.sketches.ingest(chunk)):
+                self.sketches.source = self._incremental_marks['sketches']
+                if self.sketch_path:
+                    self.sketches.save(self.sketch_path)
+            return self.sketches
+    
+    def update_anomalies(self) -> AnomalyDetector:
+        """Feed complaints added since the last call to the anomaly detector
+        
+        The first call replays history in created_at order to build the
+        baselines; later calls only read rows past the last seen id, and only
+        when the source version changed.
+        """
+        with self._anomaly_lock:
+            version = self._get_source_version()[0]
+            if version == self._anomaly_version:
+                return self.anomaly_detector
+            if self._anomaly_last_id is None:
+                chunks = self._iter_anomaly_history()
+            else:
+                chunks = self.iter_complaint_chunks(chunksize=50000, after_id=self._anomaly_last_id)
+            
+            last_id = self._anomaly_last_id or 0
+            for chunk in chunks:
+                if chunk.empty:
+                    continue
+                self.anomaly_detector.observe_frame(chunk)
+                last_id = max(last_id, int(chunk['id'].max()))
+            self._anomaly_last_id = last_id
+            self._anomaly_version = version
+            return self.anomaly_detector
+    
+    def _iter_anomaly_history(self) -> Iterator[pd.DataFrame]:
+        """Stream the columns the detector needs, oldest complaint first"""
+        columns = ('id', 'category', 'sentiment', 'rating', 'created_at')
+        if self.use_database:
+            yield from self.db_config.iter_complaint_frames(order_by='created_at', columns=columns)
+            return
+        
+        try:
+            yield pd.read_csv(self.csv_path, usecols=list(columns))
+        except Exception as e:
+            raise Exception(f"Error loading CSV: {str(e)}")
+    
+    def get_alerts(self, since: datetime = None, category: str = None, limit: int = 50) -> List[Dict[str, Any]]:
+        """Get recent volume spike and sentiment shift alerts"""
+        snapshot = self._follower_snapshot()
+        if snapshot is not None:
+            return filter_alerts(snapshot.derived['alerts'], since, category, limit)
+        self.update_anomalies()
+        return self.anomaly_detector.get_alerts(since, category, limit)
+    
+    @timed(ANALYTICS_SECONDS, method='clusters')
+    def update_clusters(self) -> ComplaintClusterer:
+        """Cluster complaints added since the last call with near-duplicates seen before
+        
+        The source is only scanned when its version changed. Edits and
+        deletes recluster from scratch.
+        """
+        with self._cluster_lock:
+            self._update_incremental('clusters', self.clusterer.last_id,
+                                     lambda: setattr(self, 'clusterer', ComplaintClusterer()),
+                                     lambda chunk: self.clusterer.add(chunk))
+            return self.clusterer
+    
+    def get_clusters(self, min_size: int = 2, category: str = None, limit: int = 50) -> Dict[str, Any]:
+        """Get near-duplicate complaint clusters, largest first, with totals"""
+        if not self.clustering:
+            return {'summary': {}, 'clusters': []}
+        snapshot = self._follower_snapshot()
+        if snapshot is not None:
+            published = snapshot.derived['clusters']
+            return {
+                'summary': published['summary'],
+                'clusters': filter_clusters(published['clusters'], min_size, category, limit)
+            }
+        clusterer = self.update_clusters()
+        with self._cluster_lock:
+            return {
+                'summary': clusterer.summary(),
+                'clusters': clusterer.clusters(min_size, category, limit)
+            }
+    
+    def deduplicate_issues(self, issues: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Keep the first issue of each near-duplicate cluster, tagged with the cluster id and size"""
+        if not self.clustering or not issues:
+            return issues
+        ids = [issue['id'] for issue in issues]
+        snapshot = self._follower_snapshot()
+        if snapshot is not None:
+            columns = snapshot.columns
+            cluster_ids, sizes = lookup_clusters(columns['cluster_member_id'], columns['cluster_id'],
+                                                 columns['cluster_size'], ids)
+        else:
+            clusterer = self.update_clusters()
+            with self._cluster_lock:
+                cluster_ids, sizes = clusterer.lookup(ids)
+        
+        seen = set()
+        deduplicated = []
+        for issue, cluster_id, size in zip(issues, cluster_ids.tolist(), sizes.tolist()):
+            if cluster_id != -1 and cluster_id in seen:
+                continue
+            seen.add(cluster_id)
+            deduplicated.append({**issue, 'cluster_id': cluster_id, 'cluster_size': size})
+        return deduplicated
+    
+    @timed(ANALYTICS_SECONDS, method='topics')
+    def update_topics(self) -> TopicExtractor:
+        """Count terms of complaints added since the last call
+        
+        The source is only scanned when its version changed. Edits and
+        deletes recount every complaint.
+        """
+        with self._topic_lock:
+            self._update_incremental('topics', self.topic_extractor.last_id,
+                                     lambda: setattr(self, 'topic_extractor', TopicExtractor()),
+                                     lambda chunk: self.topic_extractor.ingest(chunk))
+            return self.topic_extractor
+    
+    def get_topics(self, dimension: str = None, group: str = None, limit: int = 10) -> Dict[str, Any]:
+        """Get the most distinctive terms per category and per sentiment"""
+        dimensions = [dimension] if dimension else list(TopicExtractor.DIMENSIONS)
+        snapshot = self._follower_snapshot()
+        if snapshot is not None:
+            published = snapshot.derived['topics']
+            topics = {name: {k: terms[:limit] for k, terms in published[name].items()} for name in dimensions}
+        else:
+            extractor = self.update_topics()
+            with self._topic_lock:
+                topics = {name: extractor.top_terms(name, limit) for name in dimensions}
+        if group is not None:
+            topics = {name: {k: v for k, v in terms.items() if k == group} for name, terms in topics.items()}
+        return topics
+    
+    @timed(ANALYTICS_SECONDS, method='cube')
+    def update_cube(self) -> ComplaintCube:
+        """Fold complaints added since the last call into the cube
+        
+        The source is only scanned when its version changed, so drill-downs
+        between data changes are pure array operations. Edits and deletes
+        rebuild the cube.
+        """
+        with self._cube_lock:
+            self._update_incremental('cube', self.cube.last_id, lambda: setattr(self, 'cube', ComplaintCube()),
+                                     lambda chunk: self.cube.ingest(chunk))
+            return self.cube
+    
+    def get_cube(self, rows: str = 'category', columns: str = 'sentiment', **filters) -> Dict[str, Any]:
+        """Roll complaint counts up to one or two dimensions, drilled down by label filters"""
+        snapshot = self._follower_snapshot()
+        if snapshot is not None:
+            return self._published_cube(snapshot).query(rows, columns, **filters)
+        cube = self.update_cube()
+        with self._cube_lock:
+            return cube.query(rows, columns, **filters)
+    
+    def _published_cube(self, snapshot) -> ComplaintCube:
+        """Cube over the leader's memory-mapped counts, rebuilt once per snapshot"""
+        shared = self._shared_cube
+        if shared is None or shared[0] is not snapshot:
+            published = snapshot.derived['cube']
+            cube = ComplaintCube.from_counts(published['dimensions'], published['labels'],
+                                             snapshot.columns['cube_counts'], published['rows'])
+            shared = self._shared_cube = (snapshot, cube)
+        return shared[1]
+    
+    @timed(ANALYTICS_SECONDS, 'analytics', method='range_analytics')
+    def get_range_analytics(self, start_date=None, end_date=None, category: str = None,
+                            sentiment: str = None) -> Dict[str, Any]:
+        """Get analytics for an inclusive date range, from the daily rollups or the embedded store
         
-        analytics = self.get_all_analytics()
+        Raises NotImplementedError when neither rollups nor the embedded store
+        are enabled, and ValueError for category or sentiment filters, which
+        only the embedded store supports. With rollups, only the fields in
+        range_rollup_fields() come from the rollup table; the confidence
+        median and priority issues need individual rows and are read from
+        the raw table.
+        """
+        if self.rollup_manager is None:
+            if not getattr(self.db_config, 'supports_filters', False):
+                raise NotImplementedError("Rollups are not enabled. Set USE_DATABASE=true and USE_ROLLUPS=true "
+                                          "or ANALYTICS_BACKEND=embedded in .env")
+            return self._get_database_analytics(start_date=start_date, end_date=end_date,
+                                                category=category, sentiment=sentiment)
+        if category is not None or sentiment is not None:
+            raise ValueError("Category and sentiment filters require ANALYTICS_BACKEND=embedded")
+        
+        rows = self.rollup_manager.fetch_range(start_date, end_date)
+        analytics = self._summarize_rollup_rows(rows)
+        analytics['confidence_stats']['median'] = self._round_or_none(
+            self.db_config.fetch_confidence_median(analytics.pop('confidence_count'), start_date, end_date)
+        )
+        analytics['priority_issues'] = self.db_config.fetch_priority_issues(start_date=start_date, end_date=end_date)
+        return analytics
+    
+    def range_rollup_fields(self) -> List[str]:
+        """Fields of get_range_analytics() aggregated from daily rollups instead of raw rows"""
+        if self.rollup_manager is None:
+            return []
+        return ['sentiment_distribution', 'category_distribution', 'rating_by_category', 'time_series',
+                'confidence_stats.mean', 'confidence_stats.min', 'confidence_stats.max',
+                'category_sentiment_correlation', 'total_complaints']
+    
+    def _summarize_rollup_rows(self, rows: List[Dict]) -> Dict[str, Any]:
+        """Reduce (day, category, sentiment, rating) rollup rows to analytics"""
+        columns = ['day', 'category', 'sentiment', 'rating', 'complaint_count',
+                   'confidence_count', 'confidence_sum', 'confidence_min', 'confidence_max']
+        rollup = pd.DataFrame.from_records(rows, columns=columns)
+        for column in ('confidence_sum', 'confidence_min', 'confidence_max'):
+            rollup[column] = rollup[column].astype(float)
+        counts = rollup['complaint_count']
+        
+        sentiment_counts = counts.groupby(rollup['sentiment']).sum().sort_values(ascending=False)
+        category_counts = counts.groupby(rollup['category']).sum().sort_values(ascending=False)
+        # Rating bucket 0 holds unrated complaints, which AVG(rating) ignores
+        rated = rollup[rollup['rating'] > 0]
+        rated_counts = rated['complaint_count'].groupby(rated['category']).sum()
+        rating_sums = (rated['rating'] * rated['complaint_count']).groupby(rated['category']).sum()
+        time_series = counts.groupby(rollup['day']).sum().sort_index()
+        correlation = counts.groupby([rollup['category'], rollup['sentiment']]).sum()
+        confidence_count = int(rollup['confidence_count'].sum())
+        
+        return {
+            'sentiment_distribution': {k: int(v) for k, v in sentiment_counts.items()},
+            'category_distribution': {k: int(v) for k, v in category_counts.items()},
+            'rating_by_category': {k: round(float(rating_sums[k]) / v, 2) for k, v in rated_counts.items() if v},
+            'time_series': [{'date': str(k), 'count': int(v)} for k, v in time_series.items()],
+            'confidence_stats': {
+                'mean': self._round_or_none(rollup['confidence_sum'].sum() / confidence_count if confidence_count else None),
+                'median': None,
+                'min': self._round_or_none(rollup['confidence_min'].min()),
+                'max': self._round_or_none(rollup['confidence_max'].max())
+            },
+            'category_sentiment_correlation': [
+                {'category': category, 'sentiment': sentiment, 'count': int(count)}
+                for (category, sentiment), count in correlation.items()
+            ],
+            'total_complaints': int(counts.sum()),
+            'confidence_count': confidence_count
+        }
+    
+    def _round_or_none(self, value, digits: int = 3):
+        """Round a possibly missing aggregate"""
+        return None if value is None or pd.isna(value) else round(float(value), digits)
+    
+    def _get_database_analytics(self, **filters) -> Dict[str, Any]:
+        """Get all analytics from GROUP BY queries run in one database round"""
+        if self.rollup_manager is not None:
+            return self.get_range_analytics()
+        
+        rows = self.db_config.fetch_analytics_aggregates(**filters)
+        total = rows['total_complaints'][0]['count'] if rows['total_complaints'] else 0
+        
+        return {
+            'sentiment_distribution': self._format_counts(rows['sentiment_distribution'], 'sentiment'),
+            'category_distribution': self._format_counts(rows['category_distribution'], 'category'),
+            'rating_by_category': self._format_rating_by_category(rows['rating_by_category']),
+            'priority_issues': rows['priority_issues'],
+            'time_series': self._format_time_series(rows['time_series']),
+            'confidence_stats': self._format_confidence_stats(rows['confidence_stats']),
+            'category_sentiment_correlation': self._format_correlation(rows['category_sentiment_correlation']),
+            'total_complaints': int(total)
+        }
+    
+    def _format_counts(self, rows: List[Dict], key: str) -> Dict[str, int]:
+        """Convert grouped count rows into a value -> count dict"""
+        return {row[key]: int(row['count']) for row in rows}
+    
+    def _format_rating_by_category(self, rows: List[Dict]) -> Dict[str, float]:
+        """Convert grouped average rows into a category -> rating dict"""
+        return {row['category']: round(float(row['avg_rating']), 2) for row in rows if row['avg_rating'] is not None}
+    
+    def _format_time_series(self, rows: List[Dict]) -> List[Dict[str, Any]]:
+        """Convert per-day count rows into chart points"""
+        return [{'date': str(row['date']), 'count': int(row['count'])} for row in rows]
+    
+    def _format_confidence_stats(self, rows: List[Dict]) -> Dict[str, float]:
+        """Convert the confidence aggregate row into rounded stats"""
+        stats = rows[0] if rows else {}
+        return {
+            key: round(float(stats[key]), 3) if stats.get(key) is not None else None
+            for key in ('mean', 'median', 'min', 'max')
+        }
+    
+    def _format_correlation(self, rows: List[Dict]) -> List[Dict[str, Any]]:
+        """Convert category/sentiment count rows into correlation records"""
+        return [{'category': row['category'], 'sentiment': row['sentiment'], 'count': int(row['count'])} for row in rows]
+    
+    def get_data_summary(self, analytics: Dict[str, Any] = None) -> str:
+        """Get a text summary of the data, or of precomputed segment analytics, for RAG context"""
+        is_global = analytics is None
+        if is_global:
+            analytics = self.get_all_analytics()
         
         summary = f"""
 Customer Feedback Data Summary:
@@ -119,10 +728,15 @@ Average Rating by Category:
 Confidence Score Statistics:
 {self._format_dict(analytics['confidence_stats'])}
 
-Priority Issues Count (Rating ≤ 2): {len(analytics['priority_issues'])}
+Priority Issues Count (Rating ≤ 2): {priority_count(analytics)}
 
 Top Priority Issues:
-{self._format_priority_issues(analytics['priority_issues'][:5])}
+{self._format_priority_issues(self.deduplicate_issues(analytics['priority_issues'])[:5])}
+"""
+        if self.clustering and is_global:
+            clusters = self.get_clusters(limit=0)['summary']
+            summary += f"""
+Near-Duplicate Complaints: {clusters['duplicates']} of {clusters['complaints']} complaints repeat an earlier one ({clusters['duplicate_clusters']} clusters)
 """
         return summary
     
@@ -134,5 +748,6 @@ Top Priority Issues:
         """Format priority issues for readable output"""
         formatted = []
         for issue in issues:
-            formatted.append(f"  • [{issue['category']}] Rating: {issue['rating']} - {issue['complaint_text'][:100]}...")
+            repeats = f" (x{issue['cluster_size']} similar)" if issue.get('cluster_size', 1) > 1 else ""
+            formatted.append(f"  • [{issue['category']}] Rating: {issue['rating']}{repeats} - {issue['complaint_text'][:100]}...")
         return "\n".join(formatted)
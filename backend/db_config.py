@@ -1,10 +1,66 @@
 import mysql.connector
 from mysql.connector import Error
 import os
+from typing import Dict, List, Any, Iterator, Sequence
 from dotenv import load_dotenv
 
+from metrics import DB_CONNECT_SECONDS, DB_QUERY_SECONDS, timed
+
 load_dotenv()
 
+COMPLAINT_COLUMNS = ('id', 'complaint_text', 'category', 'sentiment', 'rating', 'confidence', 'created_at')
+
+# Aggregations pushed down to MySQL so only grouped rows leave the server
+ANALYTICS_QUERIES = {
+    'sentiment_distribution': """
+        SELECT sentiment, COUNT(*) AS count
+        FROM complaints
+        GROUP BY sentiment
+        ORDER BY count DESC
+    """,
+    'category_distribution': """
+        SELECT category, COUNT(*) AS count
+        FROM complaints
+        GROUP BY category
+        ORDER BY count DESC
+    """,
+    'rating_by_category': """
+        SELECT category, AVG(rating) AS avg_rating
+        FROM complaints
+        GROUP BY category
+        ORDER BY category
+    """,
+    'time_series': """
+        SELECT DATE(created_at) AS date, COUNT(*) AS count
+        FROM complaints
+        GROUP BY DATE(created_at)
+        ORDER BY date
+    """,
+    'confidence_stats': """
+        SELECT COUNT(confidence) AS count, AVG(confidence) AS mean,
+               MIN(confidence) AS min, MAX(confidence) AS max
+        FROM complaints
+    """,
+    'category_sentiment_correlation': """
+        SELECT category, sentiment, COUNT(*) AS count
+        FROM complaints
+        GROUP BY category, sentiment
+        ORDER BY category, sentiment
+    """,
+    'total_complaints': """
+        SELECT COUNT(*) AS count
+        FROM complaints
+    """,
+}
+
+# Indexes backing the aggregate queries above
+ANALYTICS_INDEXES = {
+    'idx_complaints_category_sentiment': '(category, sentiment)',
+    'idx_complaints_created_at': '(created_at)',
+    'idx_complaints_rating': '(rating)',
+    'idx_complaints_confidence': '(confidence)',
+}
+
 class DatabaseConfig:
     """Database configuration for future MySQL integration"""
     
@@ -15,7 +71,10 @@ class DatabaseConfig:
         self.user = os.getenv('DB_USER', 'root')
         self.password = os.getenv('DB_PASSWORD', '')
         self.use_database = os.getenv('USE_DATABASE', 'false').lower() == 'true'
+        self.fetch_size = int(os.getenv('DB_FETCH_SIZE', 1000))
+        self.use_rollups = os.getenv('USE_ROLLUPS', 'false').lower() == 'true'
         
+    @timed(DB_CONNECT_SECONDS, 'db-connect')
     def get_connection(self):
         """Establish MySQL connection"""
         try:
@@ -43,6 +102,7 @@ class DatabaseConfig:
         except Exception:
             return False
     
+    @timed(DB_QUERY_SECONDS, 'db', query='complaints')
     def fetch_complaints_data(self):
         """Fetch complaints data from MySQL database (for future use)"""
         if not self.use_database:
@@ -70,6 +130,233 @@ class DatabaseConfig:
         except Error as e:
             raise Exception(f"Error fetching data from MySQL: {str(e)}")
     
+    def iter_complaint_batches(self, fetch_size: int = None, order_by: str = 'id',
+                               descending: bool = False, columns: Sequence[str] = COMPLAINT_COLUMNS,
+                               where: str = None, params: tuple = (), after: tuple = None) -> Iterator[List[Dict[str, Any]]]:
+        """Stream complaints in bounded batches using keyset pagination
+        
+        Each page is read through an unbuffered cursor and resumes from the last
+        seen key, so no page ever needs OFFSET scans or a full-table fetchall().
+        order_by is 'id' or 'created_at' (ties broken by id); `after` resumes
+        from a previously seen key, i.e. (id,) or (created_at, id).
+        """
+        if not self.use_database:
+            raise Exception("Database mode is not enabled. Set USE_DATABASE=true in .env")
+        if order_by not in ('id', 'created_at'):
+            raise ValueError("order_by must be 'id' or 'created_at'")
+        
+        fetch_size = fetch_size or self.fetch_size
+        key_columns = ('id',) if order_by == 'id' else ('created_at', 'id')
+        # Key columns are always selected so the next page can resume after them
+        select_columns = list(columns) + [c for c in key_columns if c not in columns]
+        comparison = '<' if descending else '>'
+        direction = 'DESC' if descending else 'ASC'
+        
+        connection = self.get_connection()
+        try:
+            last_key = tuple(after) if after is not None else None
+            
+            while True:
+                conditions = [f"({where})"] if where else []
+                query_params = list(params)
+                if last_key is not None:
+                    conditions.append(f"({', '.join(key_columns)}) {comparison} ({', '.join(['%s'] * len(key_columns))})")
+                    query_params.extend(last_key)
+                
+                query = f"""
+                    SELECT {', '.join(select_columns)}
+                    FROM complaints
+                    {'WHERE ' + ' AND '.join(conditions) if conditions else ''}
+                    ORDER BY {', '.join(f'{c} {direction}' for c in key_columns)}
+                    LIMIT %s
+                """
+                query_params.append(fetch_size)
+                
+                cursor = connection.cursor(dictionary=True, buffered=False)
+                cursor.execute(query, tuple(query_params))
+                # Draining the page is bounded by LIMIT, never by table size
+                batch = cursor.fetchall()
+                cursor.close()
+                
+                if not batch:
+                    break
+                
+                last_key = tuple(batch[-1][c] for c in key_columns)
+                yield batch
+                
+                if len(batch) < fetch_size:
+                    break
+            
+        except Error as e:
+            raise Exception(f"Error streaming data from MySQL: {str(e)}")
+        finally:
+            # Also runs when the consumer stops iterating early
+            connection.close()
+    
+    def iter_complaints(self, **kwargs) -> Iterator[Dict[str, Any]]:
+        """Stream complaints one row at a time with bounded memory"""
+        for batch in self.iter_complaint_batches(**kwargs):
+            yield from batch
+    
+    def iter_complaint_frames(self, **kwargs):
+        """Stream complaints as pandas DataFrame chunks"""
+        import pandas as pd
+        
+        columns = list(kwargs.get('columns', COMPLAINT_COLUMNS))
+        for batch in self.iter_complaint_batches(**kwargs):
+            yield pd.DataFrame.from_records(batch)[columns]
+    
+    def iter_record_batches(self, **kwargs):
+        """Stream complaints as Arrow record batches (requires pyarrow)"""
+        try:
+            import pyarrow as pa
+        except ImportError:
+            raise Exception("pyarrow is required for Arrow streaming. Install it with pip install pyarrow")
+        
+        for frame in self.iter_complaint_frames(**kwargs):
+            yield pa.RecordBatch.from_pandas(frame, preserve_index=False)
+    
+    @timed(DB_QUERY_SECONDS, 'db', query='analytics_aggregates')
+    def fetch_analytics_aggregates(self, rating_threshold: int = 2) -> Dict[str, Any]:
+        """Run all analytics aggregations inside MySQL over a single connection"""
+        if not self.use_database:
+            raise Exception("Database mode is not enabled. Set USE_DATABASE=true in .env")
+        
+        try:
+            connection = self.get_connection()
+            cursor = connection.cursor(dictionary=True)
+            
+            results = {}
+            for name, query in ANALYTICS_QUERIES.items():
+                cursor.execute(query)
+                results[name] = cursor.fetchall()
+            
+            if results['confidence_stats']:
+                stats = results['confidence_stats'][0]
+                stats['median'] = self._fetch_confidence_median(cursor, stats['count'])
+            results['priority_issues'] = self._fetch_priority_issues(cursor, rating_threshold)
+            
+            cursor.close()
+            connection.close()
+            
+            return results
+        
+        except Error as e:
+            raise Exception(f"Error fetching analytics from MySQL: {str(e)}")
+    
+    @timed(DB_QUERY_SECONDS, 'db', query='aggregate')
+    def fetch_aggregate(self, name: str) -> List[Dict[str, Any]]:
+        """Run a single named analytics aggregation inside MySQL"""
+        if not self.use_database:
+            raise Exception("Database mode is not enabled. Set USE_DATABASE=true in .env")
+        
+        try:
+            connection = self.get_connection()
+            cursor = connection.cursor(dictionary=True)
+            cursor.execute(ANALYTICS_QUERIES[name])
+            results = cursor.fetchall()
+            
+            if name == 'confidence_stats' and results:
+                results[0]['median'] = self._fetch_confidence_median(cursor, results[0]['count'])
+            
+            cursor.close()
+            connection.close()
+            return results
+        
+        except Error as e:
+            raise Exception(f"Error fetching {name} from MySQL: {str(e)}")
+    
+    @timed(DB_QUERY_SECONDS, 'db', query='data_version')
+    def fetch_data_version(self) -> Dict[str, Any]:
+        """Fetch a cheap fingerprint of the complaints table for cache validation"""
+        if not self.use_database:
+            raise Exception("Database mode is not enabled. Set USE_DATABASE=true in .env")
+        
+        try:
+            connection = self.get_connection()
+            cursor = connection.cursor(dictionary=True)
+            cursor.execute("""
+                SELECT COUNT(*) AS count, MAX(id) AS max_id, MAX(created_at) AS last_modified
+                FROM complaints
+            """)
+            result = cursor.fetchone()
+            cursor.close()
+            connection.close()
+            return result
+        
+        except Error as e:
+            raise Exception(f"Error fetching data version from MySQL: {str(e)}")
+    
+    @timed(DB_QUERY_SECONDS, 'db', query='priority_issues')
+    def fetch_priority_issues(self, rating_threshold: int = 2, start_date=None, end_date=None) -> List[Dict[str, Any]]:
+        """Fetch only the low-rated complaints instead of the whole table"""
+        if not self.use_database:
+            raise Exception("Database mode is not enabled. Set USE_DATABASE=true in .env")
+        
+        try:
+            connection = self.get_connection()
+            cursor = connection.cursor(dictionary=True)
+            results = self._fetch_priority_issues(cursor, rating_threshold, *self._date_range_filter(start_date, end_date))
+            cursor.close()
+            connection.close()
+            return results
+        
+        except Error as e:
+            raise Exception(f"Error fetching priority issues from MySQL: {str(e)}")
+    
+    @timed(DB_QUERY_SECONDS, 'db', query='confidence_median')
+    def fetch_confidence_median(self, count: int, start_date=None, end_date=None):
+        """Fetch the median confidence given the number of non-null scores in range"""
+        try:
+            connection = self.get_connection()
+            cursor = connection.cursor(dictionary=True)
+            median = self._fetch_confidence_median(cursor, count, *self._date_range_filter(start_date, end_date))
+            cursor.close()
+            connection.close()
+            return median
+        
+        except Error as e:
+            raise Exception(f"Error fetching confidence median from MySQL: {str(e)}")
+    
+    def _date_range_filter(self, start_date=None, end_date=None):
+        """Build an extra WHERE fragment and params for an inclusive day range"""
+        conditions = []
+        params = []
+        if start_date:
+            conditions.append("created_at >= %s")
+            params.append(start_date)
+        if end_date:
+            conditions.append("created_at < %s + INTERVAL 1 DAY")
+            params.append(end_date)
+        return "".join(f" AND {c}" for c in conditions), tuple(params)
+    
+    def _fetch_priority_issues(self, cursor, rating_threshold: int, extra_where: str = '', params: tuple = ()) -> List[Dict[str, Any]]:
+        """Fetch priority rows using the rating index"""
+        cursor.execute(f"""
+            SELECT id, complaint_text, category, sentiment, rating
+            FROM complaints
+            WHERE rating <= %s{extra_where}
+            ORDER BY id
+        """, (rating_threshold,) + params)
+        return cursor.fetchall()
+    
+    def _fetch_confidence_median(self, cursor, count: int, extra_where: str = '', params: tuple = ()):
+        """Read the median confidence by seeking into the confidence index"""
+        if count == 0:
+            return None
+        
+        # Even counts average the two middle values, matching pandas
+        limit = 1 if count % 2 else 2
+        cursor.execute(f"""
+            SELECT confidence
+            FROM complaints
+            WHERE confidence IS NOT NULL{extra_where}
+            ORDER BY confidence
+            LIMIT %s OFFSET %s
+        """, params + (limit, (count - 1) // 2))
+        values = [float(row['confidence']) for row in cursor.fetchall()]
+        return sum(values) / len(values) if values else None
+    
     def create_sample_table(self):
         """Create sample complaints table structure (run this once to setup)"""
         try:
@@ -89,6 +376,15 @@ class DatabaseConfig:
             """
             
             cursor.execute(create_table_query)
+            
+            # MySQL has no CREATE INDEX IF NOT EXISTS, so skip duplicates explicitly
+            for index_name, columns in ANALYTICS_INDEXES.items():
+                try:
+                    cursor.execute(f"CREATE INDEX {index_name} ON complaints {columns}")
+                except Error as e:
+                    if e.errno != 1061:  # ER_DUP_KEYNAME
+                        raise
+            
             connection.commit()
             
             cursor.close()
@@ -0,0 +1,68 @@
+from datetime import date
+from typing import Any, Dict, List
+
+import numpy as np
+
+DOWNSAMPLING_METHODS = ('lttb', 'minmax')
+
+def _day_numbers(points: List[Dict[str, Any]]) -> np.ndarray:
+    """Dates as day ordinals, so gaps without complaints keep their width"""
+    return np.array([date.fromisoformat(str(point['date'])[:10]).toordinal() for point in points], dtype=np.float64)
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, max_points: int) -> np.ndarray:
+    """Largest-Triangle-Three-Buckets (Steinarsson 2013)
+    
+    Keeps the first and last points and, from each of max_points - 2 equal
+    buckets in between, the point forming the largest triangle with the
+    previously kept point and the average of the next bucket. Runs in O(n).
+    """
+    n = len(x)
+    if max_points >= n or max_points < 3:
+        return np.arange(n) if max_points >= n else np.array([0, n - 1][:max(max_points, 1)])
+    
+    edges = np.linspace(1, n - 1, max_points - 1).astype(np.int64)
+    selected = np.empty(max_points, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    previous = 0
+    for i in range(max_points - 2):
+        start, end = edges[i], max(edges[i + 1], edges[i] + 1)
+        next_end = edges[i + 2] if i + 2 < len(edges) else n
+        next_x = x[end:next_end].mean() if next_end > end else x[n - 1]
+        next_y = y[end:next_end].mean() if next_end > end else y[n - 1]
+        areas = np.abs((x[previous] - next_x) * (y[start:end] - y[previous])
+                       - (x[previous] - x[start:end]) * (next_y - y[previous]))
+        previous = start + int(np.argmax(areas))
+        selected[i + 1] = previous
+    return selected
+
+def minmax_indices(y: np.ndarray, max_points: int) -> np.ndarray:
+    """Keep the first and last point and the lowest and highest of each equal bucket"""
+    n = len(y)
+    if max_points >= n:
+        return np.arange(n)
+    
+    edges = np.linspace(0, n, max(max_points // 2 - 1, 1) + 1).astype(np.int64)
+    selected = {0, n - 1}
+    for start, end in zip(edges[:-1], edges[1:]):
+        if end > start:
+            window = y[start:end]
+            selected.update((start + int(np.argmin(window)), start + int(np.argmax(window))))
+    return np.array(sorted(selected), dtype=np.int64)[:max_points]
+
+def downsample_time_series(points: List[Dict[str, Any]], max_points: int, method: str = 'lttb') -> List[Dict[str, Any]]:
+    """Reduce a per-day series to at most max_points of its original points
+    
+    Points are picked, never averaged, so peaks keep their real date and
+    count. Series already within the limit are returned unchanged.
+    """
+    if method not in DOWNSAMPLING_METHODS:
+        raise ValueError(f"Unknown downsampling method: {method}")
+    if not max_points or len(points) <= max_points:
+        return points
+    
+    y = np.array([point['count'] for point in points], dtype=np.float64)
+    if method == 'minmax':
+        indices = minmax_indices(y, max_points)
+    else:
+        indices = lttb_indices(_day_numbers(points), y, max_points)
+    return [points[i] for i in indices]
@@ -0,0 +1,335 @@
+import os
+import argparse
+import threading
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, Iterator, List, Sequence
+
+import pandas as pd
+
+from db_config import ANALYTICS_INDEXES, COMPLAINT_COLUMNS
+from metrics import DB_QUERY_SECONDS, timed
+
+# Day bucketing differs per engine; everything else is shared SQL
+DAY_EXPRESSIONS = {
+    'duckdb': 'CAST(created_at AS DATE)',
+    'sqlite': 'DATE(created_at)',
+}
+
+CREATE_TABLE = {
+    'duckdb': """
+        CREATE TABLE IF NOT EXISTS complaints (
+            id BIGINT PRIMARY KEY,
+            complaint_text VARCHAR,
+            category VARCHAR,
+            sentiment VARCHAR,
+            rating INTEGER,
+            confidence DOUBLE,
+            created_at TIMESTAMP
+        )
+    """,
+    'sqlite': """
+        CREATE TABLE IF NOT EXISTS complaints (
+            id INTEGER PRIMARY KEY,
+            complaint_text TEXT,
+            category TEXT,
+            sentiment TEXT,
+            rating INTEGER,
+            confidence REAL,
+            created_at TEXT
+        )
+    """,
+}
+
+def analytics_queries(engine: str, where: str = '') -> Dict[str, str]:
+    """The MySQL analytics queries in the embedded engine's dialect, with an optional filter"""
+    day = DAY_EXPRESSIONS[engine]
+    return {
+        'sentiment_distribution': f"SELECT sentiment, COUNT(*) AS count FROM complaints {where} GROUP BY sentiment ORDER BY count DESC",
+        'category_distribution': f"SELECT category, COUNT(*) AS count FROM complaints {where} GROUP BY category ORDER BY count DESC",
+        'rating_by_category': f"SELECT category, AVG(rating) AS avg_rating FROM complaints {where} GROUP BY category ORDER BY category",
+        'time_series': f"SELECT {day} AS date, COUNT(*) AS count FROM complaints {where} GROUP BY {day} ORDER BY date",
+        'confidence_stats': f"""
+            SELECT COUNT(confidence) AS count, AVG(confidence) AS mean, MIN(confidence) AS min, MAX(confidence) AS max
+            FROM complaints {where}
+        """,
+        'category_sentiment_correlation': f"""
+            SELECT category, sentiment, COUNT(*) AS count
+            FROM complaints {where}
+            GROUP BY category, sentiment
+            ORDER BY category, sentiment
+        """,
+        'total_complaints': f"SELECT COUNT(*) AS count FROM complaints {where}",
+    }
+
+class EmbeddedStore:
+    """Complaints persisted in an embedded SQL engine, queried like MySQL
+    
+    Implements the query interface DataProcessor uses for MySQL, so every
+    analytic runs as SQL over a persisted table instead of a DataFrame held
+    in memory. DuckDB is used when installed: it is columnar,
+    multi-threaded and spills to disk for larger-than-memory data. SQLite
+    from the standard library is the fallback. New rows are ingested by id
+    from the source CSV or MySQL table, so the source is only read in full
+    once.
+    """
+    
+    def __init__(self, path: str = None, engine: str = None, source_csv: str = None, source_db=None):
+        self.engine = self._resolve_engine(engine or os.getenv('EMBEDDED_ENGINE', 'auto'))
+        data_dir = os.path.join(os.path.dirname(__file__), 'data')
+        self.path = path or os.getenv('EMBEDDED_DB_PATH', os.path.join(data_dir, f'complaints.{self.engine}'))
+        self.source_csv = source_csv
+        self.source_db = source_db
+        # DataProcessor treats this like an enabled database without rollups
+        self.use_database = True
+        self.use_rollups = False
+        # Analytics can be restricted by date, category, sentiment and rating
+        self.supports_filters = True
+        self.fetch_size = int(os.getenv('DB_FETCH_SIZE', 1000))
+        self._source_stat = None
+        self._local = threading.local()
+        self._sync_lock = threading.Lock()
+        self._duckdb = None
+        
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._execute(CREATE_TABLE[self.engine])
+        for index_name, columns in ANALYTICS_INDEXES.items():
+            self._execute(f"CREATE INDEX IF NOT EXISTS {index_name} ON complaints {columns}")
+    
+    def _resolve_engine(self, engine: str) -> str:
+        if engine not in ('auto', 'duckdb', 'sqlite'):
+            raise ValueError("EMBEDDED_ENGINE must be 'auto', 'duckdb' or 'sqlite'")
+        if engine == 'sqlite':
+            return engine
+        try:
+            import duckdb  # noqa: F401
+            return 'duckdb'
+        except ImportError:
+            if engine == 'duckdb':
+                raise Exception("duckdb is required for EMBEDDED_ENGINE=duckdb. Install it with pip install duckdb")
+            return 'sqlite'
+    
+    def get_connection(self):
+        """Connection for the calling thread"""
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            if self.engine == 'duckdb':
+                import duckdb
+                # A DuckDB file allows one read-write handle per process; threads use cursors of it
+                if self._duckdb is None:
+                    self._duckdb = duckdb.connect(self.path)
+                connection = self._duckdb.cursor()
+            else:
+                import sqlite3
+                connection = sqlite3.connect(self.path, detect_types=0)
+                connection.execute("PRAGMA journal_mode=WAL")
+            self._local.connection = connection
+        return connection
+    
+    def _execute(self, query: str, params: Sequence = ()):
+        connection = self.get_connection()
+        connection.execute(query, tuple(params))
+        if self.engine == 'sqlite':
+            connection.commit()
+    
+    def _query(self, query: str, params: Sequence = ()) -> List[Dict[str, Any]]:
+        try:
+            cursor = self.get_connection().execute(query, tuple(params))
+            columns = [column[0] for column in cursor.description]
+            return [dict(zip(columns, row)) for row in cursor.fetchall()]
+        except Exception as e:
+            raise Exception(f"Error querying {self.engine}: {str(e)}")
+    
+    def test_connection(self) -> bool:
+        try:
+            self._query("SELECT 1 AS ok")
+            return True
+        except Exception:
+            return False
+    
+    def max_id(self) -> int:
+        return self._query("SELECT MAX(id) AS max_id FROM complaints")[0]['max_id'] or 0
+    
+    def sync(self) -> int:
+        """Ingest rows added to the source since the last sync; return how many"""
+        with self._sync_lock:
+            if self.source_csv:
+                stat = os.stat(self.source_csv)
+                if self._source_stat == (stat.st_mtime_ns, stat.st_size):
+                    return 0
+                added = self.ingest_csv(self.source_csv)
+                self._source_stat = (stat.st_mtime_ns, stat.st_size)
+                return added
+            if self.source_db is not None:
+                last_id = self.max_id()
+                if (self.source_db.fetch_data_version()['max_id'] or 0) <= last_id:
+                    return 0
+                return self.ingest_frames(self.source_db.iter_complaint_frames(after=(last_id,) if last_id else None))
+            return 0
+    
+    def ingest_csv(self, csv_path: str, chunksize: int = 100000) -> int:
+        """Append CSV rows with ids above those already stored"""
+        last_id = self.max_id()
+        if self.engine == 'duckdb':
+            # DuckDB parses the CSV itself, in parallel and without pandas
+            before = self._query("SELECT COUNT(*) AS count FROM complaints")[0]['count']
+            self._execute(f"""
+                INSERT OR IGNORE INTO complaints
+                SELECT {', '.join(COMPLAINT_COLUMNS[:-1])}, CAST(created_at AS TIMESTAMP)
+                FROM read_csv_auto(?, header=true)
+                WHERE id > ?
+            """, (csv_path, last_id))
+            return self._query("SELECT COUNT(*) AS count FROM complaints")[0]['count'] - before
+        return self.ingest_frames(chunk[chunk['id'] > last_id] for chunk in pd.read_csv(csv_path, chunksize=chunksize))
+    
+    def ingest_frames(self, frames) -> int:
+        """Append DataFrame chunks of complaints, e.g. from a MySQL export
+        
+        Returns how many rows were stored; rows whose id is already present
+        are skipped and not counted.
+        """
+        connection = self.get_connection()
+        count = "SELECT COUNT(*) FROM complaints"
+        before = connection.execute(count).fetchone()[0]
+        for frame in frames:
+            if frame.empty:
+                continue
+            frame = frame[list(COMPLAINT_COLUMNS)].assign(
+                created_at=pd.to_datetime(frame['created_at'], errors='coerce').dt.strftime('%Y-%m-%d %H:%M:%S')
+            )
+            frame = frame.astype(object).where(frame.notna(), None)
+            if self.engine == 'duckdb':
+                connection.register('incoming', frame)
+                connection.execute(f"INSERT OR IGNORE INTO complaints SELECT {', '.join(COMPLAINT_COLUMNS[:-1])}, "
+                                   f"CAST(created_at AS TIMESTAMP) FROM incoming")
+                connection.unregister('incoming')
+            else:
+                connection.executemany(
+                    f"INSERT OR IGNORE INTO complaints ({', '.join(COMPLAINT_COLUMNS)}) VALUES ({', '.join('?' * len(COMPLAINT_COLUMNS))})",
+                    frame.itertuples(index=False, name=None)
+                )
+                connection.commit()
+        return connection.execute(count).fetchone()[0] - before
+    
+    @timed(DB_QUERY_SECONDS, 'db', query='data_version')
+    def fetch_data_version(self) -> Dict[str, Any]:
+        """Sync from the source, then fingerprint the stored table"""
+        self.sync()
+        version = self._query("SELECT COUNT(*) AS count, MAX(id) AS max_id, MAX(created_at) AS last_modified FROM complaints")[0]
+        if isinstance(version['last_modified'], str):
+            version['last_modified'] = datetime.fromisoformat(version['last_modified'])
+        return version
+    
+    @timed(DB_QUERY_SECONDS, 'db', query='analytics_aggregates')
+    def fetch_analytics_aggregates(self, rating_threshold: int = 2, **filters) -> Dict[str, Any]:
+        """Run all analytics aggregations, optionally over a filtered subset"""
+        where, params = self._filter(**filters)
+        results = {name: self._query(query, params) for name, query in analytics_queries(self.engine, where).items()}
+        if results['confidence_stats']:
+            stats = results['confidence_stats'][0]
+            stats['median'] = self._fetch_confidence_median(stats['count'], where, params)
+        results['priority_issues'] = self._fetch_priority_issues(rating_threshold, where, params)
+        return results
+    
+    @timed(DB_QUERY_SECONDS, 'db', query='aggregate')
+    def fetch_aggregate(self, name: str) -> List[Dict[str, Any]]:
+        results = self._query(analytics_queries(self.engine)[name])
+        if name == 'confidence_stats' and results:
+            results[0]['median'] = self._fetch_confidence_median(results[0]['count'])
+        return results
+    
+    @timed(DB_QUERY_SECONDS, 'db', query='priority_issues')
+    def fetch_priority_issues(self, rating_threshold: int = 2, start_date=None, end_date=None) -> List[Dict[str, Any]]:
+        return self._fetch_priority_issues(rating_threshold, *self._filter(start_date=start_date, end_date=end_date))
+    
+    @timed(DB_QUERY_SECONDS, 'db', query='confidence_median')
+    def fetch_confidence_median(self, count: int, start_date=None, end_date=None):
+        return self._fetch_confidence_median(count, *self._filter(start_date=start_date, end_date=end_date))
+    
+    def _filter(self, start_date=None, end_date=None, category: str = None, sentiment: str = None,
+                min_rating: int = None, max_rating: int = None):
+        """Build a WHERE clause and params for ad-hoc filters"""
+        conditions, params = [], []
+        if start_date:
+            conditions.append("created_at >= ?")
+            params.append(str(start_date))
+        if end_date:
+            conditions.append("created_at < ?")
+            end = end_date if isinstance(end_date, date) else date.fromisoformat(str(end_date))
+            params.append(str(end + timedelta(days=1)))
+        for column, value in (('category', category), ('sentiment', sentiment)):
+            if value is not None:
+                conditions.append(f"{column} = ?")
+                params.append(value)
+        if min_rating is not None:
+            conditions.append("rating >= ?")
+            params.append(min_rating)
+        if max_rating is not None:
+            conditions.append("rating <= ?")
+            params.append(max_rating)
+        return ("WHERE " + " AND ".join(conditions) if conditions else ""), tuple(params)
+    
+    def _fetch_priority_issues(self, rating_threshold: int, where: str = '', params: tuple = ()) -> List[Dict[str, Any]]:
+        where = f"{where} AND rating <= ?" if where else "WHERE rating <= ?"
+        return self._query(f"""
+            SELECT id, complaint_text, category, sentiment, rating
+            FROM complaints
+            {where}
+            ORDER BY id
+        """, params + (rating_threshold,))
+    
+    def _fetch_confidence_median(self, count: int, where: str = '', params: tuple = ()):
+        if not count:
+            return None
+        if self.engine == 'duckdb':
+            return self._query(f"SELECT MEDIAN(confidence) AS median FROM complaints {where}", params)[0]['median']
+        # SQLite has no MEDIAN: seek into the confidence index, averaging the middle pair like pandas
+        where = f"{where} AND confidence IS NOT NULL" if where else "WHERE confidence IS NOT NULL"
+        rows = self._query(f"SELECT confidence FROM complaints {where} ORDER BY confidence LIMIT ? OFFSET ?",
+                           params + (1 if count % 2 else 2, (count - 1) // 2))
+        values = [row['confidence'] for row in rows]
+        return sum(values) / len(values) if values else None
+    
+    def iter_complaint_frames(self, fetch_size: int = None, order_by: str = 'id', columns: Sequence[str] = COMPLAINT_COLUMNS,
+                              after: tuple = None, **kwargs) -> Iterator[pd.DataFrame]:
+        """Stream complaints as DataFrame chunks using keyset pagination"""
+        if order_by not in ('id', 'created_at'):
+            raise ValueError("order_by must be 'id' or 'created_at'")
+        fetch_size = fetch_size or self.fetch_size
+        key_columns = ('id',) if order_by == 'id' else ('created_at', 'id')
+        select_columns = list(columns) + [c for c in key_columns if c not in columns]
+        last_key = tuple(after) if after is not None else None
+        
+        while True:
+            where, params = "", ()
+            if last_key is not None:
+                where = f"WHERE ({', '.join(key_columns)}) > ({', '.join('?' * len(key_columns))})"
+                params = last_key
+            rows = self._query(f"""
+                SELECT {', '.join(select_columns)}
+                FROM complaints
+                {where}
+                ORDER BY {', '.join(key_columns)}
+                LIMIT ?
+            """, params + (fetch_size,))
+            if not rows:
+                break
+            last_key = tuple(rows[-1][c] for c in key_columns)
+            yield pd.DataFrame.from_records(rows, columns=select_columns)[list(columns)]
+            if len(rows) < fetch_size:
+                break
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load complaints into the embedded analytics store")
+    parser.add_argument('--csv', help="CSV file to ingest")
+    parser.add_argument('--mysql', action='store_true', help="ingest from the MySQL complaints table")
+    parser.add_argument('--engine', choices=('auto', 'duckdb', 'sqlite'))
+    parser.add_argument('--path', help="database file (default EMBEDDED_DB_PATH)")
+    args = parser.parse_args()
+    
+    source_db = None
+    if args.mysql:
+        from db_config import DatabaseConfig
+        source_db = DatabaseConfig()
+        source_db.use_database = True
+    store = EmbeddedStore(args.path, args.engine, source_csv=args.csv, source_db=source_db)
+    print(f"Ingested {store.sync()} new complaints into {store.path} ({store.engine}), {store.max_id()} is the last id")
@@ -0,0 +1,128 @@
+import gzip
+import hashlib
+import threading
+from collections import OrderedDict
+from datetime import datetime, date, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Any, Callable, Optional, Tuple
+
+import orjson
+from fastapi import Request
+from fastapi.responses import Response
+
+from metrics import CACHE_REQUESTS
+
+try:
+    import brotli
+except ImportError:  # Brotli is optional; gzip is always available
+    brotli = None
+
+# Payloads smaller than this are sent uncompressed
+MIN_COMPRESS_SIZE = 1024
+
+def json_default(obj: Any):
+    """Serialize numpy scalars and dates that orjson does not handle natively; shared by all orjson writers"""
+    if hasattr(obj, 'item'):
+        return obj.item()
+    if isinstance(obj, (datetime, date)):
+        return obj.isoformat()
+    raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+
+def dumps(payload: Any) -> bytes:
+    """Serialize a payload to JSON bytes with orjson"""
+    return orjson.dumps(payload, default=json_default, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY)
+
+class CachedJSONResponder:
+    """Serve versioned JSON with ETag/Last-Modified validators and compression
+    
+    Encoded bodies are cached per (key, data version, encoding), so repeat
+    polls of unchanged data cost a version check and a dict lookup, and
+    clients holding the current ETag get an empty 304.
+    """
+    
+    def __init__(self, max_entries: int = 64):
+        self.max_entries = max_entries
+        self._bodies = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def respond(self, request: Request, key: str, version: str, last_modified: datetime,
+                build_payload: Callable[[], Any]) -> Response:
+        """Answer with 304, a cached encoded body, or a freshly built one"""
+        etag = 'W/"' + hashlib.sha1(f"{key}:{version}".encode('utf-8')).hexdigest()[:20] + '"'
+        # HTTP dates have second resolution; naive times are local
+        last_modified = last_modified.replace(microsecond=0).astimezone(timezone.utc)
+        headers = {
+            "ETag": etag,
+            "Last-Modified": format_datetime(last_modified, usegmt=True),
+            "Cache-Control": "no-cache",
+            "Vary": "Accept-Encoding"
+        }
+        
+        if self._is_not_modified(request, etag, last_modified):
+            CACHE_REQUESTS.inc(cache='http', result='not_modified')
+            return Response(status_code=304, headers=headers)
+        
+        encoding = self._choose_encoding(request.headers.get('accept-encoding', ''))
+        body, encoding = self._get_body(key, version, encoding, build_payload)
+        if encoding:
+            headers["Content-Encoding"] = encoding
+        
+        return Response(content=body, media_type="application/json", headers=headers)
+    
+    def _is_not_modified(self, request: Request, etag: str, last_modified: datetime) -> bool:
+        if_none_match = request.headers.get('if-none-match')
+        if if_none_match is not None:
+            # Weak comparison, as required for If-None-Match
+            tags = [self._opaque_tag(tag) for tag in if_none_match.split(',')]
+            return '*' in tags or self._opaque_tag(etag) in tags
+        
+        if_modified_since = request.headers.get('if-modified-since')
+        if if_modified_since:
+            try:
+                return last_modified <= parsedate_to_datetime(if_modified_since)
+            except (TypeError, ValueError):
+                return False
+        return False
+    
+    @staticmethod
+    def _opaque_tag(tag: str) -> str:
+        tag = tag.strip()
+        return tag[2:] if tag.startswith('W/') else tag
+    
+    def _choose_encoding(self, accept_encoding: str) -> Optional[str]:
+        accepted = {part.split(';')[0].strip().lower() for part in accept_encoding.split(',')}
+        if brotli is not None and 'br' in accepted:
+            return 'br'
+        if 'gzip' in accepted:
+            return 'gzip'
+        return None
+    
+    def _get_body(self, key: str, version: str, encoding: Optional[str],
+                  build_payload: Callable[[], Any]) -> Tuple[bytes, Optional[str]]:
+        cache_key = (key, version, encoding)
+        with self._lock:
+            cached = self._bodies.get(cache_key)
+            if cached is not None:
+                self._bodies.move_to_end(cache_key)
+                CACHE_REQUESTS.inc(cache='http', result='hit')
+                return cached
+        CACHE_REQUESTS.inc(cache='http', result='miss')
+        
+        body = dumps(build_payload())
+        if encoding is None or len(body) < MIN_COMPRESS_SIZE:
+            encoding = None
+        elif encoding == 'br':
+            body = brotli.compress(body, quality=5)
+        else:
+            body = gzip.compress(body, compresslevel=6)
+        
+        with self._lock:
+            self._bodies[cache_key] = (body, encoding)
+            self._bodies.move_to_end(cache_key)
+            # Older versions of the same key are never served again
+            for stale in [k for k in self._bodies if k[0] == key and k[1] != version]:
+                del self._bodies[stale]
+            while len(self._bodies) > self.max_entries:
+                self._bodies.popitem(last=False)
+        
+        return body, encoding
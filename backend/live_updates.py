@@ -0,0 +1,233 @@
+import asyncio
+import os
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+from starlette.concurrency import run_in_threadpool
+
+from sketches import priority_count
+
+# Cap on new priority issues carried by one (possibly coalesced) delta
+MAX_PRIORITY_ISSUES_PER_DELTA = 50
+
+def summarize_analytics(analytics: Dict[str, Any]) -> Dict[str, Any]:
+    """Reduce full analytics to the compact state that deltas are computed from
+    
+    The time series is left out: clients hold it downsampled to their own
+    point budget, so its changes are computed per resolution from snapshots.
+    """
+    return {
+        'total_complaints': analytics['total_complaints'],
+        'time_series_days': len(analytics['time_series']),
+        'sentiment_distribution': dict(analytics['sentiment_distribution']),
+        'category_distribution': dict(analytics['category_distribution']),
+        'rating_by_category': dict(analytics['rating_by_category']),
+        'confidence_stats': dict(analytics['confidence_stats']),
+        'priority_issues': {issue['id']: issue for issue in analytics['priority_issues']},
+        'priority_count': priority_count(analytics),
+    }
+
+def _changed(old: Dict, new: Dict) -> Dict:
+    """Entries that differ between two mappings; removed keys map to 0"""
+    changes = {k: v for k, v in new.items() if old.get(k) != v}
+    changes.update({k: 0 for k in old if k not in new})
+    return changes
+
+def compute_delta(old: Dict[str, Any], new: Dict[str, Any]) -> Dict[str, Any]:
+    """Compute a compact delta between two analytics summaries"""
+    delta = {
+        'total_complaints': new['total_complaints'],
+        'time_series_days': new['time_series_days'],
+        'priority_count': new['priority_count'],
+    }
+    for key in ('sentiment_distribution', 'category_distribution', 'rating_by_category'):
+        changes = _changed(old[key], new[key])
+        if changes:
+            delta[key] = changes
+    
+    if old['confidence_stats'] != new['confidence_stats']:
+        delta['confidence_stats'] = new['confidence_stats']
+    
+    new_issues = [issue for issue_id, issue in new['priority_issues'].items() if issue_id not in old['priority_issues']]
+    if new_issues:
+        delta['new_priority_issues'] = new_issues[-MAX_PRIORITY_ISSUES_PER_DELTA:]
+    return delta
+
+def time_series_delta(old: List[Dict[str, Any]], new: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Points that differ between two downsampled series; dropped dates get count 0
+    
+    Applying the result to the old series by date, then dropping zero
+    counts, gives exactly the new series, so a client's timeline stays at
+    its resolution instead of accumulating raw daily points.
+    """
+    changes = _changed({p['date']: p['count'] for p in old}, {p['date']: p['count'] for p in new})
+    return [{'date': d, 'count': c} for d, c in sorted(changes.items())]
+
+def merge_deltas(pending: Dict[str, Any], delta: Dict[str, Any]) -> Dict[str, Any]:
+    """Coalesce a newer delta into one a slow client has not received yet"""
+    merged = dict(pending)
+    merged.update({k: v for k, v in delta.items() if k not in ('time_series', 'new_priority_issues')})
+    for key in ('sentiment_distribution', 'category_distribution', 'rating_by_category'):
+        if key in pending and key in delta:
+            merged[key] = {**pending[key], **delta[key]}
+    
+    if 'time_series' in delta:
+        points = {p['date']: p['count'] for p in pending.get('time_series', [])}
+        points.update({p['date']: p['count'] for p in delta['time_series']})
+        merged['time_series'] = [{'date': d, 'count': c} for d, c in sorted(points.items())]
+    if 'new_priority_issues' in delta:
+        issues = pending.get('new_priority_issues', []) + delta['new_priority_issues']
+        merged['new_priority_issues'] = issues[-MAX_PRIORITY_ISSUES_PER_DELTA:]
+    return merged
+
+class Subscriber:
+    """One connected client with at most one pending, coalesced message
+    
+    The broadcaster never blocks on a client: if the client has not taken its
+    previous delta yet, the new one is merged into it instead of queued.
+    `resolution` is the (max_points, downsample) its timeline is kept at.
+    """
+    
+    def __init__(self, resolution: Tuple[int, str]):
+        self.resolution = resolution
+        self._pending: Optional[Dict[str, Any]] = None
+        self._ready = asyncio.Event()
+    
+    def offer(self, message: Dict[str, Any], snapshot: Dict[str, Any] = None):
+        """Queue a message; `snapshot` replaces a pending, now outdated snapshot"""
+        if self._pending is None or message['type'] == 'snapshot':
+            self._pending = message
+        elif self._pending['type'] == 'snapshot':
+            self._pending = snapshot or self._pending
+        else:
+            self._pending = merge_deltas(self._pending, message)
+        self._ready.set()
+    
+    async def next_message(self) -> Dict[str, Any]:
+        """Wait for the next (possibly coalesced) message for this client"""
+        await self._ready.wait()
+        self._ready.clear()
+        message, self._pending = self._pending, None
+        return message
+
+class AnalyticsBroadcaster:
+    """Watch the data version and fan analytics deltas out to live subscribers
+    
+    Only a cheap version check runs on each tick. Analytics are recomputed
+    once per change, after a short debounce so an ingestion burst produces a
+    single delta, and only while at least one client is connected. Snapshots
+    are built once per resolution that connected clients asked for, and
+    each client's time series changes are sent at its own resolution.
+    """
+    
+    def __init__(self, get_version: Callable[[], Tuple[str, Any]],
+                 get_analytics: Callable[[], Dict[str, Any]],
+                 build_snapshot: Callable[[Dict[str, Any], int, str], Dict[str, Any]],
+                 poll_interval: float = None, debounce: float = None):
+        self.get_version = get_version
+        self.get_analytics = get_analytics
+        self.build_snapshot = build_snapshot
+        self.poll_interval = poll_interval if poll_interval is not None else float(os.getenv('LIVE_POLL_SECONDS', 2))
+        self.debounce = debounce if debounce is not None else float(os.getenv('LIVE_DEBOUNCE_SECONDS', 0.5))
+        self.subscribers: Set[Subscriber] = set()
+        self._version: Optional[str] = None
+        self._analytics: Optional[Dict[str, Any]] = None
+        self._summary: Optional[Dict[str, Any]] = None
+        self._snapshots: Dict[Tuple[int, str], Dict[str, Any]] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup = asyncio.Event()
+        self._refresh_lock = asyncio.Lock()
+    
+    async def subscribe(self, max_points: int, downsample: str = 'lttb') -> Subscriber:
+        """Register a client and queue the current snapshot at its resolution"""
+        subscriber = Subscriber((max_points, downsample))
+        self.subscribers.add(subscriber)
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._watch())
+        
+        async with self._refresh_lock:
+            if self._analytics is None:
+                await self._refresh_locked(force=True)
+            snapshot = self._snapshots.get(subscriber.resolution)
+            if snapshot is None:
+                snapshot = await run_in_threadpool(self._build_snapshot, self._analytics, subscriber.resolution)
+                self._snapshots[subscriber.resolution] = snapshot
+        subscriber.offer(snapshot)
+        return subscriber
+    
+    def unsubscribe(self, subscriber: Subscriber):
+        self.subscribers.discard(subscriber)
+    
+    def notify(self):
+        """Ask for an immediate version check, e.g. right after an ingestion"""
+        self._wakeup.set()
+    
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+    
+    async def _watch(self):
+        while self.subscribers:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            
+            try:
+                version, _ = await run_in_threadpool(self.get_version)
+                if version != self._version:
+                    # Let a burst of inserts settle into one recompute
+                    await asyncio.sleep(self.debounce)
+                    await self._refresh()
+            except Exception as e:
+                print(f"Live analytics refresh failed: {e}")
+        # Drop state so the next subscriber gets a fresh snapshot
+        self._version = self._analytics = self._summary = None
+        self._snapshots = {}
+    
+    def _build_snapshot(self, analytics: Dict[str, Any], resolution: Tuple[int, str]) -> Dict[str, Any]:
+        return {'type': 'snapshot', 'version': self._version, 'data': self.build_snapshot(analytics, *resolution)}
+    
+    def _build_snapshots(self, analytics: Dict[str, Any], resolutions: Set[Tuple[int, str]]) -> Dict[Tuple[int, str], Dict[str, Any]]:
+        """Snapshots for every resolution a connected client uses"""
+        return {resolution: self._build_snapshot(analytics, resolution) for resolution in resolutions}
+    
+    async def _refresh(self, force: bool = False):
+        async with self._refresh_lock:
+            await self._refresh_locked(force)
+            
+    async def _refresh_locked(self, force: bool = False):
+        version, _ = await run_in_threadpool(self.get_version)
+        if version == self._version and not force:
+            return
+            
+        analytics = await run_in_threadpool(self.get_analytics)
+        summary = summarize_analytics(analytics)
+        previous, previous_snapshots = self._summary, self._snapshots
+        self._version, self._analytics, self._summary = version, analytics, summary
+        resolutions = {subscriber.resolution for subscriber in self.subscribers}
+        self._snapshots = await run_in_threadpool(self._build_snapshots, analytics, resolutions)
+    
+        if previous is not None:
+            self._publish({'type': 'delta', 'version': version, **compute_delta(previous, summary)}, previous_snapshots)
+    
+    def _publish(self, delta: Dict[str, Any], previous_snapshots: Dict[Tuple[int, str], Dict[str, Any]]):
+        for subscriber in list(self.subscribers):
+            snapshot = self._snapshots.get(subscriber.resolution)
+            previous = previous_snapshots.get(subscriber.resolution)
+            if snapshot is None:
+                continue
+            if previous is None:
+                # First refresh at this resolution; there is nothing to diff against
+                subscriber.offer(snapshot)
+                continue
+            message = dict(delta)
+            points = time_series_delta(previous['data']['time_series'], snapshot['data']['time_series'])
+            if points:
+                message['time_series'] = points
+            subscriber.offer(message, snapshot)
@@ -1,17 +1,141 @@
-from fastapi import FastAPI, HTTPException
-from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse
-from pydantic import BaseModel
-from typing import Dict, Any, List
+import time
+import asyncio
+from contextlib import contextmanager, asynccontextmanager
+from functools import lru_cache
+from typing import Dict, Any, List, Optional
+
+_process_start = time.perf_counter()
+# Startup time breakdown in the spirit of `python -X importtime`
+_startup_timings: Dict[str, float] = {}
+
+@contextmanager
+def _timed_startup(name: str):
+    """Record how long an import or initialization step takes"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        _startup_timings[name] = (time.perf_counter() - start) * 1000
+
+with _timed_startup('import fastapi'):
+    from fastapi import FastAPI, HTTPException, Query, Request, WebSocket, WebSocketDisconnect
+    from fastapi.middleware.cors import CORSMiddleware
+    from fastapi.responses import FileResponse, Response, StreamingResponse
+    from pydantic import BaseModel
 import os
-from datetime import datetime
+from admission import AdmissionMiddleware
+from metrics import REGISTRY, STARTUP_SECONDS, MetricsMiddleware, SlowRequestProfiler
+from datetime import datetime, date
+
+# Heavy subsystems (pandas, matplotlib, reportlab, groq, mysql) are imported
+# and constructed on first use by the get_* accessors below
+@lru_cache(maxsize=None)
+def get_db_config():
+    with _timed_startup('init db_config'):
+        from db_config import DatabaseConfig
+        return DatabaseConfig()
+
+@lru_cache(maxsize=None)
+def get_embedded_store():
+    db_config = get_db_config()
+    with _timed_startup('init embedded_store'):
+        from embedded_store import EmbeddedStore
+        if db_config.use_database:
+            return EmbeddedStore(source_db=db_config)
+        return EmbeddedStore(source_csv=os.path.join(os.path.dirname(__file__), 'data', 'Datafinal1.csv'))
+
+@lru_cache(maxsize=None)
+def get_data_processor():
+    # pandas (or MySQL pushdown) is the reference backend; the embedded store is opt-in
+    if os.getenv('ANALYTICS_BACKEND', 'pandas').lower() == 'embedded':
+        db_config = get_embedded_store()
+    else:
+        db_config = get_db_config()
+    with _timed_startup('init data_processor'):
+        from data_processor import DataProcessor
+        return DataProcessor(db_config=db_config)
+
+@lru_cache(maxsize=None)
+def get_rag_engine():
+    with _timed_startup('init rag_engine'):
+        from rag_engine import RAGEngine
+        return RAGEngine()
+
+@lru_cache(maxsize=None)
+def get_pdf_generator():
+    with _timed_startup('init pdf_generator'):
+        from pdf_generator import PDFGenerator
+        return PDFGenerator()
+
+@lru_cache(maxsize=None)
+def get_artifact_store():
+    from artifact_store import ArtifactStore
+    return ArtifactStore()
 
-from data_processor import DataProcessor
-from rag_engine import RAGEngine
-from pdf_generator import PDFGenerator
-from db_config import DatabaseConfig
+@lru_cache(maxsize=None)
+def get_http_cache():
+    from http_cache import CachedJSONResponder
+    return CachedJSONResponder()
 
-app = FastAPI(title="CRM RAG Analytics API")
+def _versioned_json(request, key: str, build_payload):
+    """Serve an analytics payload with ETag/Last-Modified validators"""
+    version, last_modified = get_data_processor().get_data_version()
+    return get_http_cache().respond(request, key, version, last_modified, build_payload)
+
+@lru_cache(maxsize=None)
+def get_broadcaster():
+    from live_updates import AnalyticsBroadcaster
+    data_processor = get_data_processor()
+    return AnalyticsBroadcaster(data_processor.get_data_version, data_processor.get_all_analytics, _format_charts_data)
+
+@lru_cache(maxsize=None)
+def get_anomaly_monitor():
+    from anomaly_detector import AnomalyMonitor
+    # Resolved inside the monitor's threadpool calls, so startup stays lazy
+    return AnomalyMonitor(lambda: get_data_processor().get_data_version(),
+                          lambda: get_data_processor().update_anomalies())
+
+@lru_cache(maxsize=None)
+def get_batch_runner():
+    from batch_reports import BatchReportRunner
+    return BatchReportRunner(get_data_processor(), get_rag_engine)
+
+def _report_startup_timings():
+    """Print the startup time breakdown"""
+    total = (time.perf_counter() - _process_start) * 1000
+    print(f"Startup completed in {total:.1f} ms")
+    for name, elapsed in sorted(_startup_timings.items(), key=lambda item: item[1], reverse=True):
+        print(f"  {elapsed:10.1f} ms  {name}")
+        STARTUP_SECONDS.set(elapsed / 1000, step=name)
+
+@asynccontextmanager
+async def lifespan(app):
+    """Optionally warm up heavy subsystems before serving (WARM_UP_ON_STARTUP=true)"""
+    if os.getenv('WARM_UP_ON_STARTUP', 'false').lower() == 'true':
+        for accessor in (get_db_config, get_data_processor, get_rag_engine, get_pdf_generator):
+            try:
+                accessor()
+            except Exception as e:
+                print(f"Warm-up of {accessor.__name__} failed: {e}")
+    _report_startup_timings()
+    # Opt-in: the first check replays the full history to build baselines. In
+    # shared-state mode the publishing worker feeds the detector on each refresh
+    if os.getenv('ANOMALY_DETECTION', 'false').lower() == 'true' and not os.getenv('SHARED_STATE_DIR'):
+        get_anomaly_monitor().start()
+    yield
+    if get_anomaly_monitor.cache_info().currsize:
+        await get_anomaly_monitor().stop()
+    if get_broadcaster.cache_info().currsize:
+        await get_broadcaster().stop()
+    if get_pdf_generator.cache_info().currsize:
+        get_pdf_generator().close()
+
+app = FastAPI(title="CRM RAG Analytics API", lifespan=lifespan)
+
+# Admission control: per-endpoint concurrency limits, per-client report
+# budgets and priority shedding (innermost, so rejections still get CORS headers)
+if os.getenv('ADMISSION_CONTROL', 'true').lower() == 'true':
+    app.add_middleware(AdmissionMiddleware)
 
 # CORS middleware
 app.add_middleware(
@@ -20,13 +144,14 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing", "Retry-After"],
 )
 
-# Initialize components
-data_processor = DataProcessor()
-rag_engine = RAGEngine()
-pdf_generator = PDFGenerator()
-db_config = DatabaseConfig()
+# Request metrics and Server-Timing; PROFILE_SLOW_REQUESTS_MS enables the profiler
+app.add_middleware(MetricsMiddleware, profiler=SlowRequestProfiler.from_env())
+
+# Default point budget for the complaints timeline
+CHART_MAX_POINTS = int(os.getenv('CHART_MAX_POINTS', 500))
 
 # Response models
 class AnalyticsResponse(BaseModel):
@@ -44,6 +169,14 @@ class PDFResponse(BaseModel):
     filename: str
     download_url: str
 
+class SegmentSpec(BaseModel):
+    dimension: str
+    value: Optional[str] = None
+
+class BatchReportRequest(BaseModel):
+    segments: List[SegmentSpec] = []
+    run_id: Optional[str] = None
+
 @app.get("/")
 async def root():
     """API root endpoint"""
@@ -59,57 +192,220 @@ async def root():
     }
 
 @app.post("/api/analyze-data", response_model=AnalyticsResponse)
-async def analyze_data():
+def analyze_data(request: Request):
     """Load and analyze CSV data"""
     try:
-        analytics = data_processor.get_all_analytics()
-        
-        return AnalyticsResponse(
-            status="success",
-            data=analytics
-        )
+        return _versioned_json(request, "analyze-data", lambda: {
+            "status": "success",
+            "data": get_data_processor().get_all_analytics()
+        })
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error analyzing data: {str(e)}")
 
-@app.get("/api/charts-data")
-async def get_charts_data():
-    """Get data formatted for charts"""
+@app.get("/api/analytics-range")
+def get_range_analytics(request: Request, start_date: Optional[date] = None, end_date: Optional[date] = None,
+                        category: Optional[str] = None, sentiment: Optional[str] = None):
+    """Get analytics for a date range from the daily rollup tables or the embedded store
+    
+    rollup_fields lists the fields aggregated from rollups; all other fields
+    are computed from raw rows.
+    """
     try:
-        analytics = data_processor.get_all_analytics()
-        
-        # Format data for frontend charts
-        charts_data = {
-            "sentiment_distribution": [
-                {"name": k, "value": v} 
-                for k, v in analytics['sentiment_distribution'].items()
-            ],
-            "category_distribution": [
-                {"name": k, "value": v} 
-                for k, v in analytics['category_distribution'].items()
-            ],
-            "rating_by_category": [
-                {"category": k, "rating": v} 
-                for k, v in analytics['rating_by_category'].items()
-            ],
-            "time_series": analytics['time_series'],
-            "total_complaints": analytics['total_complaints'],
-            "priority_count": len(analytics['priority_issues']),
-            "confidence_stats": analytics['confidence_stats']
+        return _versioned_json(request, f"analytics-range:{start_date}:{end_date}:{category}:{sentiment}", lambda: {
+            "status": "success",
+            "data": get_data_processor().get_range_analytics(start_date, end_date, category, sentiment),
+            "rollup_fields": get_data_processor().range_rollup_fields()
+        })
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except NotImplementedError as e:
+        raise HTTPException(status_code=501, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error getting range analytics: {str(e)}")
+
+@app.get("/api/alerts")
+def get_alerts(since: Optional[datetime] = None, category: Optional[str] = None, limit: int = 50):
+    """Get recent complaint volume spikes and sentiment shifts, newest first"""
+    try:
+        return {
+            "status": "success",
+            "alerts": get_data_processor().get_alerts(since, category, limit)
         }
-        
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error getting alerts: {str(e)}")
+
+@app.get("/api/clusters")
+def get_clusters(min_size: int = 2, category: Optional[str] = None, limit: int = 50):
+    """Get clusters of near-duplicate complaints, largest first"""
+    try:
+        return {
+            "status": "success",
+            **get_data_processor().get_clusters(min_size, category, limit)
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error getting clusters: {str(e)}")
+
+@app.get("/api/topics")
+def get_topics(dimension: Optional[str] = None, group: Optional[str] = None, limit: int = 10):
+    """Get the most distinctive terms per category and per sentiment"""
+    if dimension not in (None, 'category', 'sentiment'):
+        raise HTTPException(status_code=400, detail="dimension must be 'category' or 'sentiment'")
+    try:
         return {
             "status": "success",
-            "data": charts_data
+            "topics": get_data_processor().get_topics(dimension, group, limit)
         }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error getting topics: {str(e)}")
+
+@app.get("/api/cube")
+def get_cube(request: Request, rows: str = 'category', columns: Optional[str] = 'sentiment',
+             category: Optional[List[str]] = Query(None), sentiment: Optional[List[str]] = Query(None),
+             rating: Optional[List[int]] = Query(None), start_date: Optional[date] = None,
+             end_date: Optional[date] = None):
+    """Pivot complaint counts by two dimensions, or one when columns is empty
+    
+    Dimensions are category, sentiment, rating and day. Repeated filter
+    parameters drill down to those labels before rolling up.
+    """
+    filters = {'category': category, 'sentiment': sentiment, 'rating': rating,
+               'start_date': start_date, 'end_date': end_date}
+    key = "cube:" + ":".join(str(value) for value in [rows, columns, *filters.values()])
+    try:
+        return _versioned_json(request, key, lambda: {
+            "status": "success",
+            "data": get_data_processor().get_cube(rows, columns or None, **filters)
+        })
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error getting cube: {str(e)}")
+
+@app.get("/api/charts-data")
+def get_charts_data(request: Request, max_points: Optional[int] = Query(None, ge=10, le=100000),
+                    downsample: str = Query('lttb', pattern='^(lttb|minmax)$')):
+    """Get data formatted for charts
+    
+    The time series is downsampled to at most max_points points (default
+    CHART_MAX_POINTS) so the payload stays bounded however long the history.
+    """
+    max_points = max_points or CHART_MAX_POINTS
+    try:
+        return _versioned_json(request, f"charts-data:{max_points}:{downsample}",
+                               lambda: _build_charts_data(max_points, downsample))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error getting charts data: {str(e)}")
 
+def _build_charts_data(max_points: int = None, downsample: str = 'lttb') -> Dict[str, Any]:
+    """Build the charts payload from current analytics"""
+    return {
+        "status": "success",
+        "data": _format_charts_data(get_data_processor().get_all_analytics(), max_points, downsample)
+    }
+
+def _format_charts_data(analytics: Dict[str, Any], max_points: int = None, downsample: str = 'lttb') -> Dict[str, Any]:
+    """Format analytics for frontend charts"""
+    from downsampling import downsample_time_series
+    from sketches import priority_count
+    
+    time_series = analytics['time_series']
+    charts_data = {
+        "sentiment_distribution": [
+            {"name": k, "value": v} 
+            for k, v in analytics['sentiment_distribution'].items()
+        ],
+        "category_distribution": [
+            {"name": k, "value": v} 
+            for k, v in analytics['category_distribution'].items()
+        ],
+        "rating_by_category": [
+            {"category": k, "rating": v} 
+            for k, v in analytics['rating_by_category'].items()
+        ],
+        "time_series": downsample_time_series(time_series, max_points or CHART_MAX_POINTS, downsample),
+        "time_series_days": len(time_series),
+        "total_complaints": analytics['total_complaints'],
+        "priority_count": priority_count(analytics),
+        "confidence_stats": analytics['confidence_stats']
+    }
+    
+    return charts_data
+
+@app.websocket("/ws/analytics")
+async def analytics_websocket(websocket: WebSocket, max_points: Optional[int] = Query(None, ge=10, le=100000),
+                              downsample: str = Query('lttb', pattern='^(lttb|minmax)$')):
+    """Push an analytics snapshot, then compact deltas as new complaints arrive
+    
+    The time series in snapshots and deltas is kept at the max_points and
+    downsample resolution of /api/charts-data.
+    """
+    from http_cache import dumps
+    
+    await websocket.accept()
+    broadcaster = get_broadcaster()
+    subscriber = await broadcaster.subscribe(max_points or CHART_MAX_POINTS, downsample)
+    disconnected = asyncio.create_task(_wait_for_disconnect(websocket))
+    
+    try:
+        while True:
+            next_message = asyncio.create_task(subscriber.next_message())
+            await asyncio.wait({next_message, disconnected}, return_when=asyncio.FIRST_COMPLETED)
+            if disconnected.done():
+                next_message.cancel()
+                break
+            await websocket.send_text(dumps(next_message.result()).decode('utf-8'))
+    except WebSocketDisconnect:
+        pass
+    finally:
+        broadcaster.unsubscribe(subscriber)
+        disconnected.cancel()
+
+async def _wait_for_disconnect(websocket: WebSocket):
+    """Drain client frames until the socket closes"""
+    while (await websocket.receive())['type'] != 'websocket.disconnect':
+        pass
+
+@app.get("/api/analytics/stream")
+async def analytics_stream(request: Request, max_points: Optional[int] = Query(None, ge=10, le=100000),
+                           downsample: str = Query('lttb', pattern='^(lttb|minmax)$')):
+    """Server-Sent Events variant of /ws/analytics"""
+    from http_cache import dumps
+    
+    broadcaster = get_broadcaster()
+    subscriber = await broadcaster.subscribe(max_points or CHART_MAX_POINTS, downsample)
+    
+    async def events():
+        try:
+            while not await request.is_disconnected():
+                try:
+                    message = await asyncio.wait_for(subscriber.next_message(), timeout=15)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield f"event: {message['type']}\ndata: {dumps(message).decode('utf-8')}\n\n"
+        finally:
+            broadcaster.unsubscribe(subscriber)
+    
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+def _report_analytics(data_processor) -> Dict[str, Any]:
+    """Analytics plus the alerts, recurring complaints, topics and pivot a report cites"""
+    return {
+        **data_processor.get_all_analytics(),
+        'alerts': data_processor.get_alerts(limit=10),
+        'clusters': data_processor.get_clusters(limit=5)['clusters'],
+        'topics': data_processor.get_topics(limit=5),
+        'category_sentiment_matrix': data_processor.get_cube('category', 'sentiment')
+    }
+
 @app.post("/api/generate-report", response_model=ReportResponse)
-async def generate_report():
+def generate_report():
     """Generate comprehensive report using RAG"""
     try:
         # Get analytics data
-        analytics = data_processor.get_all_analytics()
+        data_processor = get_data_processor()
+        rag_engine = get_rag_engine()
+        analytics = _report_analytics(data_processor)
         data_summary = data_processor.get_data_summary()
         
         # Generate report using RAG
@@ -128,51 +424,128 @@ async def generate_report():
         raise HTTPException(status_code=500, detail=f"Error generating report: {str(e)}")
 
 @app.post("/api/generate-pdf")
-async def generate_pdf():
-    """Generate PDF report with charts"""
+def generate_pdf(stream: bool = False):
+    """Generate PDF report with charts
+    
+    With stream=true the PDF is returned directly from memory; otherwise it is
+    persisted in the artifact store and a download id is returned.
+    """
     try:
         # Get analytics and report
-        analytics = data_processor.get_all_analytics()
+        data_processor = get_data_processor()
+        analytics = _report_analytics(data_processor)
         data_summary = data_processor.get_data_summary()
-        report = rag_engine.generate_report(data_summary, analytics)
+        report = get_rag_engine().generate_report(data_summary, analytics)
         
-        # Generate PDF
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        filename = f'crm_report_{timestamp}.pdf'
-        filepath = os.path.join(os.path.dirname(__file__), filename)
+        # Generate PDF in memory
+        pdf_bytes = get_pdf_generator().generate_pdf_bytes(report, analytics)
         
-        pdf_generator.generate_pdf(report, analytics, filepath)
+        if stream:
+            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+            return Response(
+                content=pdf_bytes,
+                media_type='application/pdf',
+                headers={"Content-Disposition": f'attachment; filename="crm_report_{timestamp}.pdf"'}
+            )
+        
+        artifact_id = get_artifact_store().put(pdf_bytes, suffix='.pdf')
+        filename = f'{artifact_id}.pdf'
         
         return {
             "status": "success",
             "filename": filename,
+            "download_url": f"/api/download-pdf/{filename}",
             "message": "PDF generated successfully"
         }
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error generating PDF: {str(e)}")
 
+@app.post("/api/batch-reports", status_code=202)
+def start_batch_reports(request: BatchReportRequest):
+    """Start a batch run with one report per segment, or resume a run by run_id
+    
+    A segment without a value expands to one report per value of its
+    dimension, e.g. {"dimension": "category"} or {"dimension": "week"}.
+    """
+    try:
+        segments = [segment.model_dump() for segment in request.segments] or None
+        run_id = get_batch_runner().start(segments, request.run_id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error starting batch reports: {str(e)}")
+    
+    return {
+        "status": "accepted",
+        "run_id": run_id,
+        "status_url": f"/api/batch-reports/{run_id}",
+        "download_url": f"/api/batch-reports/{run_id}/download"
+    }
+
+@app.get("/api/batch-reports/{run_id}")
+def get_batch_report_status(run_id: str):
+    """Get the manifest of a batch run, with the state of every segment"""
+    manifest = get_batch_runner().load_manifest(run_id)
+    if manifest is None:
+        raise HTTPException(status_code=404, detail="Batch run not found")
+    return manifest
+
+@app.get("/api/batch-reports/{run_id}/download")
+def download_batch_reports(run_id: str):
+    """Download the zip of finished segment PDFs and the manifest"""
+    path = get_batch_runner().zip_path(run_id)
+    if path is None or not os.path.exists(path):
+        raise HTTPException(status_code=404, detail="Batch reports are not ready")
+    return FileResponse(path, media_type='application/zip', filename=os.path.basename(path))
+
 @app.get("/api/download-pdf/{filename}")
-async def download_pdf(filename: str):
-    """Download generated PDF file"""
+def download_pdf(filename: str, request: Request):
+    """Download generated PDF file, honoring single byte-range requests"""
+    from artifact_store import parse_range_header
+    
     try:
-        filepath = os.path.join(os.path.dirname(__file__), filename)
+        store = get_artifact_store()
+        filepath = store.get_path(filename)
         
-        if not os.path.exists(filepath):
+        if filepath is None:
             raise HTTPException(status_code=404, detail="PDF file not found")
         
+        size = os.path.getsize(filepath)
+        try:
+            byte_range = parse_range_header(request.headers.get('range'), size)
+        except ValueError:
+            return Response(status_code=416, headers={"Content-Range": f"bytes */{size}"})
+        
+        if byte_range is not None:
+            start, end = byte_range
+            return Response(
+                content=store.read_range(filepath, start, end),
+                status_code=206,
+                media_type='application/pdf',
+                headers={
+                    "Content-Range": f"bytes {start}-{end}/{size}",
+                    "Accept-Ranges": "bytes"
+                }
+            )
+        
         return FileResponse(
             filepath,
             media_type='application/pdf',
-            filename=filename
+            filename=filename,
+            headers={"Accept-Ranges": "bytes"}
         )
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error downloading PDF: {str(e)}")
 
 @app.get("/api/database/test")
-async def test_database_connection():
+def test_database_connection():
     """Test MySQL database connection"""
     try:
-        is_connected = db_config.test_connection()
+        is_connected = get_db_config().test_connection()
         return {
             "status": "success" if is_connected else "failed",
             "connected": is_connected,
@@ -185,13 +558,19 @@ async def test_database_connection():
             "message": str(e)
         }
 
+@app.get("/metrics")
+async def metrics():
+    """Prometheus metrics for this worker process"""
+    return Response(content=REGISTRY.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
 @app.get("/api/health")
 async def health_check():
     """Health check endpoint"""
     return {
         "status": "healthy",
         "timestamp": datetime.now().isoformat(),
-        "data_source": "CSV" if not db_config.use_database else "MySQL"
+        "data_source": "CSV" if not get_db_config().use_database else "MySQL",
+        "analytics_backend": os.getenv('ANALYTICS_BACKEND', 'pandas').lower()
     }
 
 if __name__ == "__main__":
@@ -0,0 +1,249 @@
+import re
+from typing import Dict, Iterator, List, Tuple
+from xml.sax.saxutils import escape, quoteattr
+
+from reportlab.lib import colors
+from reportlab.lib.styles import ParagraphStyle
+from reportlab.pdfbase.pdfmetrics import stringWidth
+from reportlab.platypus import Paragraph, Spacer, Table, TableStyle
+from reportlab.platypus.flowables import HRFlowable
+
+# One pattern classifies a line; the name of the last group it matched is the line type.
+# As in CommonMark, heading hashes need a space or the end of the line after them,
+# so "#hashtag" and "#1 priority" stay text
+_LINE = re.compile(r"""
+    ^(?P<indent>[ \t]*)(?:
+        (?P<rule>(?:[-*_][ \t]*){3,})
+      | (?P<heading>\#{1,6})(?:[ \t]+(?P<heading_text>.*?))?[ \t\#]*
+      | (?P<bullet>[-*+])[ \t]+(?P<bullet_text>.*)
+      | (?P<number>\d{1,9})[.)][ \t]+(?P<number_text>.*)
+      | (?P<row>\|.*?)[ \t]*
+      | >[ \t]?(?P<quote>.*)
+      | (?P<text>\S.*?)[ \t]*
+    )?$
+""", re.VERBOSE)
+
+_TABLE_SEPARATOR = re.compile(r"^\|?[ \t]*:?-+:?[ \t]*(?:\|[ \t]*:?-+:?[ \t]*)*\|?$")
+_CELL_SPLIT = re.compile(r"(?<!\\)\|")
+
+_INLINE = re.compile(r"""
+    `(?P<code>[^`]+)`
+  | \*\*\*(?P<strong_em>.+?)\*\*\*
+  | \*\*(?P<strong>.+?)\*\*
+  | __(?P<strong_alt>.+?)__
+  | ~~(?P<strike>.+?)~~
+  | \[(?P<link_text>[^\]]+)\]\((?P<link_url>[^)\s]+)\)
+  | (?<![\w*])\*(?P<em>[^*\s](?:[^*]*[^*\s])?)\*(?![\w*])
+  | (?<![\w_])_(?P<em_alt>[^_\s](?:[^_]*[^_\s])?)_(?![\w_])
+""", re.VERBOSE)
+_INLINE_MARKERS = re.compile(r"[*_`~\[]")
+_INLINE_TAGS = {'strong': 'b', 'strong_alt': 'b', 'strike': 'strike', 'em': 'i', 'em_alt': 'i'}
+
+# Bullet glyphs by nesting depth; all are in the standard fonts' encoding
+BULLETS = ('•', '–', '·')
+
+TABLE_STYLE = TableStyle([
+    ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#e8eaf6')),
+    ('GRID', (0, 0), (-1, -1), 0.5, colors.HexColor('#9fa8da')),
+    ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+    # Fonts for cells drawn as plain strings; Paragraph cells carry their own style
+    ('FONT', (0, 0), (-1, 0), 'Helvetica-Bold', 10, 13),
+    ('FONT', (0, 1), (-1, -1), 'Helvetica', 10, 13),
+    ('TOPPADDING', (0, 0), (-1, -1), 4),
+    ('BOTTOMPADDING', (0, 0), (-1, -1), 4),
+])
+
+def inline_markup(text: str) -> str:
+    """Convert inline emphasis, code and links to ReportLab paragraph markup, escaping the rest"""
+    if not _INLINE_MARKERS.search(text):
+        return escape(text)
+    
+    parts = []
+    position = 0
+    for match in _INLINE.finditer(text):
+        parts.append(escape(text[position:match.start()]))
+        kind = match.lastgroup
+        if kind == 'code':
+            parts.append(f'<font face="Courier">{escape(match.group(kind))}</font>')
+        elif kind == 'strong_em':
+            parts.append(f'<b><i>{inline_markup(match.group(kind))}</i></b>')
+        elif kind == 'link_url':
+            parts.append(f'<link href={quoteattr(match.group(kind))} color="blue">{inline_markup(match.group("link_text"))}</link>')
+        else:
+            tag = _INLINE_TAGS[kind]
+            parts.append(f'<{tag}>{inline_markup(match.group(kind))}</{tag}>')
+        position = match.end()
+    parts.append(escape(text[position:]))
+    return ''.join(parts)
+
+def _table_cells(row: str) -> List[str]:
+    row = row.strip()
+    row = row[1:] if row.startswith('|') else row
+    row = row[:-1] if row.endswith('|') and not row.endswith('\\|') else row
+    return [cell.strip().replace('\\|', '|') for cell in _CELL_SPLIT.split(row)]
+
+def tokenize_markdown(text: str) -> Iterator[Tuple]:
+    """Split report markdown into block tokens in a single pass over its lines
+    
+    Yields ('heading', level, text), ('paragraph', lines), ('quote', lines),
+    ('rule',), ('table', header, rows) and ('list', items), where each list
+    item is [depth, ordered, number, text] and depth follows indentation.
+    """
+    kind = None      # type of the block being collected
+    lines = []       # its lines, list items or table rows
+    indents = []     # indentation of each open list level
+    blank = False    # a blank line was seen inside the current list
+    
+    def flush():
+        if kind == 'table':
+            if len(lines) > 1 and _TABLE_SEPARATOR.match(lines[1]):
+                return ('table', _table_cells(lines[0]), [_table_cells(row) for row in lines[2:]])
+            return ('paragraph', lines)
+        return (kind, lines) if kind else None
+    
+    for line in text.splitlines():
+        match = _LINE.match(line)
+        line_type = match.lastgroup
+        
+        if line_type in ('bullet_text', 'number_text'):
+            width = len(match.group('indent').expandtabs(4))
+            ordered = line_type == 'number_text'
+            # A top-level item of the other list type starts a new list
+            if kind != 'list' or (width <= indents[0] and lines[0][1] != ordered):
+                token = flush()
+                if token:
+                    yield token
+                kind, lines, indents = 'list', [], [width]
+            elif width > indents[-1] + 1:
+                indents.append(width)
+            else:
+                while len(indents) > 1 and width < indents[-1]:
+                    indents.pop()
+            lines.append([len(indents) - 1, ordered, int(match.group('number')) if ordered else None, match.group(line_type)])
+            blank = False
+            continue
+        
+        if kind == 'list' and line_type == 'text' and (not blank or match.group('indent')):
+            # Continuation of the last item, lazily or by indentation
+            lines[-1][3] += ' ' + match.group('text')
+            blank = False
+            continue
+        
+        if line_type == 'indent':
+            if kind == 'list':
+                blank = True
+                continue
+            token = flush()
+            if token:
+                yield token
+            kind, lines = None, []
+            continue
+        
+        same_block = {'row': 'table', 'quote': 'quote', 'text': 'paragraph'}.get(line_type)
+        if kind != same_block or kind is None:
+            token = flush()
+            if token:
+                yield token
+            kind, lines, blank = same_block, [], False
+        
+        if line_type in ('heading', 'heading_text'):
+            yield ('heading', len(match.group('heading')), match.group('heading_text') or '')
+        elif line_type == 'rule':
+            yield ('rule',)
+        else:
+            lines.append(match.group(line_type))
+    
+    token = flush()
+    if token:
+        yield token
+
+class MarkdownRenderer:
+    """Build ReportLab flowables from report markdown
+    
+    Supports headings, paragraphs, nested bullet and numbered lists, pipe
+    tables, block quotes, horizontal rules and inline bold, italic,
+    strikethrough, code and links. Paragraph styles are created once per
+    renderer and reused for every report.
+    """
+    
+    def __init__(self, styles, width: float, body: str = 'CustomBody', title: str = 'CustomTitle',
+                 heading: str = 'CustomHeading'):
+        self.width = width
+        self.body = styles[body]
+        self.title = styles[title]
+        self.heading = styles[heading]
+        self.subheading = ParagraphStyle('MarkdownSubheading', parent=self.heading, fontSize=13,
+                                         spaceBefore=8, spaceAfter=8)
+        self.quote = ParagraphStyle('MarkdownQuote', parent=self.body, leftIndent=18, fontName='Helvetica-Oblique',
+                                    textColor=colors.HexColor('#555555'))
+        self.table_header = ParagraphStyle('MarkdownTableHeader', parent=self.body, fontName='Helvetica-Bold',
+                                           fontSize=10, leading=13, alignment=0, spaceAfter=0)
+        self.table_cell = ParagraphStyle('MarkdownTableCell', parent=self.table_header, fontName='Helvetica')
+        self._list_styles: Dict[int, ParagraphStyle] = {}
+    
+    def _list_style(self, depth: int) -> ParagraphStyle:
+        style = self._list_styles.get(depth)
+        if style is None:
+            style = self._list_styles[depth] = ParagraphStyle(
+                f'MarkdownList{depth}', parent=self.body, leftIndent=18 * (depth + 1),
+                bulletIndent=18 * depth + 4, spaceAfter=4
+            )
+        return style
+    
+    def flowables(self, text: str) -> List:
+        """Convert a markdown report into a list of flowables"""
+        story = []
+        for token in tokenize_markdown(text):
+            kind = token[0]
+            if kind == 'heading':
+                level, heading_text = token[1], inline_markup(token[2])
+                if level == 1:
+                    story.append(Paragraph(heading_text, self.title))
+                    story.append(Spacer(1, 12))
+                else:
+                    story.append(Paragraph(heading_text, self.heading if level == 2 else self.subheading))
+            elif kind == 'paragraph':
+                story.append(Paragraph('<br/>'.join(inline_markup(line) for line in token[1]), self.body))
+                story.append(Spacer(1, 6))
+            elif kind == 'list':
+                self._add_list(story, token[1])
+                story.append(Spacer(1, 8))
+            elif kind == 'table':
+                story.append(self._table(token[1], token[2]))
+                story.append(Spacer(1, 10))
+            elif kind == 'quote':
+                story.append(Paragraph('<br/>'.join(inline_markup(line) for line in token[1]), self.quote))
+            elif kind == 'rule':
+                story.append(HRFlowable(width='100%', thickness=0.5, color=colors.HexColor('#9fa8da'),
+                                        spaceBefore=4, spaceAfter=10))
+        return story
+    
+    def _add_list(self, story: List, items: List[list]):
+        counters: Dict[int, int] = {}
+        for depth, ordered, number, item_text in items:
+            # Numbering restarts whenever a deeper level is left
+            for deeper in [d for d in counters if d > depth]:
+                del counters[deeper]
+            if ordered:
+                counters[depth] = counters[depth] + 1 if depth in counters else number
+                bullet = f'{counters[depth]}.'
+            else:
+                counters.pop(depth, None)
+                bullet = BULLETS[depth % len(BULLETS)]
+            story.append(Paragraph(inline_markup(item_text), self._list_style(depth), bulletText=bullet))
+    
+    def _cell(self, text: str, style: ParagraphStyle, width: float):
+        """Plain text that fits its column is drawn as a string, skipping Paragraph markup parsing"""
+        if not _INLINE_MARKERS.search(text) and stringWidth(text, style.fontName, style.fontSize) <= width:
+            return text
+        return Paragraph(inline_markup(text), style)
+    
+    def _table(self, header: List[str], rows: List[List[str]]) -> Table:
+        columns = max([len(header)] + [len(row) for row in rows])
+        column_width = self.width / columns
+        text_width = column_width - 12  # default cell padding
+        data = [[self._cell(cell, self.table_header, text_width) for cell in header + [''] * (columns - len(header))]]
+        for row in rows:
+            row = row[:columns] + [''] * (columns - len(row))
+            data.append([self._cell(cell, self.table_cell, text_width) for cell in row])
+        return Table(data, colWidths=[column_width] * columns, repeatRows=1, style=TABLE_STYLE)
@@ -0,0 +1,304 @@
+import os
+import sys
+import time
+import threading
+from bisect import bisect_left
+from collections import Counter as _StackCounter, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from starlette.datastructures import MutableHeaders
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Phase durations of the request being handled, for the Server-Timing header
+_request_timings: ContextVar[Optional[Dict[str, float]]] = ContextVar('request_timings', default=None)
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+class _Metric:
+    """Base for metrics with a fixed set of label names"""
+    
+    type = 'untyped'
+    
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+    
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, '')) for name in self.labelnames)
+    
+    def _labels(self, key: Tuple[str, ...], extra: Dict[str, str] = None) -> str:
+        pairs = list(zip(self.labelnames, key)) + list((extra or {}).items())
+        if not pairs:
+            return ''
+        return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+    
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.extend(self._render_value(key, value))
+        return lines
+    
+    def _render_value(self, key, value) -> List[str]:
+        return [f"{self.name}{self._labels(key)} {value}"]
+
+class Counter(_Metric):
+    type = 'counter'
+    
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+class Gauge(_Metric):
+    type = 'gauge'
+    
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+    
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+    
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+class Histogram(_Metric):
+    type = 'histogram'
+    
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+    
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            counts, total = self._values.get(key, ([0] * (len(self.buckets) + 1), 0.0))
+            counts[index] += 1
+            self._values[key] = (counts, total + value)
+    
+    def _render_value(self, key, value) -> List[str]:
+        counts, total = value
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float('inf'),), counts):
+            cumulative += count
+            le = '+Inf' if bound == float('inf') else repr(bound)
+            lines.append(f"{self.name}_bucket{self._labels(key, {'le': le})} {cumulative}")
+        lines.append(f"{self.name}_sum{self._labels(key)} {total}")
+        lines.append(f"{self.name}_count{self._labels(key)} {cumulative}")
+        return lines
+
+class MetricsRegistry:
+    """In-process metrics rendered in the Prometheus text exposition format"""
+    
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+    
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics[metric.name] = metric
+        return metric
+    
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+    
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames))
+    
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+    
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+REGISTRY = MetricsRegistry()
+
+HTTP_REQUESTS = REGISTRY.counter('crm_http_requests_total', 'HTTP requests by route and status', ('method', 'route', 'status'))
+HTTP_REQUEST_SECONDS = REGISTRY.histogram('crm_http_request_duration_seconds', 'HTTP request latency', ('method', 'route'))
+HTTP_IN_FLIGHT = REGISTRY.gauge('crm_http_requests_in_flight', 'HTTP requests currently being handled')
+ANALYTICS_SECONDS = REGISTRY.histogram('crm_analytics_duration_seconds', 'Analytics computation time', ('method',))
+LLM_SECONDS = REGISTRY.histogram('crm_llm_request_duration_seconds', 'LLM completion latency', ('operation',))
+LLM_TOKENS = REGISTRY.counter('crm_llm_tokens_total', 'LLM tokens used', ('operation', 'kind'))
+CHART_RENDER_SECONDS = REGISTRY.histogram('crm_chart_render_duration_seconds', 'Chart rendering time for one report', ('mode',))
+PDF_BUILD_SECONDS = REGISTRY.histogram('crm_pdf_build_duration_seconds', 'PDF build time including charts')
+DB_CONNECT_SECONDS = REGISTRY.histogram('crm_db_connect_duration_seconds', 'MySQL connection setup time')
+DB_QUERY_SECONDS = REGISTRY.histogram('crm_db_query_duration_seconds', 'MySQL query time including connection setup', ('query',))
+CACHE_REQUESTS = REGISTRY.counter('crm_cache_requests_total', 'Cache lookups by cache and result', ('cache', 'result'))
+STARTUP_SECONDS = REGISTRY.gauge('crm_startup_step_seconds', 'Time spent in each startup step', ('step',))
+ADMISSION_REJECTIONS = REGISTRY.counter('crm_admission_rejections_total', 'Requests rejected by admission control', ('endpoint', 'reason'))
+ADMISSION_QUEUE_DEPTH = REGISTRY.gauge('crm_admission_queue_depth', 'Requests waiting for an endpoint concurrency slot', ('limiter',))
+PROFILED_REQUESTS = REGISTRY.counter('crm_profiled_requests_total', 'Slow requests captured by the sampling profiler', ('route',))
+
+def record_phase(phase: str, seconds: float):
+    """Add time to a Server-Timing phase of the current request, if any"""
+    timings = _request_timings.get()
+    if timings is not None:
+        timings[phase] = timings.get(phase, 0.0) + seconds
+
+@contextmanager
+def timed(histogram: Histogram, phase: str = None, **labels):
+    """Observe the duration of a block (or decorated function)
+    
+    With a phase name the time is also reported in the Server-Timing header
+    of the request being handled. Phases may nest, e.g. db inside analytics.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        histogram.observe(elapsed, **labels)
+        if phase:
+            record_phase(phase, elapsed)
+
+def server_timing_header(timings: Dict[str, float], total: float) -> str:
+    entries = [f"{phase};dur={seconds * 1000:.1f}" for phase, seconds in timings.items()]
+    entries.append(f"total;dur={total * 1000:.1f}")
+    return ', '.join(entries)
+
+class SlowRequestProfiler:
+    """Opt-in sampling profiler that keeps stack samples of slow requests
+    
+    While any request is in flight a background thread samples the stacks of
+    all threads every `interval_ms`. When a request takes longer than
+    `threshold_ms`, the samples from its time window are collapsed into
+    flamegraph format and passed to the hooks; the default hook writes them
+    to `output_dir`. Concurrent requests share threads, so a window may
+    include stacks of other requests.
+    """
+    
+    def __init__(self, threshold_ms: float, interval_ms: float = 5, output_dir: str = None,
+                 max_samples: int = 50000):
+        self.threshold = threshold_ms / 1000
+        self.interval = interval_ms / 1000
+        self.output_dir = output_dir or os.path.join(os.path.dirname(__file__), 'profiles')
+        self.hooks: List[Callable[[str, float, Dict[str, int]], None]] = [self._write_profile]
+        self._samples = deque(maxlen=max_samples)
+        self._active = 0
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+    
+    @classmethod
+    def from_env(cls) -> Optional['SlowRequestProfiler']:
+        """Build a profiler if PROFILE_SLOW_REQUESTS_MS is set"""
+        threshold = os.getenv('PROFILE_SLOW_REQUESTS_MS')
+        if not threshold:
+            return None
+        return cls(float(threshold), float(os.getenv('PROFILE_INTERVAL_MS', 5)), os.getenv('PROFILE_DIR'))
+    
+    def add_hook(self, hook: Callable[[str, float, Dict[str, int]], None]):
+        """Register a callback receiving (request name, seconds, collapsed stacks)"""
+        self.hooks.append(hook)
+    
+    def start(self) -> float:
+        with self._lock:
+            self._active += 1
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='slow-request-profiler', daemon=True)
+                self._thread.start()
+        self._wakeup.set()
+        return time.perf_counter()
+    
+    def finish(self, started: float, name: str):
+        ended = time.perf_counter()
+        with self._lock:
+            self._active -= 1
+            if not self._active:
+                self._wakeup.clear()
+        
+        elapsed = ended - started
+        if elapsed < self.threshold:
+            return
+        stacks = _StackCounter(stack for at, stack in list(self._samples) if started <= at <= ended)
+        PROFILED_REQUESTS.inc(route=name)
+        for hook in self.hooks:
+            try:
+                hook(name, elapsed, dict(stacks))
+            except Exception as e:
+                print(f"Slow request profiler hook failed: {e}")
+    
+    def _run(self):
+        own_id = threading.get_ident()
+        while True:
+            self._wakeup.wait()
+            now = time.perf_counter()
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id != own_id:
+                    self._samples.append((now, self._collapse(names.get(thread_id, str(thread_id)), frame)))
+            time.sleep(self.interval)
+    
+    @staticmethod
+    def _collapse(thread_name: str, frame) -> str:
+        stack = []
+        while frame is not None:
+            code = frame.f_code
+            stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)})")
+            frame = frame.f_back
+        return ';'.join([thread_name] + stack[::-1])
+    
+    def _write_profile(self, name: str, elapsed: float, stacks: Dict[str, int]):
+        os.makedirs(self.output_dir, exist_ok=True)
+        slug = ''.join(c if c.isalnum() else '_' for c in name).strip('_')
+        path = os.path.join(self.output_dir, f"{datetime.now():%Y%m%d_%H%M%S_%f}_{slug}_{elapsed * 1000:.0f}ms.folded")
+        with open(path, 'w') as f:
+            for stack, count in sorted(stacks.items()):
+                f.write(f"{stack} {count}\n")
+
+class MetricsMiddleware:
+    """ASGI middleware recording request metrics and the Server-Timing header"""
+    
+    def __init__(self, app, profiler: SlowRequestProfiler = None):
+        self.app = app
+        self.profiler = profiler
+    
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+        
+        timings: Dict[str, float] = {}
+        token = _request_timings.set(timings)
+        start = time.perf_counter()
+        profile_start = self.profiler.start() if self.profiler else None
+        status = 500
+        
+        async def send_with_timing(message):
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+                headers = MutableHeaders(scope=message)
+                headers.append('Server-Timing', server_timing_header(timings, time.perf_counter() - start))
+            await send(message)
+        
+        HTTP_IN_FLIGHT.inc()
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            elapsed = time.perf_counter() - start
+            # Route templates keep label cardinality bounded
+            route = getattr(scope.get('route'), 'path', 'unmatched')
+            HTTP_IN_FLIGHT.dec()
+            HTTP_REQUEST_SECONDS.observe(elapsed, method=scope['method'], route=route)
+            HTTP_REQUESTS.inc(method=scope['method'], route=route, status=status)
+            _request_timings.reset(token)
+            if profile_start is not None:
+                self.profiler.finish(profile_start, f"{scope['method']} {route}")
@@ -0,0 +1,184 @@
+import os
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+CUBE_DIMENSIONS = ('category', 'sentiment', 'rating', 'day')
+
+def correlation_matrix(records: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Pivot {category, sentiment, count} records into the matrix layout ComplaintCube returns"""
+    rows = sorted({record['category'] for record in records})
+    columns = sorted({record['sentiment'] for record in records})
+    row_index = {label: i for i, label in enumerate(rows)}
+    column_index = {label: i for i, label in enumerate(columns)}
+    matrix = [[0] * len(columns) for _ in rows]
+    for record in records:
+        matrix[row_index[record['category']]][column_index[record['sentiment']]] += int(record['count'])
+    return {
+        'dimensions': ['category', 'sentiment'],
+        'rows': rows,
+        'columns': columns,
+        'matrix': matrix,
+        'row_totals': [sum(row) for row in matrix],
+        'column_totals': [sum(column) for column in zip(*matrix)],
+        'total': sum(sum(row) for row in matrix)
+    }
+
+class ComplaintCube:
+    """Complaint counts pre-aggregated over category, sentiment, rating and day
+    
+    A dense integer array holds one cell per combination of labels, with a
+    label -> index map per dimension, so roll-ups and drill-downs are numpy
+    slices and sums over at most a few hundred thousand cells. New rows are
+    folded in with one bincount per chunk. Axes grow by doubling when new
+    labels appear, and the sorted order of each axis is cached until then.
+    Rows missing a category, sentiment or date are not counted, as with
+    groupby. Missing ratings are counted under rating 0.
+    """
+    
+    def __init__(self, dimensions: Sequence[str] = None):
+        dimensions = dimensions or os.getenv('CUBE_DIMENSIONS', ','.join(CUBE_DIMENSIONS)).split(',')
+        dimensions = [dimension.strip() for dimension in dimensions if dimension.strip()]
+        unknown = set(dimensions) - set(CUBE_DIMENSIONS)
+        if unknown:
+            raise ValueError(f"Unknown cube dimensions: {', '.join(sorted(unknown))}")
+        # Category and sentiment are always present; rating and day are optional
+        self.dimensions = ['category', 'sentiment'] + [d for d in ('rating', 'day') if d in dimensions]
+        self.rows = 0
+        self.last_id = None
+        self.labels: Dict[str, List] = {dimension: [] for dimension in self.dimensions}
+        self.index: Dict[str, Dict[Any, int]] = {dimension: {} for dimension in self.dimensions}
+        self.counts = np.zeros((8,) * len(self.dimensions), dtype=np.int64)
+        self._order: Dict[str, np.ndarray] = {}
+    
+    @classmethod
+    def from_counts(cls, dimensions: Sequence[str], labels: Dict[str, List], counts: np.ndarray,
+                    rows: int = 0) -> 'ComplaintCube':
+        """Rebuild a read-only cube from counts and axis labels published by another process"""
+        cube = cls(dimensions)
+        cube.labels = {dimension: list(labels[dimension]) for dimension in cube.dimensions}
+        cube.index = {dimension: {label: i for i, label in enumerate(axis)} for dimension, axis in cube.labels.items()}
+        cube.counts = counts
+        cube.rows = rows
+        return cube
+    
+    def _values(self, frame: pd.DataFrame, dimension: str) -> pd.Series:
+        if dimension == 'day':
+            return pd.to_datetime(frame['created_at'], errors='coerce').dt.strftime('%Y-%m-%d')
+        if dimension == 'rating':
+            return pd.to_numeric(frame['rating'], errors='coerce').fillna(0).astype(np.int64)
+        return frame[dimension]
+    
+    def _codes(self, dimension: str, values: pd.Series) -> np.ndarray:
+        """Axis index of each value, adding new labels; -1 for missing values"""
+        codes, uniques = pd.factorize(values)
+        axis_codes = np.empty(len(uniques) + 1, dtype=np.int64)
+        axis_codes[-1] = -1
+        index, labels = self.index[dimension], self.labels[dimension]
+        for i, value in enumerate(uniques.tolist()):
+            code = index.get(value)
+            if code is None:
+                code = index[value] = len(labels)
+                labels.append(value)
+                self._order.pop(dimension, None)
+            axis_codes[i] = code
+        self._grow()
+        return axis_codes[codes]
+    
+    def _grow(self):
+        """Double any axis that ran out of room for its labels"""
+        shape = tuple(size if len(self.labels[d]) <= size else 2 * len(self.labels[d])
+                      for d, size in zip(self.dimensions, self.counts.shape))
+        if shape != self.counts.shape:
+            grown = np.zeros(shape, dtype=np.int64)
+            grown[tuple(slice(0, size) for size in self.counts.shape)] = self.counts
+            self.counts = grown
+    
+    def ingest(self, frame: pd.DataFrame):
+        """Count complaints with ids above the last one seen"""
+        if self.last_id is not None:
+            frame = frame[frame['id'] > self.last_id]
+        if frame.empty:
+            return
+        
+        codes = [self._codes(dimension, self._values(frame, dimension)) for dimension in self.dimensions]
+        valid = np.logical_and.reduce([code >= 0 for code in codes])
+        flat = np.ravel_multi_index([code[valid] for code in codes], self.counts.shape)
+        self.counts += np.bincount(flat, minlength=self.counts.size).reshape(self.counts.shape)
+        self.rows += len(frame)
+        self.last_id = int(frame['id'].max())
+    
+    def _sorted_axis(self, dimension: str) -> np.ndarray:
+        """Axis indices in label order, cached until the axis gets a new label"""
+        order = self._order.get(dimension)
+        if order is None:
+            labels = self.labels[dimension]
+            order = self._order[dimension] = np.array(sorted(range(len(labels)), key=lambda i: labels[i]), dtype=np.int64)
+        return order
+    
+    def query(self, rows: str, columns: Optional[str] = None, **filters) -> Dict[str, Any]:
+        """Roll the cube up to one or two dimensions, optionally drilled down by filters
+        
+        Filters are label lists per dimension (category=['Billing'],
+        rating=[1, 2]) or start_date/end_date bounds on the day dimension.
+        Labels come back sorted; labels with no complaints in the slice are
+        left out.
+        """
+        group_by = [rows] + ([columns] if columns else [])
+        for dimension in group_by:
+            if dimension not in self.dimensions:
+                raise ValueError(f"Dimension must be one of: {', '.join(self.dimensions)}")
+        if columns == rows:
+            raise ValueError("rows and columns must be different dimensions")
+        filters = {dimension: value for dimension, value in filters.items() if value is not None}
+        start_date, end_date = filters.pop('start_date', None), filters.pop('end_date', None)
+        if (start_date or end_date) and 'day' not in self.dimensions:
+            raise ValueError("Date filters need the day dimension. Add it to CUBE_DIMENSIONS")
+        for dimension in filters:
+            if dimension not in self.dimensions:
+                raise ValueError(f"Cannot filter on {dimension}; it is not a cube dimension")
+        
+        view = self.counts
+        axes = {}
+        for axis, dimension in enumerate(self.dimensions):
+            selected = self._sorted_axis(dimension)
+            wanted = filters.get(dimension)
+            if wanted is not None:
+                codes = {self.index[dimension].get(label) for label in wanted}
+                selected = selected[np.isin(selected, [code for code in codes if code is not None])]
+            if dimension == 'day' and (start_date or end_date):
+                days = np.array(self.labels['day'], dtype=object)[selected]
+                keep = np.ones(len(selected), dtype=bool)
+                if start_date:
+                    keep &= days >= str(start_date)
+                if end_date:
+                    keep &= days <= str(end_date)
+                selected = selected[keep]
+            view = np.take(view, selected, axis=axis)
+            axes[dimension] = selected
+        
+        kept = [self.dimensions.index(dimension) for dimension in group_by]
+        summed = view.sum(axis=tuple(i for i in range(len(self.dimensions)) if i not in kept))
+        if columns and kept[0] > kept[1]:
+            summed = summed.T
+        
+        row_totals = summed.sum(axis=1) if columns else summed
+        row_mask = row_totals > 0
+        result = {
+            'dimensions': group_by,
+            'rows': [self.labels[rows][i] for i in axes[rows][row_mask]],
+            'total': int(row_totals.sum())
+        }
+        if columns:
+            column_totals = summed.sum(axis=0)
+            column_mask = column_totals > 0
+            result.update({
+                'columns': [self.labels[columns][i] for i in axes[columns][column_mask]],
+                'matrix': summed[np.ix_(row_mask, column_mask)].tolist(),
+                'row_totals': row_totals[row_mask].tolist(),
+                'column_totals': column_totals[column_mask].tolist()
+            })
+        else:
+            result['counts'] = row_totals[row_mask].tolist()
+        return result
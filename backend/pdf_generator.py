@@ -1,27 +1,150 @@
-from reportlab.lib.pagesizes import letter, A4
+from reportlab.lib.pagesizes import letter
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib.units import inch
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, PageBreak, Image, Table, TableStyle
+from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, PageBreak, Image
 from reportlab.lib import colors
-from reportlab.lib.enums import TA_CENTER, TA_LEFT, TA_JUSTIFY
-import matplotlib.pyplot as plt
-import matplotlib
-matplotlib.use('Agg')  # Use non-interactive backend
+from reportlab.lib.enums import TA_CENTER, TA_JUSTIFY
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from collections import OrderedDict
 import io
+import os
+import json
+import hashlib
+import threading
 from datetime import datetime
-from typing import Dict, Any, List
-import base64
-import re
+from typing import Dict, Any, List, Optional
+import time
+from xml.sax.saxutils import escape
+
+from markdown_flowables import MarkdownRenderer
+from metrics import CACHE_REQUESTS, CHART_RENDER_SECONDS, PDF_BUILD_SECONDS, record_phase, timed
+
+SENTIMENT_COLORS = {
+    'Best': '#4caf50',
+    'Good': '#8bc34a',
+    'Average': '#ffc107',
+    'Fair': '#ff9800',
+    'Bad': '#f44336'
+}
+
+def _figure_to_png(fig) -> bytes:
+    """Render a figure to PNG bytes"""
+    img_buffer = io.BytesIO()
+    fig.savefig(img_buffer, format='png', dpi=150, bbox_inches='tight')
+    return img_buffer.getvalue()
+
+def render_sentiment_pie_chart(sentiment_data: Dict[str, int]) -> bytes:
+    """Render sentiment distribution pie chart as PNG"""
+    # matplotlib is only imported on a cache miss; Figure avoids global pyplot state
+    from matplotlib.figure import Figure
+    fig = Figure(figsize=(8, 6))
+    ax = fig.subplots()
+    
+    labels = list(sentiment_data.keys())
+    sizes = list(sentiment_data.values())
+    colors_list = [SENTIMENT_COLORS.get(label, '#9e9e9e') for label in labels]
+    
+    ax.pie(sizes, labels=labels, colors=colors_list, autopct='%1.1f%%',
+           startangle=90, textprops={'fontsize': 10})
+    ax.axis('equal')
+    
+    return _figure_to_png(fig)
+
+def render_category_bar_chart(category_data: Dict[str, int]) -> bytes:
+    """Render category distribution bar chart as PNG"""
+    from matplotlib.figure import Figure
+    fig = Figure(figsize=(10, 6))
+    ax = fig.subplots()
+    
+    categories = list(category_data.keys())
+    counts = list(category_data.values())
+    
+    bars = ax.barh(categories, counts, color='#3f51b5')
+    ax.set_xlabel('Number of Complaints', fontsize=11)
+    ax.set_title('Complaints Distribution by Category', fontsize=13, fontweight='bold')
+    
+    # Add value labels on bars
+    for bar in bars:
+        width = bar.get_width()
+        ax.text(width, bar.get_y() + bar.get_height()/2,
+               f'{int(width)}', ha='left', va='center', fontsize=9)
+    
+    fig.tight_layout()
+    return _figure_to_png(fig)
+
+def render_rating_bar_chart(rating_data: Dict[str, float]) -> bytes:
+    """Render rating by category bar chart as PNG"""
+    from matplotlib.figure import Figure
+    fig = Figure(figsize=(10, 6))
+    ax = fig.subplots()
+    
+    categories = list(rating_data.keys())
+    ratings = list(rating_data.values())
+    
+    # Color bars based on rating
+    colors_list = ['#4caf50' if r >= 4 else '#ffc107' if r >= 3 else '#f44336' for r in ratings]
+    
+    bars = ax.barh(categories, ratings, color=colors_list)
+    ax.set_xlabel('Average Rating', fontsize=11)
+    ax.set_xlim(0, 5)
+    ax.set_title('Average Rating by Category', fontsize=13, fontweight='bold')
+    
+    # Add value labels on bars
+    for bar in bars:
+        width = bar.get_width()
+        ax.text(width, bar.get_y() + bar.get_height()/2,
+               f'{width:.2f}', ha='left', va='center', fontsize=9)
+    
+    fig.tight_layout()
+    return _figure_to_png(fig)
+
+# Chart key -> (renderer, analytics field, width, height)
+CHART_SPECS = {
+    'sentiment': (render_sentiment_pie_chart, 'sentiment_distribution', 5*inch, 3.75*inch),
+    'category': (render_category_bar_chart, 'category_distribution', 6*inch, 3.6*inch),
+    'rating': (render_rating_bar_chart, 'rating_by_category', 6*inch, 3.6*inch),
+}
+
+class ChartCache:
+    """Thread-safe LRU cache of rendered chart PNGs keyed by input data"""
+    
+    def __init__(self, max_entries: int = 32):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+    
+    @staticmethod
+    def make_key(chart: str, data: Dict[str, Any]) -> str:
+        """Hash chart type and distribution; item order matters for bar layout"""
+        payload = json.dumps([chart, [[str(k), v] for k, v in data.items()]], default=str)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+    
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            png = self._entries.get(key)
+            if png is not None:
+                self._entries.move_to_end(key)
+            return png
+    
+    def put(self, key: str, png: bytes):
+        with self._lock:
+            self._entries[key] = png
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
 
 class PDFGenerator:
-    def __init__(self):
+    def __init__(self, chart_workers: int = None, chart_cache_size: int = None):
         self.styles = getSampleStyleSheet()
         self._setup_custom_styles()
-    
-    def _convert_markdown_bold(self, text: str) -> str:
-        """Convert markdown bold (**text**) to HTML bold (<b>text</b>)"""
-        # Use regex to replace **text** with <b>text</b>
-        return re.sub(r'\*\*(.+?)\*\*', r'<b>\1</b>', text)
+        # Content width between the 72pt side margins used by generate_pdf
+        self.markdown = MarkdownRenderer(self.styles, width=letter[0] - 2 * 72)
+        # 0 workers renders charts in-process
+        self.chart_workers = int(os.getenv('CHART_WORKERS', 3)) if chart_workers is None else chart_workers
+        self.chart_cache = ChartCache(int(os.getenv('CHART_CACHE_SIZE', 32)) if chart_cache_size is None else chart_cache_size)
+        self._chart_pool = None
+        self._pool_lock = threading.Lock()
     
     def _setup_custom_styles(self):
         """Setup custom paragraph styles"""
@@ -57,8 +180,18 @@ class PDFGenerator:
             spaceAfter=10
         ))
     
-    def generate_pdf(self, report_text: str, analytics: Dict[str, Any], filename: str = None) -> str:
-        """Generate PDF report with charts"""
+    def generate_pdf_bytes(self, report_text: str, analytics: Dict[str, Any], title: str = None) -> bytes:
+        """Generate PDF report with charts into an in-memory buffer"""
+        buffer = io.BytesIO()
+        self.generate_pdf(report_text, analytics, buffer, title=title)
+        return buffer.getvalue()
+    
+    @timed(PDF_BUILD_SECONDS, 'pdf')
+    def generate_pdf(self, report_text: str, analytics: Dict[str, Any], filename=None, title: str = None):
+        """Generate PDF report with charts
+        
+        filename may be a path or a writable binary file object.
+        """
         if filename is None:
             timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
             filename = f'crm_report_{timestamp}.pdf'
@@ -72,7 +205,7 @@ class PDFGenerator:
         story = []
         
         # Add title
-        title = Paragraph("CRM Analytics Report", self.styles['CustomTitle'])
+        title = Paragraph(escape(title or "CRM Analytics Report"), self.styles['CustomTitle'])
         story.append(title)
         story.append(Spacer(1, 12))
         
@@ -101,204 +234,125 @@ class PDFGenerator:
     
     def _add_report_content(self, story: List, report_text: str):
         """Add formatted report content to PDF"""
-        # Split report into lines and process
-        lines = report_text.split('\n')
-        
-        i = 0
-        while i < len(lines):
-            line = lines[i].strip()
-            
-            if not line:
-                i += 1
-                continue
-            
-            # Check for markdown headings (## Heading)
-            if line.startswith('##'):
-                heading_text = line.replace('##', '').strip()
-                heading = Paragraph(heading_text, self.styles['CustomHeading'])
-                story.append(heading)
-                i += 1
-                continue
-            
-            # Check for main heading (# Heading)
-            if line.startswith('#'):
-                heading_text = line.replace('#', '').strip()
-                heading = Paragraph(heading_text, self.styles['CustomTitle'])
-                story.append(heading)
-                story.append(Spacer(1, 12))
-                i += 1
-                continue
-            
-            # Check for bullet points
-            if line.startswith('-') or line.startswith('*'):
-                # Collect consecutive bullet points
-                bullet_lines = []
-                while i < len(lines) and (lines[i].strip().startswith('-') or lines[i].strip().startswith('*')):
-                    bullet_text = lines[i].strip()[1:].strip()
-                    # Handle bold text (**text**) properly
-                    bullet_text = self._convert_markdown_bold(bullet_text)
-                    bullet_lines.append(bullet_text)
-                    i += 1
-                
-                # Add bullets as paragraphs with bullet style
-                for bullet in bullet_lines:
-                    para = Paragraph(f'• {bullet}', self.styles['CustomBody'])
-                    story.append(para)
-                story.append(Spacer(1, 8))
-                continue
-            
-            # Check for numbered lists
-            if line and len(line) > 2 and line[0].isdigit() and line[1] == '.':
-                # Collect consecutive numbered items
-                numbered_lines = []
-                while i < len(lines) and len(lines[i].strip()) > 2 and lines[i].strip()[0].isdigit() and lines[i].strip()[1] == '.':
-                    item_text = lines[i].strip().split('.', 1)[1].strip()
-                    # Handle bold text properly
-                    item_text = self._convert_markdown_bold(item_text)
-                    numbered_lines.append(item_text)
-                    i += 1
-                
-                # Add numbered items
-                for idx, item in enumerate(numbered_lines, 1):
-                    para = Paragraph(f'{idx}. {item}', self.styles['CustomBody'])
-                    story.append(para)
-                story.append(Spacer(1, 8))
-                continue
-            
-            # Regular paragraph
-            # Handle bold text in paragraphs properly
-            paragraph_text = self._convert_markdown_bold(line)
-            para = Paragraph(paragraph_text, self.styles['CustomBody'])
-            story.append(para)
-            story.append(Spacer(1, 6))
-            i += 1
+        story.extend(self.markdown.flowables(report_text))
     
     def _add_charts(self, story: List, analytics: Dict[str, Any]):
         """Generate and add charts to PDF"""
+        charts = self.render_charts(analytics)
+        
         # Sentiment Distribution Pie Chart
-        sentiment_chart = self._create_sentiment_pie_chart(analytics['sentiment_distribution'])
-        if sentiment_chart:
+        if charts.get('sentiment'):
             story.append(Paragraph("Sentiment Distribution", self.styles['CustomHeading']))
-            story.append(sentiment_chart)
+            story.append(self._chart_image('sentiment', charts['sentiment']))
             story.append(Spacer(1, 20))
         
         # Category Distribution Bar Chart
-        category_chart = self._create_category_bar_chart(analytics['category_distribution'])
-        if category_chart:
+        if charts.get('category'):
             story.append(Paragraph("Complaints by Category", self.styles['CustomHeading']))
-            story.append(category_chart)
+            story.append(self._chart_image('category', charts['category']))
             story.append(Spacer(1, 20))
         
         # Rating by Category Bar Chart
-        rating_chart = self._create_rating_bar_chart(analytics['rating_by_category'])
-        if rating_chart:
+        if charts.get('rating'):
             story.append(PageBreak())
             story.append(Paragraph("Average Rating by Category", self.styles['CustomHeading']))
-            story.append(rating_chart)
+            story.append(self._chart_image('rating', charts['rating']))
             story.append(Spacer(1, 20))
     
+    def render_charts(self, analytics: Dict[str, Any]) -> Dict[str, Optional[bytes]]:
+        """Render all charts as PNG bytes, reusing cached images for unchanged data
+        
+        Cache misses are rendered concurrently in worker processes.
+        """
+        charts = {}
+        pending = {}
+        for chart, (renderer, field, _, _) in CHART_SPECS.items():
+            key = ChartCache.make_key(chart, analytics[field])
+            png = self.chart_cache.get(key)
+            CACHE_REQUESTS.inc(cache='chart', result='miss' if png is None else 'hit')
+            if png is not None:
+                charts[chart] = png
+            else:
+                pending[chart] = (key, renderer, analytics[field])
+        
+        if not pending:
+            return charts
+        
+        start = time.perf_counter()
+        futures = {}
+        pool = self._get_chart_pool() if len(pending) > 1 else None
+        if pool is not None:
+            try:
+                futures = {chart: pool.submit(renderer, data) for chart, (_, renderer, data) in pending.items()}
+            except (BrokenProcessPool, RuntimeError):
+                self._reset_chart_pool()
+                futures = {}
+        
+        for chart, (key, renderer, data) in pending.items():
+            try:
+                try:
+                    png = futures[chart].result() if chart in futures else renderer(data)
+                except BrokenProcessPool:
+                    self._reset_chart_pool()
+                    png = renderer(data)
+                self.chart_cache.put(key, png)
+                charts[chart] = png
+            except Exception as e:
+                print(f"Error creating {chart} chart: {e}")
+                charts[chart] = None
+        
+        elapsed = time.perf_counter() - start
+        CHART_RENDER_SECONDS.observe(elapsed, mode='pool' if futures else 'serial')
+        record_phase('charts', elapsed)
+        return charts
+    
+    def _get_chart_pool(self) -> Optional[ProcessPoolExecutor]:
+        """Lazily start the chart rendering process pool"""
+        if self.chart_workers <= 0:
+            return None
+        with self._pool_lock:
+            if self._chart_pool is None:
+                self._chart_pool = ProcessPoolExecutor(max_workers=self.chart_workers)
+            return self._chart_pool
+    
+    def _reset_chart_pool(self):
+        """Drop a broken pool so the next render starts a fresh one"""
+        with self._pool_lock:
+            if self._chart_pool is not None:
+                self._chart_pool.shutdown(wait=False, cancel_futures=True)
+                self._chart_pool = None
+    
+    def close(self):
+        """Shut down chart worker processes"""
+        self._reset_chart_pool()
+    
+    def _chart_image(self, chart: str, png: bytes) -> Image:
+        """Wrap rendered PNG bytes in a ReportLab Image"""
+        width, height = CHART_SPECS[chart][2:]
+        return Image(io.BytesIO(png), width=width, height=height)
+    
     def _create_sentiment_pie_chart(self, sentiment_data: Dict[str, int]) -> Image:
         """Create sentiment distribution pie chart"""
-        try:
-            fig, ax = plt.subplots(figsize=(8, 6))
-            
-            labels = list(sentiment_data.keys())
-            sizes = list(sentiment_data.values())
-            colors_map = {
-                'Best': '#4caf50',
-                'Good': '#8bc34a',
-                'Average': '#ffc107',
-                'Fair': '#ff9800',
-                'Bad': '#f44336'
-            }
-            colors_list = [colors_map.get(label, '#9e9e9e') for label in labels]
-            
-            ax.pie(sizes, labels=labels, colors=colors_list, autopct='%1.1f%%',
-                   startangle=90, textprops={'fontsize': 10})
-            ax.axis('equal')
-            
-            # Save to bytes
-            img_buffer = io.BytesIO()
-            plt.savefig(img_buffer, format='png', dpi=150, bbox_inches='tight')
-            img_buffer.seek(0)
-            plt.close()
-            
-            # Create ReportLab Image
-            img = Image(img_buffer, width=5*inch, height=3.75*inch)
-            return img
-            
-        except Exception as e:
-            print(f"Error creating sentiment chart: {e}")
-            return None
+        return self._create_chart('sentiment', sentiment_data)
     
     def _create_category_bar_chart(self, category_data: Dict[str, int]) -> Image:
         """Create category distribution bar chart"""
-        try:
-            fig, ax = plt.subplots(figsize=(10, 6))
-            
-            categories = list(category_data.keys())
-            counts = list(category_data.values())
-            
-            bars = ax.barh(categories, counts, color='#3f51b5')
-            ax.set_xlabel('Number of Complaints', fontsize=11)
-            ax.set_title('Complaints Distribution by Category', fontsize=13, fontweight='bold')
-            
-            # Add value labels on bars
-            for i, bar in enumerate(bars):
-                width = bar.get_width()
-                ax.text(width, bar.get_y() + bar.get_height()/2, 
-                       f'{int(width)}', ha='left', va='center', fontsize=9)
-            
-            plt.tight_layout()
-            
-            # Save to bytes
-            img_buffer = io.BytesIO()
-            plt.savefig(img_buffer, format='png', dpi=150, bbox_inches='tight')
-            img_buffer.seek(0)
-            plt.close()
-            
-            # Create ReportLab Image
-            img = Image(img_buffer, width=6*inch, height=3.6*inch)
-            return img
-            
-        except Exception as e:
-            print(f"Error creating category chart: {e}")
-            return None
+        return self._create_chart('category', category_data)
     
     def _create_rating_bar_chart(self, rating_data: Dict[str, float]) -> Image:
         """Create rating by category bar chart"""
+        return self._create_chart('rating', rating_data)
+    
+    def _create_chart(self, chart: str, data: Dict[str, Any]) -> Image:
+        """Render a single chart in-process through the image cache"""
         try:
-            fig, ax = plt.subplots(figsize=(10, 6))
-            
-            categories = list(rating_data.keys())
-            ratings = list(rating_data.values())
-            
-            # Color bars based on rating
-            colors_list = ['#4caf50' if r >= 4 else '#ffc107' if r >= 3 else '#f44336' for r in ratings]
-            
-            bars = ax.barh(categories, ratings, color=colors_list)
-            ax.set_xlabel('Average Rating', fontsize=11)
-            ax.set_xlim(0, 5)
-            ax.set_title('Average Rating by Category', fontsize=13, fontweight='bold')
-            
-            # Add value labels on bars
-            for i, bar in enumerate(bars):
-                width = bar.get_width()
-                ax.text(width, bar.get_y() + bar.get_height()/2, 
-                       f'{width:.2f}', ha='left', va='center', fontsize=9)
-            
-            plt.tight_layout()
-            
-            # Save to bytes
-            img_buffer = io.BytesIO()
-            plt.savefig(img_buffer, format='png', dpi=150, bbox_inches='tight')
-            img_buffer.seek(0)
-            plt.close()
-            
-            # Create ReportLab Image
-            img = Image(img_buffer, width=6*inch, height=3.6*inch)
-            return img
+            key = ChartCache.make_key(chart, data)
+            png = self.chart_cache.get(key)
+            if png is None:
+                png = CHART_SPECS[chart][0](data)
+                self.chart_cache.put(key, png)
+            return self._chart_image(chart, png)
             
         except Exception as e:
-            print(f"Error creating rating chart: {e}")
-            return None
+            print(f"Error creating {chart} chart: {e}")
+            return None
\ No newline at end of file
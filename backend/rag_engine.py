@@ -3,6 +3,10 @@ from typing import List, Dict, Any
 import os
 from dotenv import load_dotenv
 
+from metrics import LLM_SECONDS, LLM_TOKENS, timed
+from olap_cube import correlation_matrix
+from sketches import priority_count
+
 load_dotenv()
 
 class RAGEngine:
@@ -46,28 +50,37 @@ class RAGEngine:
         
         try:
             # Call Groq API
-            chat_completion = self.client.chat.completions.create(
-                messages=[
-                    {
-                        "role": "system",
-                        "content": "You are an expert data analyst specializing in customer feedback analysis and CRM insights. Generate comprehensive, actionable reports with clear insights and recommendations."
-                    },
-                    {
-                        "role": "user",
-                        "content": prompt
-                    }
-                ],
-                model=self.model,
-                temperature=0.7,
-                max_tokens=3000
-            )
+            with timed(LLM_SECONDS, 'llm', operation='generate_report'):
+                chat_completion = self.client.chat.completions.create(
+                    messages=[
+                        {
+                            "role": "system",
+                            "content": "You are an expert data analyst specializing in customer feedback analysis and CRM insights. Generate comprehensive, actionable reports with clear insights and recommendations."
+                        },
+                        {
+                            "role": "user",
+                            "content": prompt
+                        }
+                    ],
+                    model=self.model,
+                    temperature=0.7,
+                    max_tokens=3000
+                )
             
+            self._record_usage('generate_report', chat_completion)
             report = chat_completion.choices[0].message.content
             return report
             
         except Exception as e:
             raise Exception(f"Error generating report with Groq: {str(e)}")
     
+    def _record_usage(self, operation: str, chat_completion):
+        """Count prompt and completion tokens reported by the API"""
+        usage = getattr(chat_completion, 'usage', None)
+        if usage is not None:
+            LLM_TOKENS.inc(usage.prompt_tokens or 0, operation=operation, kind='prompt')
+            LLM_TOKENS.inc(usage.completion_tokens or 0, operation=operation, kind='completion')
+    
     def _build_context(self, data_summary: str, analytics: Dict[str, Any]) -> str:
         """Build context from data and analytics"""
         context = f"""
@@ -85,11 +98,23 @@ Time Series Data:
 Latest complaints show activity from {analytics['time_series'][0]['date']} to {analytics['time_series'][-1]['date']}
 
 Priority Issues:
-{len(analytics['priority_issues'])} complaints require immediate attention (ratings 1-2)
+{priority_count(analytics)} complaints require immediate attention (ratings 1-2)
 
 Category-Sentiment Correlation:
-{self._format_correlation_data(analytics['category_sentiment_correlation'])}
+{self._format_correlation_data(analytics.get('category_sentiment_matrix') or correlation_matrix(analytics['category_sentiment_correlation']))}
 """
+        if analytics.get('alerts'):
+            context += "\nRecent Anomaly Alerts:\n" + "\n".join(
+                f"  - {alert['detected_at']}: {alert['message']}" for alert in analytics['alerts']
+            ) + "\n"
+        if analytics.get('clusters'):
+            context += "\nRecurring Complaints (near-duplicate clusters, with a representative complaint):\n" + "\n".join(
+                f"  - {cluster['size']} similar complaints [{cluster['representative']['category']}]: "
+                f"\"{' '.join(cluster['representative']['complaint_text'].split())[:200]}\""
+                for cluster in analytics['clusters']
+            ) + "\n"
+        if analytics.get('topics'):
+            context += f"\nDistinctive Terms (weighted log-odds against other groups, share of complaints):\n{self._format_topics(analytics['topics'])}\n"
         return context
     
     def _create_report_prompt(self, context: str) -> str:
@@ -136,14 +161,14 @@ Detailed analysis of complaint categories:
 Focus on high-priority problems:
 - List the number of critical complaints (rating 1-2)
 - Identify which categories have the most urgent issues
-- Provide 3-5 specific examples of critical complaints
+- Provide 3-5 specific examples of critical complaints, quoting representative complaints of recurring clusters where available
 - Highlight patterns in priority issues
 
 ## Trends and Patterns
 Analyze temporal and categorical patterns:
 - Discuss time-based trends in complaint volume
 - Identify correlations between categories and sentiments
-- Point out emerging issues or recurring themes
+- Point out emerging issues or recurring themes, grounded in the distinctive terms provided
 - Note any unusual patterns in the data
 
 ## Key Recommendations
@@ -182,23 +207,34 @@ Use clear, professional language and ensure all sections are well-formatted with
             formatted.append(f"  - {category}: {count} complaints (Avg Rating: {avg_rating})")
         return "\n".join(formatted)
     
-    def _format_correlation_data(self, correlation: List[Dict[str, Any]]) -> str:
-        """Format category-sentiment correlation"""
+    def _format_correlation_data(self, matrix: Dict[str, Any]) -> str:
+        """Format the category x sentiment matrix, one block per category"""
         formatted = []
-        current_category = None
-        
-        for item in sorted(correlation, key=lambda x: x['category']):
-            if item['category'] != current_category:
-                current_category = item['category']
-                formatted.append(f"\n  {current_category}:")
-            formatted.append(f"    - {item['sentiment']}: {item['count']}")
-        
+        for category, counts in zip(matrix['rows'], matrix['matrix']):
+            formatted.append(f"\n  {category}:")
+            formatted.extend(f"    - {sentiment}: {count}" for sentiment, count in zip(matrix['columns'], counts) if count)
+        return "\n".join(formatted)
+    
+    def _format_topics(self, topics: Dict[str, Dict[str, List[Dict[str, Any]]]]) -> str:
+        """Format top terms per category and sentiment"""
+        formatted = []
+        for dimension, groups in topics.items():
+            for group, terms in groups.items():
+                if terms:
+                    formatted.append(f"  - {dimension.title()} {group}: " + ", ".join(
+                        f"{term['term']} ({term['share']:.0%})" for term in terms
+                    ))
         return "\n".join(formatted)
     
     def generate_quick_insights(self, analytics: Dict[str, Any]) -> List[str]:
         """Generate quick insights from analytics"""
         insights = []
         
+        # Anomaly alerts come first: they are the most time-sensitive
+        for alert in analytics.get('alerts', [])[:3]:
+            icon = "🚨" if alert['type'] == 'volume_spike' else "📉"
+            insights.append(f"{icon} {alert['message']} ({alert['detected_at'][:16].replace('T', ' ')})")
+        
         # Sentiment insight
         sentiment_dist = analytics['sentiment_distribution']
         total_complaints = analytics['total_complaints']
@@ -207,9 +243,14 @@ Use clear, professional language and ensure all sections are well-formatted with
             insights.append(f"⚠️ High volume of negative feedback: {bad_complaints} complaints ({bad_complaints/total_complaints*100:.1f}%)")
         
         # Priority insight
-        priority_count = len(analytics['priority_issues'])
-        if priority_count > total_complaints * 0.2:
-            insights.append(f"🔴 {priority_count} high-priority issues need immediate attention")
+        priority_issues = priority_count(analytics)
+        if priority_issues > total_complaints * 0.2:
+            insights.append(f"🔴 {priority_issues} high-priority issues need immediate attention")
+        
+        # Recurring complaint insight
+        clusters = analytics.get('clusters')
+        if clusters:
+            insights.append(f"🔁 {clusters[0]['size']} near-identical complaints in {clusters[0]['representative']['category']}: \"{clusters[0]['representative']['complaint_text'][:80].strip()}...\"")
         
         # Category insight
         category_dist = analytics['category_distribution']
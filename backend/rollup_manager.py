@@ -0,0 +1,174 @@
+from mysql.connector import Error
+from datetime import date
+from typing import Dict, List, Any, Optional
+import argparse
+
+from db_config import DatabaseConfig
+from metrics import DB_QUERY_SECONDS, timed
+
+class RollupManager:
+    """Daily summary tables per category, sentiment and rating bucket
+    
+    Compacted days are served from `<source>_daily_rollup`; days after the
+    last compacted one are aggregated from raw rows, so rollups only need
+    compact() for closed days. Days are always taken from the database clock.
+    """
+    
+    def __init__(self, db_config: DatabaseConfig = None, source_table: str = 'complaints',
+                 timestamp_column: str = 'created_at'):
+        self.db_config = db_config or DatabaseConfig()
+        self.source_table = source_table
+        self.timestamp_column = timestamp_column
+        self.rollup_table = f'{source_table}_daily_rollup'
+    
+    def create_table(self):
+        """Create the rollup table for the source table (run once)"""
+        try:
+            connection = self.db_config.get_connection()
+            cursor = connection.cursor()
+            
+            cursor.execute(f"""
+                CREATE TABLE IF NOT EXISTS {self.rollup_table} (
+                    day DATE NOT NULL,
+                    category VARCHAR(100) NOT NULL DEFAULT '',
+                    sentiment VARCHAR(50) NOT NULL DEFAULT '',
+                    rating INT NOT NULL DEFAULT 0,
+                    complaint_count INT NOT NULL DEFAULT 0,
+                    confidence_count INT NOT NULL DEFAULT 0,
+                    confidence_sum DOUBLE NOT NULL DEFAULT 0,
+                    confidence_min DECIMAL(5,3),
+                    confidence_max DECIMAL(5,3),
+                    PRIMARY KEY (day, category, sentiment, rating)
+                )
+            """)
+            connection.commit()
+            
+            cursor.close()
+            connection.close()
+            
+            return {"message": f"Table {self.rollup_table} created successfully"}
+        
+        except Error as e:
+            raise Exception(f"Error creating rollup table: {str(e)}")
+    
+    def compact(self, since: date = None) -> Dict[str, Any]:
+        """Rebuild rollup rows for closed days from raw rows
+        
+        Idempotent: closed days from `since` are replaced in one transaction
+        with freshly aggregated values. Without `since`, every closed day after
+        the last compacted one is backfilled, so a missed nightly run is caught
+        up by the next one.
+        """
+        ts = self.timestamp_column
+        
+        try:
+            connection = self.db_config.get_connection()
+            cursor = connection.cursor(dictionary=True)
+            
+            if since is None:
+                since = self._first_open_day(cursor)
+            params = (since,) if since else ()
+            
+            cursor.execute(f"""
+                DELETE FROM {self.rollup_table}
+                WHERE day < CURDATE(){' AND day >= %s' if since else ''}
+            """, params)
+            cursor.execute(f"""
+                INSERT INTO {self.rollup_table}
+                    (day, category, sentiment, rating, complaint_count,
+                     confidence_count, confidence_sum, confidence_min, confidence_max)
+                SELECT DATE({ts}), COALESCE(category, ''), COALESCE(sentiment, ''), COALESCE(rating, 0),
+                       COUNT(*), COUNT(confidence), COALESCE(SUM(confidence), 0), MIN(confidence), MAX(confidence)
+                FROM {self.source_table}
+                WHERE {ts} < CURDATE(){f' AND {ts} >= %s' if since else ''}
+                GROUP BY DATE({ts}), COALESCE(category, ''), COALESCE(sentiment, ''), COALESCE(rating, 0)
+            """, params)
+            rows = cursor.rowcount
+            connection.commit()
+            
+            cursor.close()
+            connection.close()
+            
+            return {"message": f"Compacted {self.rollup_table} since {since or 'the first complaint'}", "rows": rows}
+        
+        except Error as e:
+            raise Exception(f"Error compacting rollups: {str(e)}")
+    
+    def _first_open_day(self, cursor) -> Optional[date]:
+        """Day after the last compacted one, or None when nothing was compacted yet"""
+        cursor.execute(f"SELECT MAX(day) + INTERVAL 1 DAY AS first_open_day FROM {self.rollup_table}")
+        return cursor.fetchone()['first_open_day']
+    
+    @timed(DB_QUERY_SECONDS, 'db', query='rollup_range')
+    def fetch_range(self, start_date: date = None, end_date: date = None) -> List[Dict[str, Any]]:
+        """Fetch (day, category, sentiment, rating) aggregates for a date range
+        
+        Compacted days come from the rollup table; the raw table is only
+        scanned from the first day not compacted yet, usually today's partial
+        day, and only when the range reaches it.
+        """
+        ts = self.timestamp_column
+        
+        try:
+            connection = self.db_config.get_connection()
+            cursor = connection.cursor(dictionary=True)
+            
+            first_open_day = self._first_open_day(cursor)
+            
+            conditions = []
+            params = []
+            if start_date:
+                conditions.append("day >= %s")
+                params.append(start_date)
+            if end_date:
+                conditions.append("day <= %s")
+                params.append(end_date)
+            
+            cursor.execute(f"""
+                SELECT day, category, sentiment, rating, complaint_count,
+                       confidence_count, confidence_sum, confidence_min, confidence_max
+                FROM {self.rollup_table}
+                {'WHERE ' + ' AND '.join(conditions) if conditions else ''}
+            """, tuple(params))
+            rows = cursor.fetchall()
+            
+            if (end_date is None or first_open_day is None or end_date >= first_open_day):
+                conditions = []
+                params = []
+                for bound, condition in ((first_open_day, f"{ts} >= %s"), (start_date, f"{ts} >= %s"),
+                                         (end_date, f"{ts} < %s + INTERVAL 1 DAY")):
+                    if bound:
+                        conditions.append(condition)
+                        params.append(bound)
+                cursor.execute(f"""
+                    SELECT DATE({ts}) AS day, COALESCE(category, '') AS category,
+                           COALESCE(sentiment, '') AS sentiment, COALESCE(rating, 0) AS rating,
+                           COUNT(*) AS complaint_count, COUNT(confidence) AS confidence_count,
+                           COALESCE(SUM(confidence), 0) AS confidence_sum,
+                           MIN(confidence) AS confidence_min, MAX(confidence) AS confidence_max
+                    FROM {self.source_table}
+                    {'WHERE ' + ' AND '.join(conditions) if conditions else ''}
+                    GROUP BY DATE({ts}), COALESCE(category, ''), COALESCE(sentiment, ''), COALESCE(rating, 0)
+                """, tuple(params))
+                rows.extend(cursor.fetchall())
+            
+            cursor.close()
+            connection.close()
+            
+            return rows
+        
+        except Error as e:
+            raise Exception(f"Error fetching rollups: {str(e)}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Maintain daily complaint rollup tables")
+    parser.add_argument('--create', action='store_true', help="create the rollup table")
+    parser.add_argument('--since', type=date.fromisoformat,
+                        help="rebuild closed days from this date (YYYY-MM-DD); default: every day not compacted yet")
+    args = parser.parse_args()
+    
+    manager = RollupManager()
+    if args.create:
+        print(manager.create_table()["message"])
+    print(manager.compact(args.since)["message"])
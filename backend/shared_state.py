@@ -0,0 +1,186 @@
+import os
+import shutil
+import hashlib
+import tempfile
+import threading
+from datetime import datetime
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import numpy as np
+import orjson
+
+from http_cache import json_default
+
+try:
+    import fcntl
+except ImportError:  # No flock on Windows: every process refreshes for itself
+    fcntl = None
+
+CURRENT_FILE = 'CURRENT'
+LOCK_FILE = 'refresher.lock'
+
+class SharedSnapshot:
+    """One published version: analytics JSON plus memory-mapped column arrays
+    
+    `derived` holds the published results of the incremental subsystems
+    (clusters, topics, cube labels, alerts) that only the leader maintains.
+    """
+    
+    def __init__(self, version: str, last_modified: datetime, analytics: Dict[str, Any],
+                 columns: Dict[str, np.ndarray], categories: Dict[str, list], derived: Dict[str, Any] = None):
+        self.version = version
+        self.last_modified = last_modified
+        self.analytics = analytics
+        self.columns = columns
+        self.categories = categories
+        self.derived = derived or {}
+
+class SharedAnalyticsStore:
+    """Publish analytics to a directory that all workers memory-map
+    
+    Each version lives in its own subdirectory; the CURRENT file names the
+    live one and is swapped with os.replace, so readers always see a complete
+    version. Column arrays are .npy files loaded with mmap_mode='r', so every
+    worker shares the same page-cache copy instead of a private DataFrame.
+    """
+    
+    def __init__(self, root_dir: str):
+        self.root_dir = root_dir
+        os.makedirs(root_dir, exist_ok=True)
+        self._current_stat = None
+        self._snapshot: Optional[SharedSnapshot] = None
+        self._lock = threading.Lock()
+    
+    def publish(self, version: str, last_modified: datetime, analytics: Dict[str, Any],
+                columns: Dict[str, np.ndarray], categories: Dict[str, list] = None, derived: Dict[str, Any] = None):
+        """Write a new version and atomically make it current"""
+        name = hashlib.sha1(version.encode('utf-8')).hexdigest()[:16]
+        target = os.path.join(self.root_dir, name)
+        
+        if not os.path.isdir(target):
+            staging = tempfile.mkdtemp(dir=self.root_dir, prefix='.staging-')
+            for column, values in columns.items():
+                np.save(os.path.join(staging, f'{column}.npy'), np.ascontiguousarray(values))
+            meta = {
+                'version': version,
+                'last_modified': last_modified.isoformat(),
+                'columns': list(columns),
+                'categories': categories or {},
+                'analytics': analytics,
+                'derived': derived or {}
+            }
+            with open(os.path.join(staging, 'meta.json'), 'wb') as f:
+                f.write(orjson.dumps(meta, default=json_default, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY))
+            os.rename(staging, target)
+        
+        previous = self._current_name()
+        fd, tmp_path = tempfile.mkstemp(dir=self.root_dir, prefix='.current-')
+        with os.fdopen(fd, 'w') as f:
+            f.write(name)
+        os.replace(tmp_path, os.path.join(self.root_dir, CURRENT_FILE))
+        # Keep the previous version for readers that are still loading it
+        self._remove_old_versions(keep={name, previous})
+    
+    def current(self) -> Optional[SharedSnapshot]:
+        """Return the live snapshot, reloading only when CURRENT has changed"""
+        current_path = os.path.join(self.root_dir, CURRENT_FILE)
+        try:
+            stat = os.stat(current_path)
+        except FileNotFoundError:
+            return None
+        
+        key = (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+        with self._lock:
+            if key != self._current_stat:
+                self._snapshot = self._load(self._current_name())
+                self._current_stat = key
+            return self._snapshot
+    
+    def _current_name(self) -> Optional[str]:
+        try:
+            with open(os.path.join(self.root_dir, CURRENT_FILE)) as f:
+                return f.read().strip()
+        except FileNotFoundError:
+            return None
+    
+    def _load(self, name: str) -> Optional[SharedSnapshot]:
+        directory = os.path.join(self.root_dir, name)
+        try:
+            with open(os.path.join(directory, 'meta.json'), 'rb') as f:
+                meta = orjson.loads(f.read())
+            columns = {
+                column: np.load(os.path.join(directory, f'{column}.npy'), mmap_mode='r')
+                for column in meta['columns']
+            }
+        except FileNotFoundError:
+            # Version was replaced while loading; the next call picks up the new one
+            return self._snapshot
+        
+        return SharedSnapshot(meta['version'], datetime.fromisoformat(meta['last_modified']),
+                              meta['analytics'], columns, meta['categories'], meta.get('derived'))
+    
+    def _remove_old_versions(self, keep: set):
+        # Open mmaps of removed files stay valid until the readers drop them
+        for entry in os.scandir(self.root_dir):
+            if entry.is_dir() and not entry.name.startswith('.') and entry.name not in keep:
+                shutil.rmtree(entry.path, ignore_errors=True)
+
+class SharedStateRefresher:
+    """Single-writer loop that republishes analytics when the source changes
+    
+    Every worker runs this thread, but only the holder of an exclusive flock on
+    the store's lock file does any work; if that process dies the lock is
+    released and another worker takes over on its next tick.
+    """
+    
+    def __init__(self, store: SharedAnalyticsStore, get_version: Callable[[], Tuple[str, datetime]],
+                 build: Callable[[], Tuple[Dict[str, Any], Dict[str, np.ndarray], Dict[str, list], Dict[str, Any]]],
+                 interval: float = 2.0):
+        self.store = store
+        self.get_version = get_version
+        self.build = build
+        self.interval = interval
+        self._lock_file = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='shared-state-refresher', daemon=True)
+    
+    def start(self):
+        self._thread.start()
+    
+    def stop(self):
+        self._stop.set()
+    
+    @property
+    def is_leader(self) -> bool:
+        # Without flock every process publishes for itself
+        return self._lock_file is not None or fcntl is None
+    
+    def refresh_once(self):
+        """Publish a new version if the source data has changed"""
+        version, last_modified = self.get_version()
+        snapshot = self.store.current()
+        if snapshot is not None and snapshot.version == version:
+            return
+        analytics, columns, categories, derived = self.build()
+        self.store.publish(version, last_modified, analytics, columns, categories, derived)
+    
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                if self._try_acquire():
+                    self.refresh_once()
+            except Exception as e:
+                print(f"Shared state refresh failed: {e}")
+            self._stop.wait(self.interval)
+    
+    def _try_acquire(self) -> bool:
+        if self._lock_file is not None or fcntl is None:
+            return True
+        lock_file = open(os.path.join(self.store.root_dir, LOCK_FILE), 'a')
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        self._lock_file = lock_file
+        return True
@@ -0,0 +1,528 @@
+"""Mergeable streaming sketches for approximate analytics
+
+All sketches can be updated in batches, merged with a sketch of the same
+configuration built over another partition or worker, and serialized to a
+JSON-compatible state. Error bounds follow the usual published guarantees.
+"""
+import os
+import math
+import argparse
+import tempfile
+from collections import deque
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import orjson
+import pandas as pd
+
+from http_cache import json_default
+
+def hash64(values, categorize: bool = True) -> np.ndarray:
+    """Deterministic 64-bit hashes, stable across processes and runs
+    
+    categorize hashes each distinct value once, which pays off for
+    low-cardinality keys but not for mostly-unique ones such as texts.
+    """
+    values = pd.Series(values, dtype=object).astype(str).to_numpy(dtype=object)
+    return pd.util.hash_array(values, categorize=categorize)
+
+class KLLSketch:
+    """KLL quantile sketch (Karnin, Lang, Liberty 2016)
+    
+    Keeps O(k log(n/k)) items; the normalized rank error of a quantile query
+    is about 2.3/k^0.97 (≈1.3% for k=200) with high probability.
+    """
+    
+    def __init__(self, k: int = 200, seed: int = None):
+        self.k = k
+        self.n = 0
+        self.min = None
+        self.max = None
+        self.levels: List[np.ndarray] = [np.empty(0)]
+        self._rng = np.random.default_rng(seed)
+    
+    @property
+    def rank_error(self) -> float:
+        return 2.296 / self.k ** 0.9723
+    
+    def update(self, values):
+        values = np.asarray(values, dtype='float64')
+        values = values[~np.isnan(values)]
+        if not len(values):
+            return
+        self.n += len(values)
+        self.min = float(values.min()) if self.min is None else min(self.min, float(values.min()))
+        self.max = float(values.max()) if self.max is None else max(self.max, float(values.max()))
+        self.levels[0] = np.concatenate([self.levels[0], values])
+        self._compress()
+    
+    def merge(self, other: 'KLLSketch'):
+        if other.n == 0:
+            return
+        while len(self.levels) < len(other.levels):
+            self.levels.append(np.empty(0))
+        for level, items in enumerate(other.levels):
+            self.levels[level] = np.concatenate([self.levels[level], items])
+        self.n += other.n
+        self.min = other.min if self.min is None else min(self.min, other.min)
+        self.max = other.max if self.max is None else max(self.max, other.max)
+        self._compress()
+    
+    def _capacity(self, level: int) -> int:
+        depth = len(self.levels) - level - 1
+        return max(2, int(math.ceil(self.k * (2 / 3) ** depth)))
+    
+    def _compress(self):
+        # Compacting a level halves it into the next; repeat until all fit,
+        # since adding a level lowers the capacity of the ones below it
+        while True:
+            level = next((h for h in range(len(self.levels)) if len(self.levels[h]) > self._capacity(h)), None)
+            if level is None:
+                return
+            if level + 1 == len(self.levels):
+                self.levels.append(np.empty(0))
+            items = np.sort(self.levels[level])
+            leftover = items[-1:] if len(items) % 2 else items[:0]
+            items = items[:len(items) - len(leftover)]
+            promoted = items[self._rng.integers(2)::2]
+            self.levels[level] = leftover
+            self.levels[level + 1] = np.concatenate([self.levels[level + 1], promoted])
+    
+    def quantiles(self, qs: List[float]) -> List[Optional[float]]:
+        if self.n == 0:
+            return [None] * len(qs)
+        items = np.concatenate(self.levels)
+        weights = np.concatenate([np.full(len(items), 2 ** level) for level, items in enumerate(self.levels)])
+        order = np.argsort(items, kind='stable')
+        items, cumulative = items[order], np.cumsum(weights[order])
+        results = []
+        for q in qs:
+            if q <= 0:
+                results.append(self.min)
+            elif q >= 1:
+                results.append(self.max)
+            else:
+                index = int(np.searchsorted(cumulative, q * cumulative[-1]))
+                results.append(float(items[min(index, len(items) - 1)]))
+        return results
+    
+    def quantile(self, q: float) -> Optional[float]:
+        return self.quantiles([q])[0]
+    
+    def to_state(self) -> Dict[str, Any]:
+        return {'k': self.k, 'n': self.n, 'min': self.min, 'max': self.max,
+                'levels': [items.tolist() for items in self.levels]}
+    
+    @classmethod
+    def from_state(cls, state: Dict[str, Any]) -> 'KLLSketch':
+        sketch = cls(state['k'])
+        sketch.n, sketch.min, sketch.max = state['n'], state['min'], state['max']
+        sketch.levels = [np.asarray(items, dtype='float64') for items in state['levels']] or [np.empty(0)]
+        return sketch
+
+class CountMinSketch:
+    """Count-Min sketch (Cormode, Muthukrishnan 2005)
+    
+    Point estimates never undercount and overcount by at most e/width * N
+    with probability 1 - e^-depth.
+    """
+    
+    def __init__(self, width: int = 2048, depth: int = 4):
+        self.width = width
+        self.depth = depth
+        self.total = 0
+        self.table = np.zeros((depth, width), dtype='int64')
+    
+    @property
+    def epsilon(self) -> float:
+        return math.e / self.width
+    
+    @property
+    def confidence(self) -> float:
+        return 1 - math.exp(-self.depth)
+    
+    def _indexes(self, hashes: np.ndarray) -> np.ndarray:
+        # Double hashing: row i uses h1 + i * h2
+        h1 = hashes & np.uint64(0xFFFFFFFF)
+        h2 = hashes >> np.uint64(32)
+        rows = np.arange(self.depth, dtype='uint64')[:, None]
+        return ((h1[None, :] + rows * h2[None, :]) % np.uint64(self.width)).astype('int64')
+    
+    def update(self, keys, weights=None):
+        hashes = hash64(keys)
+        weights = np.ones(len(hashes), dtype='int64') if weights is None else np.asarray(weights, dtype='int64')
+        for row, indexes in enumerate(self._indexes(hashes)):
+            np.add.at(self.table[row], indexes, weights)
+        self.total += int(weights.sum())
+    
+    def estimate(self, keys) -> np.ndarray:
+        indexes = self._indexes(hash64(keys))
+        return np.min(self.table[np.arange(self.depth)[:, None], indexes], axis=0)
+    
+    def merge(self, other: 'CountMinSketch'):
+        if (self.width, self.depth) != (other.width, other.depth):
+            raise ValueError("Count-Min sketches must have the same width and depth to merge")
+        self.table += other.table
+        self.total += other.total
+    
+    def to_state(self) -> Dict[str, Any]:
+        return {'width': self.width, 'depth': self.depth, 'total': self.total, 'table': self.table}
+    
+    @classmethod
+    def from_state(cls, state: Dict[str, Any]) -> 'CountMinSketch':
+        sketch = cls(state['width'], state['depth'])
+        sketch.total = state['total']
+        sketch.table = np.asarray(state['table'], dtype='int64').reshape(sketch.depth, sketch.width)
+        return sketch
+
+class SpaceSaving:
+    """Space-Saving heavy hitters (Metwally et al. 2005), weighted and mergeable
+    
+    Tracks at most `capacity` items. Each count overestimates the true count
+    by at most its `error`, itself at most N/capacity. Items can carry a value
+    sum (e.g. ratings) observed while they were tracked.
+    """
+    
+    def __init__(self, capacity: int = 256):
+        self.capacity = capacity
+        self.total = 0
+        # item -> [count, error, value_sum, value_count]
+        self.counters: Dict[str, list] = {}
+    
+    @property
+    def max_error(self) -> int:
+        return self.total // self.capacity if len(self.counters) >= self.capacity else 0
+    
+    def update(self, counts: Dict[str, int], sums: Dict[str, float] = None,
+               value_counts: Dict[str, int] = None):
+        """Add per-item counts (and optional value sums) from one batch
+        
+        value_counts is how many of each item's rows had a value; it defaults
+        to the item count, i.e. every row contributed to the sum.
+        """
+        sums = sums or {}
+        value_counts = counts if value_counts is None else value_counts
+        for item, count in counts.items():
+            self.total += int(count)
+            valued = int(value_counts.get(item, 0))
+            counter = self.counters.get(item)
+            if counter is not None:
+                counter[0] += int(count)
+                counter[2] += float(sums.get(item, 0))
+                counter[3] += valued
+            elif len(self.counters) < self.capacity:
+                self.counters[item] = [int(count), 0, float(sums.get(item, 0)), valued]
+            else:
+                # Replace the smallest counter; the newcomer inherits its count as error
+                victim = min(self.counters, key=lambda key: self.counters[key][0])
+                floor = self.counters.pop(victim)[0]
+                self.counters[item] = [floor + int(count), floor, float(sums.get(item, 0)), valued]
+    
+    def merge(self, other: 'SpaceSaving'):
+        # Items missing from a full summary may have counts up to its minimum
+        floor_self = min((c[0] for c in self.counters.values()), default=0) if len(self.counters) >= self.capacity else 0
+        floor_other = min((c[0] for c in other.counters.values()), default=0) if len(other.counters) >= other.capacity else 0
+        merged = {}
+        for item in set(self.counters) | set(other.counters):
+            a = self.counters.get(item, [floor_self, floor_self, 0.0, 0])
+            b = other.counters.get(item, [floor_other, floor_other, 0.0, 0])
+            merged[item] = [a[0] + b[0], a[1] + b[1], a[2] + b[2], a[3] + b[3]]
+        top = sorted(merged.items(), key=lambda entry: entry[1][0], reverse=True)[:self.capacity]
+        self.counters = dict(top)
+        self.total += other.total
+    
+    def top(self, n: int = None) -> List[tuple]:
+        """(item, count, error, mean value) by descending count"""
+        ranked = sorted(self.counters.items(), key=lambda entry: entry[1][0], reverse=True)[:n]
+        return [(item, c[0], c[1], c[2] / c[3] if c[3] else None) for item, c in ranked]
+    
+    def to_state(self) -> Dict[str, Any]:
+        return {'capacity': self.capacity, 'total': self.total, 'counters': self.counters}
+    
+    @classmethod
+    def from_state(cls, state: Dict[str, Any]) -> 'SpaceSaving':
+        sketch = cls(state['capacity'])
+        sketch.total = state['total']
+        sketch.counters = {item: list(counter) for item, counter in state['counters'].items()}
+        return sketch
+
+class HyperLogLog:
+    """HyperLogLog distinct counter (Flajolet et al. 2007) over 64-bit hashes
+    
+    Relative standard error is 1.04/sqrt(2^precision), ≈0.81% at 14.
+    """
+    
+    def __init__(self, precision: int = 14):
+        if not 12 <= precision <= 18:
+            raise ValueError("HyperLogLog precision must be between 12 and 18")
+        self.precision = precision
+        self.registers = np.zeros(1 << precision, dtype='uint8')
+    
+    @property
+    def relative_error(self) -> float:
+        return 1.04 / math.sqrt(len(self.registers))
+    
+    def update(self, values):
+        hashes = hash64(values, categorize=False)
+        if not len(hashes):
+            return
+        bits = 64 - self.precision
+        index = (hashes >> np.uint64(bits)).astype('int64')
+        remainder = hashes & np.uint64((1 << bits) - 1)
+        # At most 52 bits remain, so float64 conversion is exact
+        bit_length = np.frexp(remainder.astype('float64'))[1]
+        rank = (bits - bit_length + 1).astype('uint8')
+        np.maximum.at(self.registers, index, rank)
+    
+    def estimate(self) -> int:
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        raw = alpha * m * m / np.sum(np.ldexp(1.0, -self.registers.astype('int64')))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if raw <= 2.5 * m and zeros:
+            return int(round(m * math.log(m / zeros)))
+        return int(round(raw))
+    
+    def merge(self, other: 'HyperLogLog'):
+        if self.precision != other.precision:
+            raise ValueError("HyperLogLog sketches must have the same precision to merge")
+        np.maximum(self.registers, other.registers, out=self.registers)
+    
+    def to_state(self) -> Dict[str, Any]:
+        return {'precision': self.precision, 'registers': self.registers}
+    
+    @classmethod
+    def from_state(cls, state: Dict[str, Any]) -> 'HyperLogLog':
+        sketch = cls(state['precision'])
+        sketch.registers = np.asarray(state['registers'], dtype='uint8')
+        return sketch
+
+# Optional identity columns counted with HyperLogLog when present
+DISTINCT_COLUMNS = ('complaint_text', 'customer_id', 'product')
+
+class ComplaintSketches:
+    """Sketch summary of the complaint stream, in the shape of get_all_analytics
+    
+    Low-cardinality counts (sentiment, rating, day) stay exact; quantiles,
+    top categories, category×sentiment counts and distinct counts come from
+    sketches. Rows are folded in incrementally and tracked by a high-water
+    id, so each refresh only ingests rows added since the last one.
+    """
+    
+    def __init__(self, k: int = 200, top_categories: int = 256, cms_width: int = 2048,
+                 cms_depth: int = 4, hll_precision: int = 14, priority_sample: int = 500,
+                 rating_threshold: int = 2):
+        self.rating_threshold = rating_threshold
+        self.rows = 0
+        self.last_id = 0
+        self.confidence = KLLSketch(k)
+        self.confidence_sum = 0.0
+        self.rating = KLLSketch(k)
+        self.categories = SpaceSaving(top_categories)
+        self.category_sentiment = CountMinSketch(cms_width, cms_depth)
+        self.sentiments: Dict[str, int] = {}
+        self.days: Dict[str, int] = {}
+        self.distinct: Dict[str, HyperLogLog] = {}
+        self.hll_precision = hll_precision
+        self.priority_count = 0
+        self.priority_recent = deque(maxlen=priority_sample)
+        # Opaque fingerprint of the source these sketches cover, set by the caller
+        self.source: Optional[Dict[str, Any]] = None
+    
+    def ingest(self, frame: pd.DataFrame):
+        """Fold one chunk of complaint rows into the sketches"""
+        if 'id' in frame:
+            frame = frame[frame['id'] > self.last_id]
+        if frame.empty:
+            return
+        self.rows += len(frame)
+        if 'id' in frame:
+            self.last_id = int(frame['id'].max())
+        
+        confidence = pd.to_numeric(frame['confidence'], errors='coerce')
+        self.confidence.update(confidence.to_numpy())
+        self.confidence_sum += float(confidence.sum())
+        ratings = pd.to_numeric(frame['rating'], errors='coerce')
+        self.rating.update(ratings.to_numpy())
+        
+        # Mean ratings only count rows that have a rating, like the exact groupby mean
+        categories = frame['category'].astype(str)
+        rated = ratings.groupby(categories)
+        self.categories.update(categories.value_counts().to_dict(), rated.sum().to_dict(), rated.count().to_dict())
+        self.category_sentiment.update((categories + '\x1f' + frame['sentiment'].astype(str)).to_numpy())
+        self._add_counts(self.sentiments, frame['sentiment'].astype(str).value_counts())
+        days = pd.to_datetime(frame['created_at'], errors='coerce').dt.date.dropna().astype(str)
+        self._add_counts(self.days, days.value_counts())
+        
+        for column in DISTINCT_COLUMNS:
+            if column in frame:
+                self.distinct.setdefault(column, HyperLogLog(self.hll_precision)).update(frame[column].dropna().to_numpy())
+        
+        priority = frame[frame['rating'] <= self.rating_threshold]
+        self.priority_count += len(priority)
+        columns = [c for c in ('id', 'complaint_text', 'category', 'sentiment', 'rating') if c in priority]
+        self.priority_recent.extend(priority[columns].to_dict('records'))
+    
+    def _add_counts(self, target: Dict[str, int], counts: pd.Series):
+        for key, count in counts.items():
+            target[key] = target.get(key, 0) + int(count)
+    
+    def merge(self, other: 'ComplaintSketches'):
+        """Merge a summary built over another partition of the data"""
+        self.rows += other.rows
+        self.last_id = max(self.last_id, other.last_id)
+        self.confidence.merge(other.confidence)
+        self.confidence_sum += other.confidence_sum
+        self.rating.merge(other.rating)
+        self.categories.merge(other.categories)
+        self.category_sentiment.merge(other.category_sentiment)
+        for target, source in ((self.sentiments, other.sentiments), (self.days, other.days)):
+            for key, count in source.items():
+                target[key] = target.get(key, 0) + count
+        for column, sketch in other.distinct.items():
+            if column in self.distinct:
+                self.distinct[column].merge(sketch)
+            else:
+                self.distinct[column] = HyperLogLog.from_state(sketch.to_state())
+        self.priority_count += other.priority_count
+        self.priority_recent.extend(other.priority_recent)
+    
+    def to_analytics(self) -> Dict[str, Any]:
+        """Build analytics in the get_all_analytics shape, plus error bounds"""
+        top = self.categories.top()
+        sentiments = sorted(self.sentiments)
+        pairs = [(category, sentiment) for category, _, _, _ in top for sentiment in sentiments]
+        pair_counts = self.category_sentiment.estimate([f"{c}\x1f{s}" for c, s in pairs]) if pairs else []
+        confidence_median, confidence_p90, confidence_p99 = self.confidence.quantiles([0.5, 0.9, 0.99])
+        rating_quantiles = self.rating.quantiles([0.1, 0.25, 0.5, 0.75, 0.9])
+        
+        return {
+            'sentiment_distribution': dict(sorted(self.sentiments.items(), key=lambda item: item[1], reverse=True)),
+            'category_distribution': {category: count for category, count, _, _ in top},
+            'rating_by_category': {category: round(mean, 2) for category, _, _, mean in top if mean is not None},
+            'priority_issues': list(self.priority_recent),
+            'time_series': [{'date': day, 'count': count} for day, count in sorted(self.days.items())],
+            'confidence_stats': {
+                'mean': round(self.confidence_sum / self.confidence.n, 3) if self.confidence.n else None,
+                'median': _round(confidence_median),
+                'min': _round(self.confidence.min),
+                'max': _round(self.confidence.max)
+            },
+            'category_sentiment_correlation': [
+                {'category': category, 'sentiment': sentiment, 'count': int(count)}
+                for (category, sentiment), count in zip(pairs, pair_counts) if count
+            ],
+            'total_complaints': self.rows,
+            'approximation': {
+                'mode': 'approximate',
+                'rows_ingested': self.rows,
+                'confidence_quantiles': {
+                    'p50': _round(confidence_median), 'p90': _round(confidence_p90), 'p99': _round(confidence_p99),
+                    'rank_error': round(self.confidence.rank_error, 4)
+                },
+                'rating_quantiles': {
+                    **{f'p{int(q * 100)}': value for q, value in zip((0.1, 0.25, 0.5, 0.75, 0.9), rating_quantiles)},
+                    'rank_error': round(self.rating.rank_error, 4)
+                },
+                'category_distribution': {
+                    'max_overcount': self.categories.max_error,
+                    'exact': self.categories.max_error == 0
+                },
+                'category_sentiment_correlation': {
+                    'max_overcount': int(math.ceil(self.category_sentiment.epsilon * self.category_sentiment.total)),
+                    'confidence': round(self.category_sentiment.confidence, 4)
+                },
+                'distinct_counts': {
+                    column: {'estimate': sketch.estimate(), 'relative_error': round(sketch.relative_error, 4)}
+                    for column, sketch in self.distinct.items()
+                },
+                'priority_issues': {'total': self.priority_count, 'returned': len(self.priority_recent)}
+            }
+        }
+    
+    def to_state(self) -> Dict[str, Any]:
+        return {
+            'saved_at': datetime.now().isoformat(),
+            'rating_threshold': self.rating_threshold,
+            'rows': self.rows,
+            'last_id': self.last_id,
+            'confidence': self.confidence.to_state(),
+            'confidence_sum': self.confidence_sum,
+            'rating': self.rating.to_state(),
+            'categories': self.categories.to_state(),
+            'category_sentiment': self.category_sentiment.to_state(),
+            'sentiments': self.sentiments,
+            'days': self.days,
+            'hll_precision': self.hll_precision,
+            'distinct': {column: sketch.to_state() for column, sketch in self.distinct.items()},
+            'priority_count': self.priority_count,
+            'priority_sample': self.priority_recent.maxlen,
+            'priority_recent': list(self.priority_recent),
+            'source': self.source
+        }
+    
+    @classmethod
+    def from_state(cls, state: Dict[str, Any]) -> 'ComplaintSketches':
+        sketches = cls(hll_precision=state['hll_precision'], priority_sample=state['priority_sample'],
+                       rating_threshold=state['rating_threshold'])
+        sketches.rows = state['rows']
+        sketches.last_id = state['last_id']
+        sketches.confidence = KLLSketch.from_state(state['confidence'])
+        sketches.confidence_sum = state['confidence_sum']
+        sketches.rating = KLLSketch.from_state(state['rating'])
+        sketches.categories = SpaceSaving.from_state(state['categories'])
+        sketches.category_sentiment = CountMinSketch.from_state(state['category_sentiment'])
+        sketches.sentiments = state['sentiments']
+        sketches.days = state['days']
+        sketches.distinct = {column: HyperLogLog.from_state(s) for column, s in state['distinct'].items()}
+        sketches.priority_count = state['priority_count']
+        sketches.priority_recent.extend(state['priority_recent'])
+        sketches.source = state.get('source')
+        return sketches
+    
+    def save(self, path: str):
+        """Persist atomically, so readers never see a partial file"""
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.sketches-')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(orjson.dumps(self.to_state(), default=json_default,
+                                 option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS))
+        os.replace(tmp_path, path)
+    
+    @classmethod
+    def load(cls, path: str) -> 'ComplaintSketches':
+        with open(path, 'rb') as f:
+            return cls.from_state(orjson.loads(f.read()))
+
+def priority_count(analytics: Dict[str, Any]) -> int:
+    """Number of priority issues; approximate analytics only return the most recent ones"""
+    total = analytics.get('approximation', {}).get('priority_issues', {}).get('total')
+    return len(analytics['priority_issues']) if total is None else total
+
+def _round(value, digits: int = 3):
+    return None if value is None else round(value, digits)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build or merge complaint sketches")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    build = subparsers.add_parser('build', help="sketch a CSV partition")
+    build.add_argument('csv')
+    build.add_argument('output')
+    build.add_argument('--chunksize', type=int, default=100_000)
+    merge = subparsers.add_parser('merge', help="merge sketch files from several partitions")
+    merge.add_argument('output')
+    merge.add_argument('inputs', nargs='+')
+    args = parser.parse_args()
+    
+    if args.command == 'build':
+        result = ComplaintSketches()
+        for chunk in pd.read_csv(args.csv, chunksize=args.chunksize):
+            result.ingest(chunk)
+    else:
+        result = ComplaintSketches.load(args.inputs[0])
+        for path in args.inputs[1:]:
+            result.merge(ComplaintSketches.load(path))
+    result.save(args.output)
+    print(f"Wrote sketches over {result.rows} rows to {args.output}")
@@ -0,0 +1,27 @@
+import os
+import sys
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from complaint_clusters import ComplaintClusterer
+
+SOURCE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'Data_source.csv')
+
+def test_texts_are_kept_for_clusters_and_recent_complaints_only():
+    frame = pd.read_csv(SOURCE)
+    clusterer = ComplaintClusterer(recent_snippets=10)
+    clusterer.add(frame)
+    assert len(clusterer._recent_snippets) == 10
+    
+    # A repeat of a complaint whose text was let go represents its cluster
+    _, sizes = clusterer.lookup(frame['id'])
+    original = frame[sizes == 1].iloc[[0]]
+    repeat = original.assign(id=frame['id'].max() + 1)
+    clusterer.add(repeat)
+    cluster = next(c for c in clusterer.clusters(limit=None) if c['cluster_id'] == int(original['id'].iloc[0]))
+    assert cluster['size'] == 2
+    assert cluster['representative']['id'] == int(repeat['id'].iloc[0])
+    assert cluster['representative']['complaint_text'] == repeat['complaint_text'].iloc[0][:240]
+    assert len(clusterer.snippets) == len(clusterer.clusters(limit=None))
@@ -0,0 +1,78 @@
+import os
+import sys
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from data_processor import DataProcessor
+
+SOURCE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'Data_source.csv')
+
+def _write(frame: pd.DataFrame, path: str, mtime: int):
+    frame.to_csv(path, index=False)
+    # Distinct mtimes, so every rewrite is a new data version
+    os.utime(path, ns=(mtime, mtime))
+
+def _cube_categories(processor: DataProcessor) -> dict:
+    cube = processor.get_cube('category', None)
+    return dict(zip(cube['rows'], cube['counts']))
+
+def test_cube_follows_in_place_edits_and_deletes(tmp_path):
+    path = str(tmp_path / 'complaints.csv')
+    frame = pd.read_csv(SOURCE)
+    _write(frame, path, 1_000_000_000_000_000_000)
+    processor = DataProcessor(path)
+    assert _cube_categories(processor) == processor.get_category_distribution()
+    
+    # Move every complaint of one category to another, keeping the file size
+    category, target = frame['category'].value_counts().index[-1], frame['category'].value_counts().index[0]
+    edited = frame.copy()
+    edited.loc[edited['category'] == category, 'category'] = target
+    _write(edited, path, 1_000_000_000_000_000_001)
+    assert category not in processor.get_category_distribution()
+    assert _cube_categories(processor) == processor.get_category_distribution()
+    
+    # Deleting rows rebuilds as well
+    _write(edited.iloc[10:], path, 1_000_000_000_000_000_002)
+    assert _cube_categories(processor) == processor.get_category_distribution()
+    assert processor.get_cube('category', None)['total'] == len(edited) - 10
+
+def test_appends_are_ingested_incrementally(tmp_path):
+    path = str(tmp_path / 'complaints.csv')
+    frame = pd.read_csv(SOURCE)
+    _write(frame.iloc[:60], path, 1_000_000_000_000_000_000)
+    processor = DataProcessor(path)
+    cube = processor.update_cube()
+    
+    _write(frame, path, 1_000_000_000_000_000_001)
+    assert processor.update_cube() is cube
+    assert _cube_categories(processor) == processor.get_category_distribution()
+
+def test_clusters_forget_deleted_complaints(tmp_path):
+    path = str(tmp_path / 'complaints.csv')
+    frame = pd.read_csv(SOURCE)
+    duplicate = frame.iloc[[0]].assign(id=frame['id'].max() + 1)
+    _write(pd.concat([frame, duplicate]), path, 1_000_000_000_000_000_000)
+    processor = DataProcessor(path)
+    assert processor.get_clusters()['summary']['duplicates'] >= 1
+    
+    _write(frame, path, 1_000_000_000_000_000_001)
+    assert processor.get_clusters()['summary']['complaints'] == len(frame)
+
+def test_persisted_sketches_resume_and_rebuild_on_edits(tmp_path, monkeypatch):
+    path = str(tmp_path / 'complaints.csv')
+    frame = pd.read_csv(SOURCE)
+    _write(frame, path, 1_000_000_000_000_000_000)
+    monkeypatch.setenv('SKETCH_PATH', str(tmp_path / 'sketches.json'))
+    assert DataProcessor(path, approximate=True).update_sketches().rows == len(frame)
+    
+    # A restart on an unchanged source resumes without reading it
+    processor = DataProcessor(path, approximate=True)
+    processor.iter_complaint_chunks = None
+    assert processor.update_sketches().rows == len(frame)
+    
+    _write(frame.iloc[10:], path, 1_000_000_000_000_000_001)
+    sketches = DataProcessor(path, approximate=True).update_sketches()
+    assert sketches.rows == len(frame) - 10
+    assert sum(sketches.sentiments.values()) == len(frame) - 10
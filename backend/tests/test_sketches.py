@@ -0,0 +1,27 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sketches import ComplaintSketches, priority_count
+
+SOURCE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'Data_source.csv')
+
+def test_rating_means_skip_unrated_rows():
+    frame = pd.read_csv(SOURCE)
+    frame.loc[::3, 'rating'] = np.nan
+    sketches = ComplaintSketches()
+    sketches.ingest(frame)
+    expected = frame.groupby('category')['rating'].mean().dropna().round(2).to_dict()
+    assert sketches.to_analytics()['rating_by_category'] == expected
+
+def test_priority_count_covers_issues_beyond_the_sample():
+    frame = pd.read_csv(SOURCE)
+    sketches = ComplaintSketches(priority_sample=5)
+    sketches.ingest(frame)
+    analytics = sketches.to_analytics()
+    assert len(analytics['priority_issues']) == 5
+    assert priority_count(analytics) == int((frame['rating'] <= 2).sum())
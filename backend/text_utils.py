@@ -0,0 +1,25 @@
+import re
+from typing import List
+
+_URL = re.compile(r"http\S+|www\S+")
+_NON_LETTERS = re.compile(r"[^a-zA-Z\s]")
+
+# Common English words that carry no topic on their own
+STOPWORDS = frozenset("""
+a about above after again against all am an and any are as at be because been before being below between
+both but by can cannot could did do does doing dont down during each few for from further get got had has
+have having he her here hers herself him himself his how i id if im in into is isnt it its itself ive just
+me more most my myself no nor not now of off on once only or other our ours ourselves out over own same she
+should so some such than that the their theirs them themselves then there these they this those through to
+too under until up very was wasnt we were what when where which while who whom why will with would you your
+yours yourself yourselves also even still one two back really like since ever never us wont cant didnt
+""".split())
+
+def normalize_text(text: str) -> str:
+    """Same cleaning as the classification pipeline: lowercase, no URLs or punctuation"""
+    text = _URL.sub("", str(text).lower())
+    return ' '.join(_NON_LETTERS.sub("", text).split())
+
+def tokenize(text: str) -> List[str]:
+    """Normalized words of a text"""
+    return normalize_text(text).split()
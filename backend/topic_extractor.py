@@ -0,0 +1,146 @@
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+from text_utils import STOPWORDS, tokenize
+
+class TopicExtractor:
+    """Distinctive terms per category and per sentiment, updated incrementally
+    
+    Each batch becomes a sparse document-term matrix in coordinate form, one
+    entry per distinct term of a complaint. It is reduced into a small dense
+    matrix of document frequencies per group, so old rows are never revisited.
+    Terms are ranked by the weighted log-odds ratio with an informative
+    Dirichlet prior (Monroe, Colaresi and Quinn 2008), comparing a group with
+    the rest of its dimension, which ignores words common to every group.
+    """
+    
+    DIMENSIONS = ('category', 'sentiment')
+    
+    def __init__(self, bigrams: bool = True, max_terms: int = 200000, min_documents: int = 3,
+                 prior: float = 1000.0):
+        self.bigrams = bigrams
+        self.max_terms = max_terms
+        self.min_documents = min_documents
+        self.prior = prior
+        self.rows = 0
+        self.last_id = None
+        self.vocabulary: Dict[str, int] = {}
+        self.terms: List[str] = []
+        self.groups: Dict[Tuple[str, str], int] = {}
+        # Document frequency of each term per group, and documents per group
+        self.counts = np.zeros((0, 1024), dtype=np.int32)
+        self.documents = np.zeros(0, dtype=np.int64)
+    
+    def _terms(self, text: str) -> List[str]:
+        tokens = [token if token not in STOPWORDS and len(token) > 2 else None for token in tokenize(text)]
+        terms = [token for token in tokens if token]
+        if self.bigrams:
+            terms += [f"{a} {b}" for a, b in zip(tokens, tokens[1:]) if a and b]
+        return terms
+    
+    def _term_ids(self, terms) -> np.ndarray:
+        ids = np.empty(len(terms), dtype=np.int64)
+        for i, term in enumerate(terms):
+            term_id = self.vocabulary.get(term)
+            if term_id is None:
+                term_id = self.vocabulary[term] = len(self.terms)
+                self.terms.append(term)
+            ids[i] = term_id
+        
+        if len(self.terms) > self.counts.shape[1]:
+            grown = np.zeros((self.counts.shape[0], max(len(self.terms), 2 * self.counts.shape[1])), dtype=np.int32)
+            grown[:, :self.counts.shape[1]] = self.counts
+            self.counts = grown
+        return ids
+    
+    def _group_rows(self, dimension: str, values: pd.Series) -> np.ndarray:
+        codes, uniques = pd.factorize(values)
+        rows = np.empty(len(uniques) + 1, dtype=np.int64)
+        rows[-1] = -1  # Missing values (code -1) belong to no group
+        for i, value in enumerate(uniques):
+            row = self.groups.get((dimension, str(value)))
+            if row is None:
+                row = self.groups[(dimension, str(value))] = len(self.documents)
+                self.counts = np.vstack([self.counts, np.zeros((1, self.counts.shape[1]), dtype=np.int32)])
+                self.documents = np.append(self.documents, 0)
+            rows[i] = row
+        return rows[codes]
+    
+    def ingest(self, frame: pd.DataFrame):
+        """Count terms of complaints with ids above the last one seen"""
+        if self.last_id is not None:
+            frame = frame[frame['id'] > self.last_id]
+        if frame.empty:
+            return
+        
+        doc_terms = [self._terms(text) for text in frame['complaint_text'].fillna('')]
+        lengths = np.fromiter((len(terms) for terms in doc_terms), dtype=np.int64, count=len(doc_terms))
+        codes, uniques = pd.factorize(pd.Series([term for terms in doc_terms for term in terms], dtype=object))
+        term_ids = self._term_ids(uniques)[codes] if len(codes) else np.empty(0, dtype=np.int64)
+        
+        # Keep one (document, term) entry per pair: counts are document frequencies
+        vocabulary_size = self.counts.shape[1]
+        entries = np.unique(np.repeat(np.arange(len(frame), dtype=np.int64), lengths) * vocabulary_size + term_ids)
+        doc_index, term_ids = np.divmod(entries, vocabulary_size)
+        
+        for dimension in self.DIMENSIONS:
+            if dimension not in frame:
+                continue
+            group_rows = self._group_rows(dimension, frame[dimension])
+            rows = group_rows[doc_index]
+            in_group = rows >= 0
+            cells, cell_counts = np.unique(rows[in_group] * vocabulary_size + term_ids[in_group], return_counts=True)
+            group, term = np.divmod(cells, vocabulary_size)
+            self.counts[group, term] += cell_counts.astype(np.int32)
+            self.documents += np.bincount(group_rows[group_rows >= 0], minlength=len(self.documents))
+        
+        self.rows += len(frame)
+        self.last_id = int(frame['id'].max())
+        if len(self.terms) > self.max_terms:
+            self._prune()
+    
+    def _prune(self):
+        """Keep the most frequent half of the vocabulary to bound memory"""
+        totals = self.counts[:, :len(self.terms)].sum(axis=0)
+        keep = np.sort(np.argsort(-totals, kind='stable')[:self.max_terms // 2])
+        self.terms = [self.terms[i] for i in keep]
+        self.vocabulary = {term: i for i, term in enumerate(self.terms)}
+        counts = np.zeros((self.counts.shape[0], max(2 * len(keep), 1024)), dtype=np.int32)
+        counts[:, :len(keep)] = self.counts[:, keep]
+        self.counts = counts
+    
+    def top_terms(self, dimension: str, limit: int = 10) -> Dict[str, List[Dict[str, Any]]]:
+        """Most distinctive terms of each group in a dimension"""
+        groups = [(value, row) for (dim, value), row in self.groups.items() if dim == dimension]
+        if not groups or not self.terms:
+            return {}
+        
+        rows = [row for _, row in groups]
+        counts = self.counts[rows, :len(self.terms)].astype(np.float64)
+        total = counts.sum(axis=0)
+        alpha = total / total.sum() * self.prior
+        group_total = counts.sum(axis=1, keepdims=True)
+        rest = total - counts
+        rest_total = total.sum() - group_total
+        
+        with np.errstate(divide='ignore', invalid='ignore'):
+            delta = (np.log((counts + alpha) / (group_total + self.prior - counts - alpha))
+                     - np.log((rest + alpha) / (rest_total + self.prior - rest - alpha)))
+            scores = delta / np.sqrt(1 / (counts + alpha) + 1 / (rest + alpha))
+        scores[~np.isfinite(scores) | (counts < self.min_documents)] = -np.inf
+        
+        result = {}
+        for i, (value, row) in enumerate(groups):
+            top = np.argsort(-scores[i], kind='stable')[:limit]
+            result[value] = [
+                {
+                    'term': self.terms[t],
+                    'score': round(float(scores[i, t]), 2),
+                    'documents': int(counts[i, t]),
+                    'share': round(float(counts[i, t] / self.documents[row]), 3)
+                }
+                for t in top if np.isfinite(scores[i, t]) and scores[i, t] > 0
+            ]
+        return result